@@ -1,3 +1,4 @@
+import math
 import os
 
 from dotenv import load_dotenv
@@ -5,6 +6,7 @@ from pgvector.sqlalchemy import Vector
 from sqlalchemy import (
     JSON,
     Column,
+    Computed,
     DateTime,
     ForeignKey,
     Integer,
@@ -13,6 +15,7 @@ from sqlalchemy import (
     create_engine,
     text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.sql import func
@@ -21,6 +24,22 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Approximate nearest neighbour index on document_chunks.embedding: "hnsw"
+# (better recall/latency, slower to build) or "ivfflat"
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# 0 derives the list count from the row count when the index is built
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))
+# Index a compact form of the embedding instead of the full-precision vector:
+# "none", "halfvec" (16-bit floats, half the size) or "binary" (1 bit per
+# dimension, 1/32 the size). Searches fetch candidates from the compact index
+# and re-rank them on the stored full-precision embedding (pgvector 0.7+).
+# scripts/migrate_document_chunks.py builds the compact index and drops the
+# full-precision one, so only one ANN index is stored and maintained.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+VECTOR_DIMENSIONS = 1536
+
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -76,7 +95,12 @@ class DocumentChunk(Base):
 
     # Vector embedding (1536 dimensions for OpenAI text-embedding-ada-002)
     # Adjust dimensions based on your embedding model
-    embedding = Column(Vector(1536))
+    embedding = Column(Vector(VECTOR_DIMENSIONS))
+
+    # Full-text search vector, kept in sync with content by Postgres
+    content_tsv = Column(
+        TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)
+    )
 
     created_at = Column(DateTime, default=func.now())
 
@@ -90,6 +114,37 @@ class DocumentChunk(Base):
         return f"<DocumentChunk(id={self.id}, chunk_index={self.chunk_index})>"
 
 
+class EmbeddingCacheEntry(Base):
+    """Embeddings of previously seen text, keyed by normalized-text hash and model"""
+
+    __tablename__ = "embedding_cache"
+
+    text_hash = Column(String(64), primary_key=True)  # SHA-256 of normalized text
+    model = Column(String, primary_key=True)  # Embedding model and dimensions
+    embedding = Column(Vector(VECTOR_DIMENSIONS), nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<EmbeddingCacheEntry(text_hash={self.text_hash}, model={self.model})>"
+
+
+class ClinicalFactSheet(Base):
+    """Structured, page-cited facts extracted from a clinical notes file"""
+
+    __tablename__ = "clinical_fact_sheets"
+
+    file_hash = Column(String(64), primary_key=True)  # SHA-256 of the notes file
+    extractor = Column(String, primary_key=True)  # Extraction model and prompt version
+    facts = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return (
+            f"<ClinicalFactSheet(file_hash={self.file_hash}, "
+            f"extractor={self.extractor})>"
+        )
+
+
 def setup_pgvector_extension():
     """Setup pgvector extension in the database"""
     with engine.connect() as conn:
@@ -98,7 +153,69 @@ def setup_pgvector_extension():
         conn.commit()
 
 
-# Create tables and setup pgvector
+# Indexed expression and operator class per quantization; searches must order
+# by the same expression for the index to be used
+QUANTIZED_EMBEDDING_INDEX = {
+    "none": ("embedding", "vector_cosine_ops"),
+    "halfvec": (f"(embedding::halfvec({VECTOR_DIMENSIONS}))", "halfvec_cosine_ops"),
+    "binary": (
+        f"(binary_quantize(embedding)::bit({VECTOR_DIMENSIONS}))",
+        "bit_hamming_ops",
+    ),
+}
+
+
+VECTOR_INDEX_PREFIX = "ix_document_chunks_embedding_"
+
+
+def vector_index_name(index_type: str, quantization: str) -> str:
+    if quantization == "none":
+        return f"{VECTOR_INDEX_PREFIX}{index_type}"
+    return f"{VECTOR_INDEX_PREFIX}{quantization}_{index_type}"
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """IVFFlat list count for a table size (pgvector: rows/1000, sqrt past 1M)"""
+    if IVFFLAT_LISTS:
+        return IVFFLAT_LISTS
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def vector_index_sql(
+    index_type: str, quantization: str, row_count: int = 0, name: str = ""
+) -> str:
+    """
+    CREATE INDEX CONCURRENTLY statement for an ANN index on
+    document_chunks.embedding. Must run outside a transaction (autocommit).
+    """
+    expression, operator_class = QUANTIZED_EMBEDDING_INDEX[quantization]
+    if index_type == "ivfflat":
+        options = f"lists = {ivfflat_lists(row_count)}"
+    else:
+        options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    return (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        f"{name or vector_index_name(index_type, quantization)} "
+        f"ON document_chunks USING {index_type} ({expression} {operator_class}) "
+        f"WITH ({options})"
+    )
+
+
+# Search structures on document_chunks besides the ANN index, built by
+# scripts/migrate_document_chunks.py
+DOCUMENT_CHUNK_INDEXES = {
+    "ix_document_chunks_content_tsv": "USING gin (content_tsv)",
+    "ix_document_chunks_auth_file_chunk": (
+        "(prior_authorization_id, file_id, chunk_index)"
+    ),
+}
+
+
+# Create tables and setup pgvector. Index builds and column backfills on
+# existing tables are migrations (scripts/migrate_document_chunks.py), not
+# run at import time.
 def initialize_database():
     """Initialize database with tables and extensions"""
     setup_pgvector_extension()
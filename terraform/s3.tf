@@ -35,4 +35,26 @@ resource "aws_s3_bucket_public_access_block" "files" {
   block_public_policy     = true
   ignore_public_acls      = true
   restrict_public_buckets = true
-}
\ No newline at end of file
+}
+
+# Expire derived caches (e.g. slimmed PDFs) written by the worker
+resource "aws_s3_bucket_lifecycle_configuration" "files" {
+  bucket = aws_s3_bucket.files.id
+
+  rule {
+    id     = "expire-cache"
+    status = "Enabled"
+
+    filter {
+      prefix = "cache/"
+    }
+
+    expiration {
+      days = 7
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+}
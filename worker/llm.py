@@ -1,39 +1,1134 @@
 import asyncio
 import base64
-from typing import Any, Dict, List, Optional, Type
+import contextlib
+import importlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
+import anthropic
+import httpx
 import instructor
+import openai
+from instructor.exceptions import IncompleteOutputException
 from anthropic import Anthropic, AsyncAnthropic
-from instructor.multimodal import PDF
+from anthropic import APIConnectionError as AnthropicConnectionError
+from openai import APIConnectionError as OpenAIConnectionError
 from openai import AsyncOpenAI, OpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from pypdf import PdfReader
+from services.cache_service import build_cache_key, get_response_cache, hash_bytes
+from services.fake_llm_service import (
+    FakeLLMClient,
+    FakeUsage,
+    completion_usage,
+    get_recording_store,
+)
+from services.file_service import BufferReader
+from services.rate_limit_service import get_rate_limiter
+from services.text_layer_service import extract_pages, get_text_layer
 from settings import settings
 
+T = TypeVar("T")
+
+
+# Pooled clients keyed by (provider, is_async, event loop id). Building a
+# client per call means a fresh connection pool and TLS handshake per request.
+_client_registry: Dict[Tuple[str, bool, Optional[int]], Dict[str, Any]] = {}
+_registry_lock = threading.Lock()
+
+# Long-lived event loop for this worker process, so async clients bound to it
+# keep their keep-alive connections across tasks
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _sdk_http_module(sdk: Any) -> Any:
+    """
+    The HTTP library a provider SDK is built on: httpx, or httpx2 in newer
+    releases, whose clients reject httpx objects
+    """
+    return importlib.import_module(
+        sdk.DefaultHttpxClient.__mro__[1].__module__.split(".")[0]
+    )
+
+
+def _http_limits(http: Any) -> Any:
+    return http.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout(http: Any) -> Any:
+    return http.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+def _rate_limit_hooks(provider: str, is_async: bool) -> Dict[str, List[Any]]:
+    """httpx response hooks feeding status codes and rate-limit headers to the limiter"""
+    limiter = get_rate_limiter(provider)
+    if limiter is None:
+        return {}
+
+    if is_async:
+
+        async def observe(response: Any) -> None:
+            await limiter.observe_response_async(response.status_code, response.headers)
 
-def create_instructor_client(provider: str = "openai") -> instructor.Instructor:
-    if provider.lower() == "openai":
-        openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        return instructor.from_openai(openai_client)
-    elif provider.lower() == "anthropic":
-        anthropic_client = Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-        return instructor.from_anthropic(anthropic_client)
     else:
+
+        def observe(response: Any) -> None:
+            limiter.observe_response(response.status_code, response.headers)
+
+    return {"response": [observe]}
+
+
+def resolve_provider(provider: str) -> str:
+    """Provider actually used for a call; LLM_PROVIDER_OVERRIDE reroutes every call"""
+    return (settings.LLM_PROVIDER_OVERRIDE or provider).lower()
+
+
+def _build_raw_client(provider: str, is_async: bool) -> Any:
+    """Build a provider SDK client backed by a pooled HTTP client"""
+    if provider == "fake":
+        return FakeLLMClient(is_async, limiter=get_rate_limiter(provider))
+    if provider not in ("openai", "anthropic"):
         raise ValueError(
-            f"Unsupported provider: {provider}. Use 'openai' or 'anthropic'."
+            f"Unsupported provider: {provider}. Use 'openai', 'anthropic' or 'fake'."
+        )
+
+    # The SDK's own client class keeps its defaults (e.g. redirects) and is
+    # built on the HTTP library that SDK release expects
+    sdk = openai if provider == "openai" else anthropic
+    http = _sdk_http_module(sdk)
+    timeout = _http_timeout(http)
+    http_client_class = (
+        sdk.DefaultAsyncHttpxClient if is_async else sdk.DefaultHttpxClient
+    )
+    http_client = http_client_class(
+        limits=_http_limits(http),
+        timeout=timeout,
+        event_hooks=_rate_limit_hooks(provider, is_async),
+    )
+
+    # Async calls are retried by iter_batch_completions with classified,
+    # jittered backoff, so the SDK's own retries are turned down for them
+    max_retries = settings.LLM_ASYNC_SDK_MAX_RETRIES if is_async else 2
+
+    if provider == "openai":
+        client_class = AsyncOpenAI if is_async else OpenAI
+        return client_class(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=max_retries,
         )
+    client_class = AsyncAnthropic if is_async else Anthropic
+    return client_class(
+        api_key=settings.ANTHROPIC_API_KEY,
+        base_url=settings.ANTHROPIC_BASE_URL,
+        http_client=http_client,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
+
+
+def _wrap_instructor(provider: str, raw_client: Any) -> instructor.Instructor:
+    if provider == "openai":
+        return instructor.from_openai(raw_client)
+    if provider == "fake":
+        return raw_client
+    return instructor.from_anthropic(raw_client)
+
+
+def _get_pooled_entry(provider: str, is_async: bool) -> Dict[str, Any]:
+    """
+    Return the pooled client entry ({"raw", "instructor", "loop"}) for this process.
+
+    Async clients are additionally keyed by the running event loop, since an
+    httpx.AsyncClient cannot be shared across loops.
+    """
+    provider = provider.lower()
+    loop = None
+    if is_async:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+    key = (provider, is_async, id(loop) if loop is not None else None)
+
+    with _registry_lock:
+        # Drop clients whose event loop has gone away (e.g. asyncio.run callers)
+        stale_keys = [
+            k
+            for k, entry in _client_registry.items()
+            if entry["loop"] is not None and entry["loop"].is_closed()
+        ]
+        for stale_key in stale_keys:
+            del _client_registry[stale_key]
+
+        entry = _client_registry.get(key)
+        if entry is None:
+            raw_client = _build_raw_client(provider, is_async)
+            entry = {
+                "raw": raw_client,
+                "instructor": _wrap_instructor(provider, raw_client),
+                "loop": loop,
+            }
+            _client_registry[key] = entry
+
+        return entry
+
+
+def get_raw_client(provider: str = "anthropic", is_async: bool = False) -> Any:
+    """Return the pooled provider SDK client, for APIs instructor does not wrap"""
+    return _get_pooled_entry(provider, is_async)["raw"]
+
+
+def create_instructor_client(provider: str = "openai") -> instructor.Instructor:
+    """Return the process-wide pooled sync instructor client for a provider"""
+    return _get_pooled_entry(provider, is_async=False)["instructor"]
 
 
 def create_async_instructor_client(provider: str = "openai") -> instructor.Instructor:
-    if provider.lower() == "openai":
-        openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        return instructor.from_openai(openai_client)
-    elif provider.lower() == "anthropic":
-        anthropic_client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-        return instructor.from_anthropic(anthropic_client)
-    else:
-        raise ValueError(
-            f"Unsupported provider: {provider}. Use 'openai' or 'anthropic'."
+    """Return the pooled async instructor client for a provider and event loop"""
+    return _get_pooled_entry(provider, is_async=True)["instructor"]
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine on this process's long-lived event loop.
+
+    Use this instead of asyncio.run in tasks so pooled async clients (and their
+    keep-alive connections) survive from one task to the next.
+    """
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    return _worker_loop.run_until_complete(coro)
+
+
+def reset_clients() -> None:
+    """
+    Forget pooled clients without closing them.
+
+    Called in freshly forked worker processes: the inherited sockets belong to
+    the parent, so they must not be reused or shut down from the child.
+    """
+    global _worker_loop
+    with _registry_lock:
+        _client_registry.clear()
+    _worker_loop = None
+
+
+def close_clients() -> None:
+    """Close all pooled clients and the worker event loop (worker shutdown)"""
+    global _worker_loop
+    with _registry_lock:
+        entries = list(_client_registry.values())
+        _client_registry.clear()
+
+    for entry in entries:
+        raw_client = entry["raw"]
+        loop = entry["loop"]
+        try:
+            if loop is None:
+                raw_client.close()
+            elif not loop.is_closed() and not loop.is_running():
+                loop.run_until_complete(raw_client.close())
+        except Exception as e:
+            print(f"⚠ Error closing LLM client: {str(e)}")
+
+    if _worker_loop is not None and not _worker_loop.is_closed():
+        _worker_loop.close()
+    _worker_loop = None
+
+
+def quantile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank q-quantile (0 <= q <= 1) of samples, or None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LatencyTracker:
+    """Sliding window of provider call latencies per model, for hedging thresholds"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples or len(samples) < min_samples:
+            return None
+        return quantile(samples, q)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model: {
+                "count": len(samples),
+                "p50": round(self.quantile(model, 0.5), 2),
+                "p95": round(self.quantile(model, 0.95), 2),
+                "p99": round(self.quantile(model, 0.99), 2),
+            }
+            for model, samples in self._samples.items()
+            if samples
+        }
+
+
+latency_tracker = LatencyTracker(settings.LLM_LATENCY_WINDOW)
+
+
+class BatchClock:
+    """
+    Deadline of a batch that only runs while at least one of its requests
+    holds a concurrency slot and has been admitted by the rate limiter, so
+    time in which nothing is being sent (every request backing off between
+    retries or held by the rate limiter) does not count against it.
+    """
+
+    def __init__(self, seconds: float):
+        self.loop = asyncio.get_running_loop()
+        self.seconds = seconds
+        self._used = 0.0
+        self._active = 0
+        self._running_since: Optional[float] = None
+
+    def remaining(self) -> float:
+        used = self._used
+        if self._running_since is not None:
+            used += self.loop.time() - self._running_since
+        return self.seconds - used
+
+    def _start(self) -> None:
+        if self._active == 0:
+            self._running_since = self.loop.time()
+        self._active += 1
+
+    def _stop(self) -> None:
+        self._active -= 1
+        if self._active == 0:
+            self._used += self.loop.time() - self._running_since
+            self._running_since = None
+
+    @contextlib.contextmanager
+    def running(self):
+        """Run the deadline while a request holds a concurrency slot"""
+        self._start()
+        try:
+            yield
+        finally:
+            self._stop()
+
+    @contextlib.contextmanager
+    def throttled(self):
+        """Stop counting a request while it waits for rate-limiter admission"""
+        if self._active == 0:
+            yield
+            return
+        self._stop()
+        try:
+            yield
+        finally:
+            self._start()
+
+
+class TokenUsage:
+    """Accumulates provider token usage, including prompt cache reads and writes"""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+    def add(self, usage: Any) -> None:
+        if usage is None:
+            return
+
+        self.requests += 1
+        # Anthropic reports input/output tokens, OpenAI prompt/completion tokens
+        self.input_tokens += (
+            getattr(usage, "input_tokens", None)
+            or getattr(usage, "prompt_tokens", None)
+            or 0
+        )
+        self.output_tokens += (
+            getattr(usage, "output_tokens", None)
+            or getattr(usage, "completion_tokens", None)
+            or 0
+        )
+        self.cache_creation_input_tokens += (
+            getattr(usage, "cache_creation_input_tokens", None) or 0
+        )
+
+        cache_read = getattr(usage, "cache_read_input_tokens", None)
+        if cache_read is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cache_read = getattr(details, "cached_tokens", None)
+        self.cache_read_input_tokens += cache_read or 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+        }
+
+
+class ContextLimitError(ValueError):
+    """A request whose input alone would not fit in the model's context window"""
+
+
+class RequestSkipped(Exception):
+    """A batch request that was not sent because the caller no longer needed it"""
+
+
+class TokenBudgetPlanner:
+    """
+    Right-sizes max_tokens per response model from observed output sizes.
+
+    Reserving the caller's max_tokens (often 16384 for a one-sentence answer)
+    wastes output-token rate-limit capacity. Once a response model has enough
+    history, its requests get the LLM_MAX_TOKENS_QUANTILE output size times
+    LLM_MAX_TOKENS_HEADROOM instead, never more than the caller asked for. A
+    truncated response is retried once with the caller's max_tokens.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._output_tokens: Dict[str, Deque[int]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _model_stats(self, name: str) -> Dict[str, int]:
+        return self._stats.setdefault(
+            name,
+            {"requests": 0, "planned_tokens": 0, "output_tokens": 0, "truncated": 0},
+        )
+
+    def planned_max_tokens(
+        self, response_model: Type[BaseModel], requested: int
+    ) -> int:
+        samples = self._output_tokens.get(response_model.__name__)
+        if (
+            not settings.LLM_TOKEN_PLANNER_ENABLED
+            or not samples
+            or len(samples) < settings.LLM_MAX_TOKENS_MIN_SAMPLES
+        ):
+            return requested
+
+        observed = quantile(samples, settings.LLM_MAX_TOKENS_QUANTILE)
+        planned = int(observed * settings.LLM_MAX_TOKENS_HEADROOM)
+        return min(requested, max(settings.LLM_MIN_MAX_TOKENS, planned))
+
+    def plan(
+        self,
+        response_model: Type[BaseModel],
+        model: str,
+        input_tokens: int,
+        requested_max_tokens: int,
+        right_size: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Plan one request's output budget within the context window.
+
+        Args:
+            response_model: Response model, whose output history sets the budget
+            model: Model name, for error messages
+            input_tokens: Estimated input tokens (see estimate_request_tokens)
+            requested_max_tokens: The caller's max_tokens, used as the ceiling
+            right_size: Use output history; otherwise only fit the context window
+
+        Returns:
+            Dict with "response_model", "input_tokens", "requested_max_tokens"
+            and the planned "max_tokens"
+
+        Raises:
+            ContextLimitError: If the input leaves no room for a response
+        """
+        max_tokens = (
+            self.planned_max_tokens(response_model, requested_max_tokens)
+            if right_size
+            else requested_max_tokens
+        )
+
+        available = settings.LLM_CONTEXT_WINDOW - input_tokens
+        if available < min(max_tokens, settings.LLM_MIN_MAX_TOKENS):
+            raise ContextLimitError(
+                f"Request to {model} needs ~{input_tokens} input tokens, leaving "
+                f"{max(available, 0)} of the {settings.LLM_CONTEXT_WINDOW}-token "
+                "context window for the response"
+            )
+
+        return {
+            "response_model": response_model.__name__,
+            "input_tokens": input_tokens,
+            "requested_max_tokens": requested_max_tokens,
+            "max_tokens": min(max_tokens, available),
+        }
+
+    def record(self, plan: Dict[str, Any], output_tokens: int) -> None:
+        name = plan["response_model"]
+        self._output_tokens.setdefault(name, deque(maxlen=self.window)).append(
+            output_tokens
+        )
+        stats = self._model_stats(name)
+        stats["requests"] += 1
+        stats["planned_tokens"] += plan["max_tokens"]
+        stats["output_tokens"] += output_tokens
+
+    def record_truncation(self, plan: Dict[str, Any]) -> None:
+        self._model_stats(plan["response_model"])["truncated"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        snapshot = {}
+        for name, stats in self._stats.items():
+            samples = sorted(self._output_tokens.get(name, []))
+            requests = stats["requests"] or 1
+            snapshot[name] = {
+                **stats,
+                "avg_planned": round(stats["planned_tokens"] / requests),
+                "avg_output": round(stats["output_tokens"] / requests),
+                "max_output": samples[-1] if samples else 0,
+            }
+        return snapshot
+
+
+token_planner = TokenBudgetPlanner(settings.LLM_OUTPUT_SIZE_WINDOW)
+
+
+def _completion_truncated(completion: Any) -> bool:
+    """Whether a raw completion stopped at its max_tokens limit"""
+    if getattr(completion, "stop_reason", None) == "max_tokens":
+        return True
+    choices = getattr(completion, "choices", None) or []
+    return bool(choices) and getattr(choices[0], "finish_reason", None) == "length"
+
+
+def _is_truncated(error: BaseException) -> bool:
+    """Whether a failed call ran out of max_tokens (possibly wrapped by instructor)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, IncompleteOutputException) or _completion_truncated(
+            getattr(error, "last_completion", None)
+        ):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _widen_truncated_plan(
+    request: Dict[str, Any], kwargs: Dict[str, Any], error: BaseException
+) -> bool:
+    """After a truncated response, restore the caller's max_tokens for one retry"""
+    plan = request.get("token_plan")
+    if (
+        plan is None
+        or kwargs.get("max_tokens", 0) >= plan["requested_max_tokens"]
+        or not _is_truncated(error)
+    ):
+        return False
+
+    token_planner.record_truncation(plan)
+    print(
+        f"⚠ {plan['response_model']} response truncated at {kwargs['max_tokens']} "
+        f"tokens, retrying with {plan['requested_max_tokens']}"
+    )
+    kwargs["max_tokens"] = plan["requested_max_tokens"]
+    plan["max_tokens"] = plan["requested_max_tokens"]
+    return True
+
+
+def _resend_without_upload(request: Dict[str, Any], error: BaseException) -> bool:
+    """
+    After a request referencing an uploaded document failed because the file
+    no longer exists (expired or deleted), send the document inline instead
+    """
+    status_code = getattr(error, "status_code", None) or getattr(
+        error.__cause__, "status_code", None
+    )
+    if request.get("file_id") is None or status_code != 404:
+        return False
+
+    provider, user_message, document, cache_document = request["message_args"]
+    print(
+        f"⚠ Uploaded file {request['file_id']} is no longer available, "
+        "sending the document inline"
+    )
+    if document.file_id == request["file_id"]:
+        document.forget_upload()
+    request["file_id"] = None
+    request["messages"] = _build_messages(
+        provider, user_message, document, cache_document
+    )
+    return True
+
+
+FILES_API_BETA = "files-api-2025-04-14"
+
+
+def count_pdf_pages(pdf_content: Union[bytes, memoryview]) -> int:
+    """
+    Number of pages in a PDF, from its page tree.
+
+    Page objects cannot be counted in the raw bytes: writers using object
+    streams compress them away. Content pypdf cannot parse counts as one page.
+    """
+    try:
+        return max(1, len(PdfReader(BufferReader(pdf_content)).pages))
+    except Exception as e:
+        print(f"⚠ Could not count PDF pages, assuming one: {str(e)}")
+        return 1
+
+
+PAGE_TAG_PATTERN = re.compile(r'<page number="(\d+)">')
+
+# Explicit references to the attached PDF's own page numbering, e.g. "PDF
+# page 3", "PDF p. 3" or "page 3 of the attached PDF"
+PDF_CITATION_PATTERN = re.compile(
+    r"\bPDF (?:page|p\.)\s*(\d+)|\bpage (\d+) of the (?:attached )?PDF\b",
+    re.IGNORECASE,
+)
+
+
+def remap_pdf_citations(text: str, pdf_page_map: Optional[List[int]]) -> str:
+    """Rewrite explicit citations of attached-PDF pages to original pages"""
+    if not pdf_page_map or not text:
+        return text
+
+    def original(match: "re.Match[str]") -> str:
+        position = int(match.group(1) or match.group(2))
+        if not 1 <= position <= len(pdf_page_map):
+            return match.group(0)
+        return f"p. {pdf_page_map[position - 1]}"
+
+    return PDF_CITATION_PATTERN.sub(original, text)
+
+
+def page_runs(page_map: List[int]) -> List[Tuple[int, int, int]]:
+    """
+    Compress a page map into (first position, last position, first original
+    page) runs of consecutive pages, all 1-based
+    """
+    runs = []
+    for position, page in enumerate(page_map, start=1):
+        if runs and page == runs[-1][2] + position - runs[-1][0]:
+            runs[-1] = (runs[-1][0], position, runs[-1][2])
+        else:
+            runs.append((position, position, page))
+    return runs
+
+
+class DocumentHandle:
+    """
+    A PDF attached to LLM requests, prepared once and shared by every request.
+
+    When the Anthropic Files API is enabled the document is uploaded once and
+    requests reference it by file id; otherwise (or if the upload fails) the
+    base64 block is encoded once and the same block is reused. Use it as a
+    context manager around the task so the uploaded file is deleted afterwards.
+
+    With the text layer fast path (TEXT_LAYER_ENABLED), born-digital PDFs are
+    sent as page-tagged extracted text instead, and partly scanned ones as
+    text plus a PDF of only the scanned pages.
+
+    content may be bytes or a memoryview such as FileBuffer.view; it is read
+    in place (hashing, page counting, text extraction, uploads), and only
+    encoded into a copy for inline base64 requests. page_map gives the
+    original page number of each page when content is a slimmed or split
+    version of another PDF; the model is then shown, and cites, original
+    page numbers (see pdf_page_map and remap_citations).
+    """
+
+    def __init__(
+        self,
+        content: Union[bytes, memoryview],
+        provider: str = "anthropic",
+        filename: str = "document.pdf",
+        media_type: str = "application/pdf",
+        use_text_layer: Optional[bool] = None,
+        page_map: Optional[List[int]] = None,
+    ):
+        self.content = content
+        self.page_map = page_map
+        self.provider = provider.lower()
+        self.filename = filename
+        self.media_type = media_type
+        self.use_text_layer = (
+            settings.TEXT_LAYER_ENABLED if use_text_layer is None else use_text_layer
+        )
+        self.file_id: Optional[str] = None
+        self.requests_sent = 0
+        self._sha256: Optional[str] = None
+        self._page_count: Optional[int] = None
+        self._text_layer: Optional[Dict[str, Any]] = None
+        self._pdf_bytes: Optional[bytes] = None
+        self._source: Optional[Dict[str, Any]] = None
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hash_bytes(self.content)
+        return self._sha256
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            self._page_count = count_pdf_pages(self.content)
+        return self._page_count
+
+    def original_page(self, page: int) -> int:
+        """Original page number of a (1-based) page of this document"""
+        if self.page_map is not None and 1 <= page <= len(self.page_map):
+            return self.page_map[page - 1]
+        return page
+
+    @property
+    def text_layer(self) -> Dict[str, Any]:
+        """How the document is sent: see analyze_text_layer (cached per file hash)"""
+        if self._text_layer is None:
+            if self.use_text_layer and self.media_type == "application/pdf":
+                self._text_layer = get_text_layer(self.content, self.sha256)
+            else:
+                self._text_layer = {"mode": "pdf"}
+            if self.page_map is not None and self._text_layer.get("text"):
+                # Tag pages with their original numbers (without touching the
+                # analysis cached for this file hash)
+                self._text_layer = {
+                    **self._text_layer,
+                    "text": PAGE_TAG_PATTERN.sub(
+                        lambda match: '<page number="%d">'
+                        % self.original_page(int(match.group(1))),
+                        self._text_layer["text"],
+                    ),
+                }
+        return self._text_layer
+
+    @property
+    def mode(self) -> str:
+        return self.text_layer["mode"]
+
+    @property
+    def pdf_page_map(self) -> Optional[List[int]]:
+        """
+        Original page number of each page of the attached PDF, or None when
+        its own numbering already matches the original. In mixed mode the PDF
+        holds only the scanned pages, so it restarts at page 1.
+        """
+        if self.mode == "mixed":
+            pdf_page_map = [
+                self.original_page(page) for page in self.text_layer["scanned_pages"]
+            ]
+            if pdf_page_map != list(range(1, len(pdf_page_map) + 1)):
+                return pdf_page_map
+        elif self.mode == "pdf" and self.page_map is not None:
+            if self.page_map != list(range(1, len(self.page_map) + 1)):
+                return self.page_map
+        return None
+
+    def page_map_note(self) -> Optional[str]:
+        """Tells the model which original page each page of the attached PDF is"""
+        pdf_page_map = self.pdf_page_map
+        if pdf_page_map is None:
+            return None
+        lines = []
+        for first, last, page in page_runs(pdf_page_map):
+            if first == last:
+                lines.append(f"- PDF page {first} is page {page}")
+            else:
+                lines.append(
+                    f"- PDF pages {first}-{last} are pages "
+                    f"{page}-{page + last - first}"
+                )
+        rest = ""
+        if self.mode == "mixed":
+            rest = " (the scanned ones; the others follow as page-tagged text)"
+        return (
+            "The attached PDF contains only some pages of the original clinical "
+            f"notes{rest}. Its pages correspond to the original pages as follows:\n"
+            + "\n".join(lines)
+            + "\nAlways cite pages by their original page number."
+        )
+
+    def remap_citations(self, text: str) -> str:
+        """Rewrite explicit citations of attached-PDF pages to original pages"""
+        return remap_pdf_citations(text, self.pdf_page_map)
+
+    @property
+    def cache_identity(self) -> str:
+        """Identifies what is actually sent, for response cache keys"""
+        identity = self.sha256
+        if self.mode != "pdf":
+            identity = f"{identity}:{self.mode}"
+        if self.page_map is not None:
+            identity = f"{identity}:{hash_bytes(repr(self.page_map).encode())[:16]}"
+        return identity
+
+    @property
+    def pdf_bytes(self) -> Optional[bytes]:
+        """The PDF attached to requests: the file, only its scanned pages, or none"""
+        if self.mode == "text":
+            return None
+        if self.mode == "mixed":
+            if self._pdf_bytes is None:
+                self._pdf_bytes = extract_pages(
+                    self.content, self.text_layer["scanned_pages"]
+                )
+            return self._pdf_bytes
+        return self.content
+
+    @property
+    def estimated_tokens(self) -> int:
+        """Estimated input tokens the document adds to each request"""
+        if self.mode == "pdf":
+            return self.page_count * settings.PDF_TOKENS_PER_PAGE
+        return self.text_layer["sent_tokens"]
+
+    def token_savings(self) -> Dict[str, Any]:
+        """Estimated input tokens saved by the text layer across requests sent"""
+        pdf_tokens = self.text_layer.get(
+            "pdf_tokens", self.page_count * settings.PDF_TOKENS_PER_PAGE
+        )
+        return {
+            "mode": self.mode,
+            "requests": self.requests_sent,
+            "pdf_tokens_per_request": pdf_tokens,
+            "sent_tokens_per_request": self.estimated_tokens,
+            "tokens_saved": (pdf_tokens - self.estimated_tokens) * self.requests_sent,
+        }
+
+    def upload(self) -> "DocumentHandle":
+        """Upload to the provider file store if enabled; falls back to inline encoding"""
+        if (
+            self.file_id is not None
+            or resolve_provider(self.provider) != "anthropic"
+            or not settings.LLM_USE_FILES_API
+            or self.pdf_bytes is None
+        ):
+            return self
+
+        # Memory-mapped file buffers are streamed to the upload, not copied
+        body = self.pdf_bytes
+        if not isinstance(body, bytes):
+            body = BufferReader(body)
+
+        try:
+            uploaded = get_raw_client("anthropic").beta.files.upload(
+                file=(self.filename, body, self.media_type),
+                betas=[FILES_API_BETA],
+            )
+            self.file_id = uploaded.id
+            self._source = None
+            print(f"📤 Uploaded {self.filename} as {self.file_id}")
+        except Exception as e:
+            print(f"⚠ Document upload failed, sending inline instead: {str(e)}")
+
+        return self
+
+    def content_blocks(self, cache: bool = False) -> List[Dict[str, Any]]:
+        """
+        Anthropic content blocks for the document: the PDF (whole or scanned
+        pages only) and/or its page-tagged text. The (large) source dict and
+        text are shared between requests, not copied.
+        """
+        blocks = []
+        if self.pdf_bytes is not None:
+            if self._source is None:
+                if self.file_id is not None:
+                    self._source = {"type": "file", "file_id": self.file_id}
+                else:
+                    self._source = {
+                        "type": "base64",
+                        "media_type": self.media_type,
+                        "data": base64.b64encode(self.pdf_bytes).decode("utf-8"),
+                    }
+            blocks.append({"type": "document", "source": self._source})
+
+        note = self.page_map_note()
+        if note is not None:
+            blocks.append({"type": "text", "text": note})
+
+        if self.mode != "pdf":
+            blocks.append({"type": "text", "text": self.text_layer["text"]})
+
+        if cache:
+            # The cache breakpoint covers every block before it
+            blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    def request_kwargs(self) -> Dict[str, Any]:
+        """Extra completion arguments needed to reference this document"""
+        if self.file_id is None:
+            return {}
+        return {"extra_headers": {"anthropic-beta": FILES_API_BETA}}
+
+    def forget_upload(self) -> None:
+        """Stop referencing the uploaded file (e.g. once it has expired)"""
+        self.file_id = None
+        self._source = None
+
+    def close(self) -> None:
+        """Delete the uploaded file and drop the memoized encoding"""
+        if self.file_id is not None:
+            delete_uploaded_files([self.file_id])
+            self.file_id = None
+        self._source = None
+        self._pdf_bytes = None
+
+    def __enter__(self) -> "DocumentHandle":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def delete_uploaded_files(file_ids: List[str]) -> None:
+    """Delete files from the Anthropic file store, ignoring failures"""
+    if not file_ids:
+        return
+    client = get_raw_client("anthropic")
+    for file_id in file_ids:
+        try:
+            client.beta.files.delete(file_id, betas=[FILES_API_BETA])
+        except Exception as e:
+            print(f"⚠ Failed to delete uploaded file {file_id}: {str(e)}")
+
+
+def estimate_request_tokens(
+    user_message: str, document: Optional[DocumentHandle] = None
+) -> int:
+    """Estimate input tokens for a request (~4 characters per token plus document)"""
+    tokens = len(user_message) // 4 + 1
+    if document is not None:
+        tokens += document.estimated_tokens
+    return tokens
+
+
+def rate_limited_tokens(completion: Any) -> int:
+    """Input tokens a completion counts against provider rate limits"""
+    usage = completion_usage(completion)
+    # Prompt cache reads are not counted; cache writes are
+    return usage["input_tokens"] + usage["cache_creation_input_tokens"]
+
+
+def _build_messages(
+    provider: str,
+    user_message: str,
+    document: Optional[DocumentHandle] = None,
+    cache_document: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Build the chat messages for a request.
+
+    The document block goes first so that requests sharing a PDF share an
+    identical prefix, which Anthropic can serve from its prompt cache when
+    cache_document is set.
+    """
+    # The fake provider takes the same blocks, so it simulates their tokens
+    if provider.lower() in ("anthropic", "fake") and document is not None:
+        return [
+            {
+                "role": "user",
+                "content": [
+                    *document.content_blocks(cache=cache_document),
+                    {"type": "text", "text": user_message},
+                ],
+            }
+        ]
+
+    # For OpenAI, or any provider without PDF
+    return [
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _lookup_cached_response(
+    response_model: Type[BaseModel],
+    user_message: str,
+    model: str,
+    provider: str,
+    document: Optional[DocumentHandle],
+    kwargs: Dict[str, Any],
+) -> Tuple[Optional[Any], Optional[str], Optional[BaseModel]]:
+    """Return (cache, key, cached_response) for a request, honouring use_cache"""
+    use_cache = kwargs.pop("use_cache", True)
+    # Recording and replaying must see every call, not cached responses
+    if settings.LLM_RECORD_MODE.lower() != "off":
+        use_cache = False
+    cache = get_response_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+
+    key = build_cache_key(
+        model=model,
+        provider=provider,
+        user_message=user_message,
+        response_model=response_model,
+        pdf_sha256=document.cache_identity if document is not None else None,
+        generation_kwargs=kwargs,
+    )
+    return cache, key, cache.get(key, response_model)
+
+
+def _prepare_request(
+    response_model: Type[BaseModel],
+    user_message: str,
+    model: str,
+    provider: str,
+    pdf_content: Optional[bytes],
+    document: Optional[DocumentHandle],
+    cache_document: bool,
+    kwargs: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Shared request preparation for run_instructor and run_instructor_async.
+
+    Returns a dict with the response cache entry ("cache", "cache_key",
+    "cached_response"), the recording entry ("recordings", "recording_key",
+    "replay") and, when a call is needed, the "messages" to send, the
+    estimated "input_tokens" and the "token_plan". kwargs is updated in place.
+    """
+    has_document = pdf_content is not None or document is not None
+    if provider.lower() == "openai" and has_document:
+        raise ValueError("PDF content is not supported with OpenAI provider")
+
+    # Add max_tokens for Anthropic if not provided
+    if provider.lower() == "anthropic" and "max_tokens" not in kwargs:
+        kwargs["max_tokens"] = 4096
+
+    if document is None and pdf_content:
+        document = DocumentHandle(pdf_content, provider=provider)
+
+    cache, cache_key, cached_response = _lookup_cached_response(
+        response_model, user_message, model, provider, document, kwargs
+    )
+    request = {
+        "cache": cache,
+        "cache_key": cache_key,
+        "cached_response": cached_response,
+        "recordings": get_recording_store(),
+        "recording_key": None,
+        "replay": None,
+    }
+    if cached_response is not None:
+        return request
+
+    if request["recordings"] is not None:
+        request["recording_key"] = build_cache_key(
+            model=model,
+            provider=provider,
+            user_message=user_message,
+            response_model=response_model,
+            pdf_sha256=document.cache_identity if document is not None else None,
+            generation_kwargs=kwargs,
         )
+        if settings.LLM_RECORD_MODE.lower() == "replay":
+            request["replay"] = request["recordings"].get(request["recording_key"])
+            if request["replay"] is None:
+                raise LookupError(
+                    f"No recorded response for this {model} request; "
+                    "capture it first with LLM_RECORD_MODE=record"
+                )
+            return request
+
+    request["messages"] = _build_messages(
+        provider, user_message, document, cache_document
+    )
+    # To rebuild the messages if an uploaded document turns out to be gone
+    request["message_args"] = (provider, user_message, document, cache_document)
+    request["file_id"] = document.file_id if document is not None else None
+    request["input_tokens"] = estimate_request_tokens(user_message, document)
+    # Rate limits count uncached input only: once a document has been sent as
+    # a cached prefix, later requests read it from the prompt cache
+    request["rate_tokens"] = request["input_tokens"]
+    if cache_document and document is not None and document.requests_sent > 0:
+        request["rate_tokens"] -= document.estimated_tokens
+    request["token_plan"] = None
+    if "max_tokens" in kwargs:
+        request["token_plan"] = token_planner.plan(
+            response_model, model, request["input_tokens"], kwargs["max_tokens"]
+        )
+        kwargs["max_tokens"] = request["token_plan"]["max_tokens"]
+
+    if document is not None:
+        document.requests_sent += 1
+        for key, value in document.request_kwargs().items():
+            if isinstance(value, dict):
+                kwargs[key] = {**value, **kwargs.get(key, {})}
+            else:
+                kwargs.setdefault(key, value)
+
+    return request
+
+
+def _finish_request(
+    request: Dict[str, Any],
+    model: str,
+    response: BaseModel,
+    completion: Any,
+    usage: Optional[TokenUsage],
+    latency: float,
+) -> None:
+    if usage is not None:
+        usage.add(getattr(completion, "usage", None))
+
+    if request["cache"] is not None:
+        request["cache"].set(request["cache_key"], response)
+
+    if request.get("token_plan") is not None:
+        token_planner.record(
+            request["token_plan"], completion_usage(completion)["output_tokens"]
+        )
+
+    if request["recording_key"] is not None:
+        request["recordings"].put(
+            request["recording_key"],
+            model,
+            response,
+            completion_usage(completion),
+            latency,
+        )
+
+
+def _replayed_response(
+    request: Dict[str, Any],
+    response_model: Type[BaseModel],
+    usage: Optional[TokenUsage],
+) -> Tuple[BaseModel, float]:
+    """Response and recorded latency for a replayed request"""
+    recording = request["replay"]
+    if usage is not None:
+        usage.add(FakeUsage(**recording["usage"]))
+    latency = recording["latency"] if settings.LLM_REPLAY_LATENCY else 0.0
+    return response_model.model_validate(recording["response"]), latency
 
 
 def run_instructor(
@@ -42,6 +1137,9 @@ def run_instructor(
     model: str = "gpt-4o",
     provider: str = "openai",
     pdf_content: Optional[bytes] = None,
+    document: Optional[DocumentHandle] = None,
+    cache_document: bool = False,
+    usage: Optional[TokenUsage] = None,
     **kwargs,
 ) -> BaseModel:
     """
@@ -51,46 +1149,64 @@ def run_instructor(
         response_model: Pydantic model class for structured response
         user_message: The user's message/prompt
         model: Model name (e.g., "gpt-4o" for OpenAI, "claude-3-5-sonnet-20241022" for Anthropic)
-        provider: Either "openai" or "anthropic"
+        provider: "openai", "anthropic" or "fake" (offline stand-in)
         pdf_content: Optional PDF content as bytes (only supported with Anthropic)
-        **kwargs: Additional arguments passed to the completion call
+        document: Optional prepared DocumentHandle, used instead of pdf_content
+        cache_document: Mark the PDF as a cacheable prompt prefix (Anthropic only)
+        usage: Optional TokenUsage accumulator for provider token counts
+        **kwargs: Additional arguments passed to the completion call. Pass
+            use_cache=False to bypass the response cache.
 
     Returns:
         Instance of response_model with the structured response
     """
-    if provider.lower() == "openai" and pdf_content is not None:
-        raise ValueError("PDF content is not supported with OpenAI provider")
+    provider = resolve_provider(provider)
+    request = _prepare_request(
+        response_model,
+        user_message,
+        model,
+        provider,
+        pdf_content,
+        document,
+        cache_document,
+        kwargs,
+    )
+    if request["cached_response"] is not None:
+        return request["cached_response"]
 
-    client = create_instructor_client(provider)
+    if request["replay"] is not None:
+        response, latency = _replayed_response(request, response_model, usage)
+        time.sleep(latency)
+        return response
 
-    # Handle message construction based on provider and content type
-    if provider.lower() == "anthropic" and pdf_content:
-        # For Anthropic with PDF content
-        encoded_pdf = base64.b64encode(pdf_content).decode("utf-8")
-        pdf = PDF(source="base64", data=encoded_pdf, media_type="application/pdf")
+    limiter = get_rate_limiter(provider)
+    if limiter is not None:
+        limiter.acquire_sync(request["rate_tokens"])
 
-        messages = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": user_message}, pdf.to_anthropic()],
-            }
-        ]
-    else:
-        # For OpenAI or Anthropic without PDF
-        messages = [
-            {"role": "user", "content": user_message},
-        ]
+    client = create_instructor_client(provider)
 
-    # Add max_tokens for Anthropic if not provided
-    if provider.lower() == "anthropic" and "max_tokens" not in kwargs:
-        kwargs["max_tokens"] = 4096
+    started_at = time.monotonic()
+    while True:
+        try:
+            response, completion = client.chat.completions.create_with_completion(
+                model=model,
+                response_model=response_model,
+                messages=request["messages"],
+                **kwargs,
+            )
+            break
+        except Exception as e:
+            if not (
+                _widen_truncated_plan(request, kwargs, e)
+                or _resend_without_upload(request, e)
+            ):
+                raise
+    latency = time.monotonic() - started_at
+    latency_tracker.record(model, latency)
 
-    response = client.chat.completions.create(
-        model=model,
-        response_model=response_model,
-        messages=messages,
-        **kwargs,
-    )
+    _finish_request(request, model, response, completion, usage, latency)
+    if limiter is not None:
+        limiter.settle(request["rate_tokens"], rate_limited_tokens(completion))
 
     return response
 
@@ -101,6 +1217,11 @@ async def run_instructor_async(
     model: str = "gpt-4o",
     provider: str = "openai",
     pdf_content: Optional[bytes] = None,
+    document: Optional[DocumentHandle] = None,
+    cache_document: bool = False,
+    usage: Optional[TokenUsage] = None,
+    request_timeout: Optional[float] = None,
+    batch_clock: Optional[BatchClock] = None,
     **kwargs,
 ) -> BaseModel:
     """
@@ -110,46 +1231,90 @@ async def run_instructor_async(
         response_model: Pydantic model class for structured response
         user_message: The user's message/prompt
         model: Model name (e.g., "gpt-4o" for OpenAI, "claude-sonnet-4-20250514" for Anthropic)
-        provider: Either "openai" or "anthropic"
+        provider: "openai", "anthropic" or "fake" (offline stand-in)
         pdf_content: Optional PDF content as bytes (only supported with Anthropic)
-        **kwargs: Additional arguments passed to the completion call
+        document: Optional prepared DocumentHandle, used instead of pdf_content
+        cache_document: Mark the PDF as a cacheable prompt prefix (Anthropic only)
+        usage: Optional TokenUsage accumulator for provider token counts
+        request_timeout: Seconds the provider call may take, counted from
+            admission by the rate limiter (time queued there is not counted)
+        batch_clock: Deadline of the batch the request belongs to; paused
+            while the request waits for the rate limiter
+        **kwargs: Additional arguments passed to the completion call. Pass
+            use_cache=False to bypass the response cache.
 
     Returns:
         Instance of response_model with the structured response
     """
-    if provider.lower() == "openai" and pdf_content is not None:
-        raise ValueError("PDF content is not supported with OpenAI provider")
+    provider = resolve_provider(provider)
+    request = _prepare_request(
+        response_model,
+        user_message,
+        model,
+        provider,
+        pdf_content,
+        document,
+        cache_document,
+        kwargs,
+    )
+    if request["cached_response"] is not None:
+        return request["cached_response"]
 
-    client = create_async_instructor_client(provider)
+    if request["replay"] is not None:
+        response, latency = _replayed_response(request, response_model, usage)
+        await asyncio.sleep(latency)
+        latency_tracker.record(model, latency)
+        return response
 
-    # Handle message construction based on provider and content type
-    if provider.lower() == "anthropic" and pdf_content:
-        # For Anthropic with PDF content
-        encoded_pdf = base64.b64encode(pdf_content).decode("utf-8")
-        pdf = PDF(source="base64", data=encoded_pdf, media_type="application/pdf")
+    # Shared cluster-wide budget, so adding workers does not multiply load
+    limiter = get_rate_limiter(provider)
+    if limiter is not None:
+        if batch_clock is not None:
+            with batch_clock.throttled():
+                await limiter.acquire(request["rate_tokens"])
+        else:
+            await limiter.acquire(request["rate_tokens"])
 
-        messages = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": user_message}, pdf.to_anthropic()],
-            }
-        ]
-    else:
-        # For OpenAI or Anthropic without PDF
-        messages = [
-            {"role": "user", "content": user_message},
-        ]
+    timeout = request_timeout
+    if batch_clock is not None:
+        timeout = min(timeout or float("inf"), batch_clock.remaining())
+        if timeout <= 0:
+            raise TimeoutError("Batch deadline passed before request was sent")
 
-    # Add max_tokens for Anthropic if not provided
-    if provider.lower() == "anthropic" and "max_tokens" not in kwargs:
-        kwargs["max_tokens"] = 4096
+    client = create_async_instructor_client(provider)
 
-    response = await client.chat.completions.create(
-        model=model,
-        response_model=response_model,
-        messages=messages,
-        **kwargs,
-    )
+    started_at = time.monotonic()
+    while True:
+        remaining = None
+        if timeout is not None:
+            remaining = timeout - (time.monotonic() - started_at)
+        try:
+            response, completion = await asyncio.wait_for(
+                client.chat.completions.create_with_completion(
+                    model=model,
+                    response_model=response_model,
+                    messages=request["messages"],
+                    **kwargs,
+                ),
+                remaining,
+            )
+            break
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Request exceeded its {timeout:.1f}s deadline")
+        except Exception as e:
+            if not (
+                _widen_truncated_plan(request, kwargs, e)
+                or _resend_without_upload(request, e)
+            ):
+                raise
+    latency = time.monotonic() - started_at
+    latency_tracker.record(model, latency)
+
+    _finish_request(request, model, response, completion, usage, latency)
+    if limiter is not None:
+        await limiter.settle_async(
+            request["rate_tokens"], rate_limited_tokens(completion)
+        )
 
     return response
 
@@ -192,13 +1357,302 @@ def run_anthropic_instructor(
     )
 
 
+# Statuses worth retrying: timeouts, conflicts, rate limits and server/overload errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Whether a failed request is worth retrying.
+
+    Rate-limit, overload, timeout and connection errors are transient; schema
+    validation failures and other client errors are not. The exception's cause
+    chain is inspected, since instructor may wrap provider errors.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, ValidationError):
+            return False
+        if isinstance(
+            error,
+            (
+                TimeoutError,
+                asyncio.TimeoutError,
+                httpx.TransportError,
+                AnthropicConnectionError,
+                OpenAIConnectionError,
+            ),
+        ):
+            return True
+
+        status_code = getattr(error, "status_code", None)
+        if status_code is not None:
+            return status_code in RETRYABLE_STATUS_CODES
+
+        error = error.__cause__ or error.__context__
+
+    return False
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's retry-after"""
+    backoff = settings.LLM_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+    delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, backoff))
+
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        pass
+
+    return delay
+
+
+def _running(batch_clock: Optional[BatchClock]) -> Any:
+    """batch_clock.running(), or nothing when the batch has no deadline"""
+    if batch_clock is None:
+        return contextlib.nullcontext()
+    return batch_clock.running()
+
+
+async def run_hedged(
+    request: Dict[str, Any],
+    slots: Optional[asyncio.Semaphore] = None,
+    **call_kwargs,
+) -> BaseModel:
+    """
+    Run a request, firing a duplicate once it outlives the model's observed
+    latency quantile (LLM_HEDGE_QUANTILE); the first success wins and the
+    other request is cancelled. Without enough latency samples, no hedge fires.
+    call_kwargs (request_timeout, batch_clock) are passed to both attempts.
+
+    The caller holds a slot of slots (the batch's concurrency semaphore) for
+    the primary request; the duplicate waits for a slot of its own, so
+    hedging never exceeds the batch's max_concurrent.
+    """
+    model = request.get("model", "gpt-4o")
+    threshold = latency_tracker.quantile(
+        model, settings.LLM_HEDGE_QUANTILE, settings.LLM_HEDGE_MIN_SAMPLES
+    )
+
+    primary = asyncio.ensure_future(run_instructor_async(**request, **call_kwargs))
+    if threshold is None:
+        return await primary
+
+    attempts = [primary]
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=threshold)
+        if not done:
+
+            async def duplicate() -> BaseModel:
+                async with slots or contextlib.nullcontext():
+                    return await run_instructor_async(**request, **call_kwargs)
+
+            attempts.append(asyncio.ensure_future(duplicate()))
+
+        pending = set(attempts)
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # A failed attempt only fails the call if every attempt failed
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                return succeeded[0].result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()
+
+
+def _prepare_batch_requests(
+    requests: List[Dict[str, Any]], batch_usage: TokenUsage, warm_cache: bool
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    Copy batch requests, sharing one DocumentHandle per distinct pdf_content.
+
+    Returns the prepared requests and the indices to run first to warm the
+    prompt cache (one per document shared by several Anthropic requests).
+    """
+    requests = [dict(request) for request in requests]
+
+    # Share one memoized DocumentHandle per distinct pdf_content, and group
+    # Anthropic requests by the document they attach
+    shared_documents: Dict[int, DocumentHandle] = {}
+    document_groups: Dict[int, List[int]] = {}
+    for index, request in enumerate(requests):
+        request.setdefault("usage", batch_usage)
+        provider = request.get("provider", "openai").lower()
+        pdf_content = request.get("pdf_content")
+        if pdf_content and request.get("document") is None and provider != "openai":
+            if id(pdf_content) not in shared_documents:
+                shared_documents[id(pdf_content)] = DocumentHandle(
+                    pdf_content, provider=provider
+                )
+            request["document"] = shared_documents[id(pdf_content)]
+            del request["pdf_content"]
+
+        document = request.get("document")
+        if document is not None and provider == "anthropic":
+            document_groups.setdefault(id(document), []).append(index)
+
+    for indices in document_groups.values():
+        if len(indices) > 1:
+            for index in indices:
+                requests[index].setdefault("cache_document", True)
+
+    warm_indices = []
+    if warm_cache:
+        warm_indices = [
+            indices[0] for indices in document_groups.values() if len(indices) > 1
+        ]
+
+    return requests, warm_indices
+
+
+async def iter_batch_completions(
+    requests: List[Dict[str, Any]],
+    max_concurrent: int = 10,
+    warm_cache: bool = True,
+    usage: Optional[TokenUsage] = None,
+    request_timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    hedge: Optional[bool] = None,
+    skip: Optional[Callable[[int], bool]] = None,
+) -> AsyncIterator[Tuple[int, Union[BaseModel, Exception]]]:
+    """
+    Run multiple completions concurrently, yielding results as they complete.
+
+    Takes the same requests as run_batch_completions. Yields (index, result)
+    in completion order, where result is the response model instance or the
+    exception that request raised. Requests still in flight are cancelled if
+    the caller stops iterating early.
+
+    Each request is bounded by request_timeout seconds (LLM_REQUEST_TIMEOUT)
+    and, if set, the whole batch by deadline seconds (LLM_BATCH_DEADLINE; off
+    by default); requests cut off by either yield a TimeoutError. Neither
+    clock runs while requests are queued by the rate limiter, and the batch
+    deadline only runs while some request holds a slot (see BatchClock), so
+    it caps the batch's sending time. Requests failing with a
+    rate-limit, overload, timeout or connection error are retried on their own
+    with jittered exponential backoff (LLM_RETRY_*); validation errors are not.
+    With hedging enabled (LLM_HEDGE_ENABLED), slow requests get a duplicate
+    via run_hedged.
+
+    If given, skip(index) is checked whenever a request is about to be sent
+    (including retries) and, for requests already in flight, after every
+    result the caller consumes; requests it returns True for are not sent,
+    or are cancelled, and yield RequestSkipped.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    batch_usage = usage if usage is not None else TokenUsage()
+    requests, warm_indices = _prepare_batch_requests(requests, batch_usage, warm_cache)
+
+    deadline = deadline or settings.LLM_BATCH_DEADLINE
+    batch_clock = BatchClock(deadline) if deadline else None
+    call_kwargs = {
+        "request_timeout": request_timeout or settings.LLM_REQUEST_TIMEOUT,
+        "batch_clock": batch_clock,
+    }
+    hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+
+    async def _run_single_completion(index: int):
+        attempt = 0
+        while True:
+            async with semaphore:
+                with _running(batch_clock):
+                    if skip is not None and skip(index):
+                        return index, RequestSkipped(
+                            f"Request {index} no longer needed"
+                        )
+                    try:
+                        if batch_clock is not None and batch_clock.remaining() <= 0:
+                            raise TimeoutError(
+                                "Batch deadline passed before request started"
+                            )
+
+                        if hedge:
+                            return index, await run_hedged(
+                                requests[index], slots=semaphore, **call_kwargs
+                            )
+                        return index, await run_instructor_async(
+                            **requests[index], **call_kwargs
+                        )
+                    except Exception as e:
+                        error = e
+
+            # Back off outside the semaphore so waiting retries don't hold slots
+            attempt += 1
+            delay = retry_delay(error, attempt)
+            if (
+                attempt >= settings.LLM_RETRY_MAX_ATTEMPTS
+                or not is_retryable_error(error)
+                or (batch_clock is not None and delay >= batch_clock.remaining())
+            ):
+                return index, error
+
+            print(
+                f"↻ Retrying request {index} in {delay:.1f}s "
+                f"after {type(error).__name__}"
+            )
+            await asyncio.sleep(delay)
+
+    # Warm the prompt cache with one request per shared document, then fan out
+    warmed = set(warm_indices)
+    remaining_indices = [index for index in range(len(requests)) if index not in warmed]
+
+    for phase in (warm_indices, remaining_indices):
+        pending = {
+            asyncio.ensure_future(_run_single_completion(index)): index
+            for index in phase
+        }
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    index = pending.pop(task)
+                    if task.cancelled():
+                        yield index, RequestSkipped(f"Request {index} cancelled")
+                    else:
+                        yield task.result()
+
+                    # The caller may no longer need requests already in flight
+                    if skip is not None:
+                        for other, other_index in pending.items():
+                            if not other.done() and skip(other_index):
+                                other.cancel()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    print(f"Batch token usage: {batch_usage.as_dict()}")
+    print(f"LLM latency by model: {latency_tracker.snapshot()}")
+    print(f"Output tokens planned vs actual: {token_planner.snapshot()}")
+
+
 async def run_batch_completions(
     requests: List[Dict[str, Any]],
     max_concurrent: int = 10,
+    warm_cache: bool = True,
+    usage: Optional[TokenUsage] = None,
+    return_exceptions: bool = False,
+    request_timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    hedge: Optional[bool] = None,
 ) -> List[BaseModel]:
     """
     Run multiple completions concurrently in batches.
 
+    When several Anthropic requests attach the same PDF, the document is sent
+    as a cacheable prefix and one request per document runs first to write the
+    prompt cache; the rest then fan out and read the document from cache.
+
     Args:
         requests: List of dictionaries containing completion parameters.
                  Each dict should have keys matching run_instructor_async parameters:
@@ -207,8 +1661,17 @@ async def run_batch_completions(
                  - model: Model name (optional, defaults per provider)
                  - provider: Either "openai" or "anthropic" (optional, defaults to "openai")
                  - pdf_content: Optional PDF content (optional)
+                 - document: Optional shared DocumentHandle (optional)
                  - **kwargs: Additional arguments
         max_concurrent: Maximum number of concurrent requests
+        warm_cache: Run one request per shared document before the others
+        usage: Optional TokenUsage accumulator; one is created per batch if omitted
+        return_exceptions: Return a failed request's exception in its slot
+            instead of failing the whole batch
+        request_timeout: Per-request timeout in seconds (LLM_REQUEST_TIMEOUT)
+        deadline: Overall batch deadline in seconds (LLM_BATCH_DEADLINE, off
+            by default)
+        hedge: Fire duplicate requests for slow calls (LLM_HEDGE_ENABLED)
 
     Returns:
         List of response model instances in the same order as requests
@@ -230,17 +1693,185 @@ async def run_batch_completions(
         ]
         results = await run_batch_completions(requests)
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    results: List[Union[BaseModel, Exception, None]] = [None] * len(requests)
+
+    batch = iter_batch_completions(
+        requests,
+        max_concurrent,
+        warm_cache,
+        usage,
+        request_timeout=request_timeout,
+        deadline=deadline,
+        hedge=hedge,
+    )
+    try:
+        async for index, result in batch:
+            if isinstance(result, Exception) and not return_exceptions:
+                raise result
+            results[index] = result
+    finally:
+        await batch.aclose()
+
+    return results
+
 
-    async def _run_single_completion(request: Dict[str, Any]) -> BaseModel:
-        async with semaphore:
-            return await run_instructor_async(**request)
+def _tool_for_model(response_model: Type[BaseModel]) -> Dict[str, Any]:
+    """Describe a response model as an Anthropic tool, as instructor does"""
+    return {
+        "name": response_model.__name__,
+        "description": response_model.__doc__
+        or f"Correctly extracted `{response_model.__name__}` with all the required parameters with correct types",
+        "input_schema": response_model.model_json_schema(),
+    }
 
-    # Create tasks for all requests
-    tasks = [_run_single_completion(request) for request in requests]
 
-    # Wait for all tasks to complete
-    results = await asyncio.gather(*tasks)
+def build_message_batch_request(
+    custom_id: str,
+    response_model: Type[BaseModel],
+    user_message: str,
+    model: str = "claude-sonnet-4-20250514",
+    pdf_content: Optional[bytes] = None,
+    document: Optional[DocumentHandle] = None,
+    max_tokens: int = 4096,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Build one entry of an Anthropic Message Batches request.
+
+    Takes the same parameters as run_instructor_async (minus provider), so
+    real-time request dicts can be reused for offline batches. Pass an
+    uploaded DocumentHandle to reference the PDF by file id rather than
+    embedding it in every entry.
+    """
+    kwargs.pop("provider", None)
+    kwargs.pop("use_cache", None)
+    cache_document = kwargs.pop("cache_document", False)
+    tool = _tool_for_model(response_model)
+    if document is None and pdf_content:
+        document = DocumentHandle(pdf_content)
+
+    # Batch entries can't be retried on truncation, so only fit the context window
+    max_tokens = token_planner.plan(
+        response_model,
+        model,
+        estimate_request_tokens(user_message, document),
+        max_tokens,
+        right_size=False,
+    )["max_tokens"]
+    if document is not None:
+        document.requests_sent += 1
+
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": _build_messages(
+                "anthropic", user_message, document, cache_document
+            ),
+            "tools": [tool],
+            "tool_choice": {"type": "tool", "name": tool["name"]},
+            **kwargs,
+        },
+    }
+
+
+def split_message_batch(
+    batch_requests: List[Dict[str, Any]],
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split batch entries, in order, into batches of at most
+    MESSAGE_BATCH_MAX_BYTES serialized bytes and MESSAGE_BATCH_MAX_REQUESTS
+    entries. Entries embedding their document inline are large, so notes
+    sent without the Files API can fill a batch with few requests.
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    batch_bytes = 0
+    for entry in batch_requests:
+        entry_bytes = len(json.dumps(entry))
+        if (
+            not batches
+            or batch_bytes + entry_bytes > settings.MESSAGE_BATCH_MAX_BYTES
+            or len(batches[-1]) >= settings.MESSAGE_BATCH_MAX_REQUESTS
+        ):
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(entry)
+        batch_bytes += entry_bytes
+    return batches
+
+
+def _message_batch_client() -> Any:
+    """Raw client for Message Batches, honouring LLM_PROVIDER_OVERRIDE"""
+    provider = resolve_provider("anthropic")
+    if provider not in ("anthropic", "fake"):
+        raise ValueError(f"Message batches are not supported by provider {provider}")
+    return get_raw_client(provider)
+
+
+def submit_message_batch(
+    batch_requests: List[Dict[str, Any]], uses_files: bool = False
+) -> str:
+    """
+    Submit requests built by build_message_batch_request; returns the batch id.
+    Use split_message_batch first to stay within the API's batch limits.
+
+    Set uses_files when entries reference uploaded documents by file id.
+    """
+    client = _message_batch_client()
+    if uses_files:
+        batch = client.beta.messages.batches.create(
+            requests=batch_requests, betas=[FILES_API_BETA]
+        )
+    else:
+        batch = client.messages.batches.create(requests=batch_requests)
+    print(f"📦 Submitted message batch {batch.id} with {len(batch_requests)} requests")
+    return batch.id
+
+
+def message_batch_ended(batch_id: str) -> bool:
+    """Whether a message batch has finished processing (its results are ready)"""
+    batch = _message_batch_client().messages.batches.retrieve(batch_id)
+    return batch.processing_status == "ended"
+
+
+def retrieve_message_batch(
+    batch_id: str, response_model: Type[BaseModel]
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the results of a message batch.
+
+    Returns:
+        None while the batch is still processing, otherwise a dict mapping
+        custom_id to a response_model instance or an Exception describing why
+        that request failed
+    """
+    client = _message_batch_client()
+    batch = client.messages.batches.retrieve(batch_id)
+    if batch.processing_status != "ended":
+        return None
+
+    results: Dict[str, Any] = {}
+    for entry in client.messages.batches.results(batch_id):
+        result = entry.result
+        if result.type != "succeeded":
+            error = getattr(getattr(result, "error", None), "error", None)
+            results[entry.custom_id] = RuntimeError(
+                f"Batch request {result.type}: {getattr(error, 'message', result.type)}"
+            )
+            continue
+
+        tool_inputs = [
+            block.input
+            for block in result.message.content
+            if block.type == "tool_use"
+        ]
+        try:
+            if not tool_inputs:
+                raise ValueError("Batch response contained no tool call")
+            results[entry.custom_id] = response_model.model_validate(tool_inputs[0])
+        except ValueError as e:
+            results[entry.custom_id] = e
 
     return results
 
@@ -253,7 +1884,7 @@ def run_anthropic_batch_sync(
     **kwargs,
 ) -> List[BaseModel]:
     """Synchronous wrapper for Anthropic batch processing."""
-    return asyncio.run(
+    return run_async(
         run_anthropic_batch(
             response_model, user_messages, model, max_concurrent, **kwargs
         )
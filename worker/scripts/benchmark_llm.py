@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for criteria answering.
+
+Runs synthetic criteria through the same answering path the worker uses
+(iter_criterion_answers) against the fake provider, or against responses
+recorded earlier with LLM_RECORD_MODE=record, at several concurrency levels:
+
+    python scripts/benchmark_llm.py --criteria 200 --concurrency 5 10 20
+    python scripts/benchmark_llm.py --replay --pdf notes.pdf --criteria 40
+
+Use the results to size worker counts and catch throughput regressions.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import settings  # noqa: E402
+
+# Stand-in document used when no --pdf is given (one page, no network upload)
+PLACEHOLDER_PDF = b"%PDF-1.4\n1 0 obj << /Type /Page >> endobj\n%%EOF"
+
+
+async def run_level(criteria, pdf_content, concurrency):
+    from llm import DocumentHandle, quantile
+    from services.answer_service import iter_criterion_answers
+
+    started_at = time.monotonic()
+    arrivals = []
+    errors = 0
+
+    with DocumentHandle(pdf_content, provider="anthropic") as document:
+        async for _, response in iter_criterion_answers(
+            criteria, document, max_concurrent=concurrency
+        ):
+            arrivals.append(time.monotonic() - started_at)
+            if isinstance(response, Exception):
+                errors += 1
+
+    elapsed = time.monotonic() - started_at
+    return {
+        "concurrency": concurrency,
+        "answers": len(arrivals),
+        "errors": errors,
+        "seconds": elapsed,
+        "per_minute": len(arrivals) / elapsed * 60 if elapsed else 0.0,
+        "first_answer": arrivals[0] if arrivals else 0.0,
+        "p50_arrival": quantile(arrivals, 0.5) or 0.0,
+        "p95_arrival": quantile(arrivals, 0.95) or 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--criteria", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--pdf", help="Clinical notes PDF (default: placeholder)")
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Serve recorded responses instead of the fake provider",
+    )
+    parser.add_argument("--latency-median", type=float)
+    parser.add_argument("--latency-sigma", type=float)
+    parser.add_argument("--rate-limit-rate", type=float)
+    parser.add_argument("--seed", default="benchmark")
+    parser.add_argument(
+        "--rate-limit",
+        action="store_true",
+        help="Go through the shared Redis rate limiter (needs REDIS_URL)",
+    )
+    args = parser.parse_args()
+
+    if args.replay:
+        settings.LLM_RECORD_MODE = "replay"
+    else:
+        settings.LLM_PROVIDER_OVERRIDE = "fake"
+        settings.FAKE_LLM_SEED = args.seed
+        if args.latency_median is not None:
+            settings.FAKE_LLM_LATENCY_MEDIAN = args.latency_median
+        if args.latency_sigma is not None:
+            settings.FAKE_LLM_LATENCY_SIGMA = args.latency_sigma
+        if args.rate_limit_rate is not None:
+            settings.FAKE_LLM_RATE_LIMIT_RATE = args.rate_limit_rate
+
+    settings.LLM_RATE_LIMIT_ENABLED = args.rate_limit
+    settings.LLM_CACHE_BACKEND = "none"
+
+    pdf_content = PLACEHOLDER_PDF
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_content = f.read()
+
+    criteria = [
+        {"id": f"criterion-{i}", "description": f"Benchmark criterion number {i}"}
+        for i in range(args.criteria)
+    ]
+
+    print(
+        f"🏁 Benchmarking {len(criteria)} criteria "
+        f"({'replay' if args.replay else 'fake provider'}, "
+        f"mode={settings.CRITERIA_ANSWER_MODE})"
+    )
+    print(
+        f"{'conc':>5} {'answers':>8} {'errors':>7} {'seconds':>8} "
+        f"{'per min':>8} {'first':>7} {'p50':>7} {'p95':>7}"
+    )
+    for concurrency in args.concurrency:
+        from llm import run_async
+
+        result = run_async(run_level(criteria, pdf_content, concurrency))
+        print(
+            f"{result['concurrency']:>5} {result['answers']:>8} "
+            f"{result['errors']:>7} {result['seconds']:>8.1f} "
+            f"{result['per_minute']:>8.1f} {result['first_answer']:>7.2f} "
+            f"{result['p50_arrival']:>7.2f} {result['p95_arrival']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
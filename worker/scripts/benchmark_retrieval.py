@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Recall, latency and index size of quantized document_chunks vector search.
+
+Samples stored chunks as queries, computes their exact nearest neighbours
+within the same prior auth with a sequential scan, then runs the dense
+search for each quantization (see VECTOR_QUANTIZATION in database.py):
+
+    python scripts/benchmark_retrieval.py --queries 100 --top-k 5
+    python scripts/benchmark_retrieval.py --create-indexes --modes halfvec binary
+
+Use the results to pick VECTOR_QUANTIZATION and RETRIEVAL_RERANK_CANDIDATES,
+then run scripts/migrate_document_chunks.py, which keeps the chosen index and
+drops the ones built only for comparison.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settings import settings  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+EXACT_SEARCH_SQL = """
+SELECT id
+FROM document_chunks
+WHERE prior_authorization_id = :prior_auth_id
+ORDER BY embedding <=> CAST(:embedding AS vector)
+LIMIT :top_k
+"""
+
+
+def exact_neighbours(db, query, top_k):
+    """Ground truth: the top_k chunks by cosine distance, without any index"""
+    db.execute(
+        text(
+            "SELECT set_config('enable_indexscan', 'off', true), "
+            "set_config('enable_bitmapscan', 'off', true)"
+        )
+    )
+    rows = db.execute(
+        text(EXACT_SEARCH_SQL),
+        {
+            "prior_auth_id": query["prior_auth_id"],
+            "embedding": query["embedding"],
+            "top_k": top_k,
+        },
+    ).all()
+    db.rollback()
+    return {row.id for row in rows}
+
+
+def run_mode(db, mode, queries, truths, top_k):
+    from llm import quantile
+    from services.retrieval_service import apply_search_settings, vector_search_sql
+
+    sql = text(vector_search_sql(mode))
+    # As in the worker, HNSW scans must return every candidate to re-rank
+    ef_search = settings.RETRIEVAL_HNSW_EF_SEARCH
+    if mode != "none":
+        ef_search = max(ef_search, settings.RETRIEVAL_RERANK_CANDIDATES)
+
+    latencies = []
+    recalls = []
+    for query, truth in zip(queries, truths):
+        apply_search_settings(db)
+        db.execute(
+            text("SELECT set_config('hnsw.ef_search', :value, true)"),
+            {"value": str(ef_search)},
+        )
+
+        started_at = time.perf_counter()
+        rows = db.execute(
+            sql,
+            {
+                "embedding": query["embedding"],
+                "prior_auth_id": query["prior_auth_id"],
+                "rerank_candidates": settings.RETRIEVAL_RERANK_CANDIDATES,
+                "top_k": top_k,
+            },
+        ).all()
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        db.rollback()
+
+        if truth:
+            recalls.append(len({row.id for row in rows} & truth) / len(truth))
+
+    return {
+        "recall": sum(recalls) / len(recalls) if recalls else 0.0,
+        "p50_ms": quantile(latencies, 0.5) or 0.0,
+        "p95_ms": quantile(latencies, 0.95) or 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=settings.RETRIEVAL_TOP_K)
+    parser.add_argument("--modes", nargs="+", default=["none", "halfvec", "binary"])
+    parser.add_argument("--index-type", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--rerank-candidates", type=int)
+    parser.add_argument(
+        "--create-indexes",
+        action="store_true",
+        help=(
+            "Build any missing index for the modes compared (can be slow); "
+            "scripts/migrate_document_chunks.py drops all but the configured one"
+        ),
+    )
+    args = parser.parse_args()
+
+    if args.rerank_candidates is not None:
+        settings.RETRIEVAL_RERANK_CANDIDATES = args.rerank_candidates
+
+    from database import SessionLocal, engine, vector_index_name, vector_index_sql
+
+    if args.create_indexes:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            row_count = conn.execute(
+                text("SELECT count(*) FROM document_chunks WHERE embedding IS NOT NULL")
+            ).scalar()
+            for mode in args.modes:
+                print(f"🔨 Building {vector_index_name(args.index_type, mode)}")
+                conn.execute(text(vector_index_sql(args.index_type, mode, row_count)))
+
+    db = SessionLocal()
+    try:
+
+        queries = [
+            {"prior_auth_id": row.prior_authorization_id, "embedding": row.embedding}
+            for row in db.execute(
+                text(
+                    "SELECT prior_authorization_id, "
+                    "CAST(embedding AS text) AS embedding "
+                    "FROM document_chunks ORDER BY random() LIMIT :limit"
+                ),
+                {"limit": args.queries},
+            ).all()
+        ]
+        if not queries:
+            print("No document_chunks to benchmark; index some clinical notes first")
+            return
+
+        table_size = db.execute(
+            text("SELECT pg_size_pretty(pg_total_relation_size('document_chunks'))")
+        ).scalar()
+        truths = [exact_neighbours(db, query, args.top_k) for query in queries]
+
+        print(
+            f"🏁 Benchmarking {len(queries)} queries, top_k={args.top_k}, "
+            f"{args.index_type}, rerank candidates "
+            f"{settings.RETRIEVAL_RERANK_CANDIDATES} (document_chunks: {table_size})"
+        )
+        print(f"{'mode':>8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'index':>10}")
+        for mode in args.modes:
+            index_size = db.execute(
+                text("SELECT pg_size_pretty(pg_relation_size(to_regclass(:name)))"),
+                {"name": vector_index_name(args.index_type, mode)},
+            ).scalar()
+            if index_size is None:
+                print(f"{mode:>8} (no {args.index_type} index; use --create-indexes)")
+                continue
+
+            result = run_mode(db, mode, queries, truths, args.top_k)
+            print(
+                f"{mode:>8} {result['recall']:>9.3f} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {index_size:>10}"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
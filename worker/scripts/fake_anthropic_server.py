@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic Messages, Message Batches and Files APIs.
+
+Run it and point the worker at it to exercise the real-time, offline batch
+and document upload paths without network access:
+
+    python scripts/fake_anthropic_server.py --port 8765 --delay 5
+    ANTHROPIC_BASE_URL=http://localhost:8765 ANTHROPIC_API_KEY=test ...
+
+Each request is answered with a tool call whose input is filled in from the
+tool's input schema, as by the in-process fake provider (fake_tool_input).
+Requests referencing an uploaded file that does not exist (e.g. deleted from
+state.files to simulate expiry) get a 404.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.fake_llm_service import fake_tool_input, message_text  # noqa: E402
+
+
+def _iso(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+
+class FakeAnthropicState:
+    def __init__(self, delay):
+        self.delay = delay
+        self.batches = {}
+        self.files = {}
+        self.messages = []
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    state: FakeAnthropicState = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _batch_payload(self, batch):
+        ended = time.time() - batch["created_at"] >= self.state.delay
+        count = len(batch["requests"])
+        host = self.headers.get("Host", "localhost")
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": _iso(batch["created_at"]),
+            "expires_at": _iso(batch["created_at"] + 86400),
+            "ended_at": _iso(batch["created_at"] + self.state.delay) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": (
+                f"http://{host}/v1/messages/batches/{batch['id']}/results"
+                if ended
+                else None
+            ),
+        }
+
+    def _message_for(self, params, label=""):
+        tool = params["tools"][0]
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": params["model"],
+            "content": [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                    "name": tool["name"],
+                    "input": fake_tool_input(
+                        tool["name"],
+                        tool["input_schema"],
+                        message_text(params["messages"]),
+                        label=label,
+                    ),
+                }
+            ],
+            "stop_reason": "tool_use",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 0, "output_tokens": 0},
+        }
+
+    def _missing_files(self, params):
+        """Uploaded file ids a request references that do not exist (any more)"""
+        return [
+            block["source"]["file_id"]
+            for message in params["messages"]
+            if isinstance(message["content"], list)
+            for block in message["content"]
+            if block.get("type") == "document"
+            and block["source"].get("type") == "file"
+            and block["source"]["file_id"] not in self.state.files
+        ]
+
+    def _upload_file(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        match = re.search(rb'filename="([^"]*)"', body)
+        file_id = f"file_{uuid.uuid4().hex[:24]}"
+        self.state.files[file_id] = {
+            "id": file_id,
+            "type": "file",
+            "filename": match.group(1).decode("utf-8") if match else "upload",
+            "mime_type": "application/pdf",
+            "size_bytes": length,
+            "created_at": _iso(time.time()),
+            "downloadable": False,
+        }
+        return self.state.files[file_id]
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/files":
+            self._send_json(200, self._upload_file())
+            return
+
+        if path == "/v1/messages":
+            params = self._read_json()
+            self.state.messages.append(params)
+            missing = self._missing_files(params)
+            if missing:
+                self._send_json(
+                    404,
+                    {
+                        "type": "error",
+                        "error": {
+                            "type": "not_found_error",
+                            "message": f"File not found: {missing[0]}",
+                        },
+                    },
+                )
+                return
+            self._send_json(200, self._message_for(params))
+            return
+
+        if path == "/v1/messages/batches":
+            payload = self._read_json()
+            batch = {
+                "id": f"msgbatch_{uuid.uuid4().hex[:24]}",
+                "created_at": time.time(),
+                "requests": payload["requests"],
+            }
+            self.state.batches[batch["id"]] = batch
+            self._send_json(200, self._batch_payload(batch))
+            return
+
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+
+    def do_DELETE(self):
+        match = re.match(r"^/v1/files/([^/?]+)", self.path)
+        if match and self.state.files.pop(match.group(1), None):
+            self._send_json(200, {"id": match.group(1), "type": "file_deleted"})
+            return
+
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+
+    def do_GET(self):
+        match = re.match(
+            r"^/v1/messages/batches/([^/?]+)(/results)?", self.path.split("?")[0]
+        )
+        batch = self.state.batches.get(match.group(1)) if match else None
+        if batch is None:
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error"}})
+            return
+
+        if not match.group(2):
+            self._send_json(200, self._batch_payload(batch))
+            return
+
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": request["custom_id"],
+                    "result": {
+                        "type": "succeeded",
+                        "message": self._message_for(
+                            request["params"], request["custom_id"]
+                        ),
+                    },
+                }
+            )
+            for request in batch["requests"]
+        ]
+        body = "\n".join(lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port=0, delay=5.0):
+    """Serve the fake API from a background thread; port 0 picks a free one"""
+    FakeAnthropicHandler.state = FakeAnthropicState(delay)
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeAnthropicHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=5.0,
+        help="Seconds before a submitted batch reports as ended",
+    )
+    args = parser.parse_args()
+
+    FakeAnthropicHandler.state = FakeAnthropicState(args.delay)
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), FakeAnthropicHandler)
+    print(f"🧪 Fake Anthropic API listening on http://localhost:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Migrate document_chunks search structures: the generated full-text column,
+its GIN index, the per-auth B-tree and the ANN index on the embedding.
+
+Run once per deployment (not at import time, where the backend and every
+worker would race on the DDL), after the clinical notes have been indexed
+when building an IVFFlat index:
+
+    python scripts/migrate_document_chunks.py
+    python scripts/migrate_document_chunks.py --index-type ivfflat --rebuild
+
+Indexes are built with CREATE INDEX CONCURRENTLY, so reads and writes carry
+on meanwhile. The ANN index matches VECTOR_INDEX_TYPE and VECTOR_QUANTIZATION
+(see database.py); once it is built, every other ix_document_chunks_embedding_*
+index is dropped, so switching type or quantization replaces the old index
+instead of adding another one to maintain on every insert.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+# IVFFlat centroids are trained on the rows present at build time
+IVFFLAT_MIN_ROWS = 10000
+
+
+def _valid_indexes(conn):
+    """document_chunks indexes by name -> whether the build completed"""
+    rows = conn.execute(
+        text(
+            "SELECT c.relname AS name, i.indisvalid AS valid "
+            "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = to_regclass('document_chunks')"
+        )
+    ).all()
+    return {row.name: row.valid for row in rows}
+
+
+def _drop_index(conn, name):
+    print(f"🗑 Dropping {name}")
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def _create_index(conn, name, sql):
+    # A failed concurrent build leaves an invalid index that IF NOT EXISTS
+    # would keep; drop it and build again
+    if _valid_indexes(conn).get(name) is False:
+        _drop_index(conn, name)
+    print(f"🔨 Building {name}")
+    conn.execute(text(sql))
+
+
+def add_content_tsv(engine, lock_timeout):
+    """Add the generated content_tsv column to tables created before it existed"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'document_chunks' "
+                "AND column_name = 'content_tsv'"
+            )
+        ).first()
+        if exists:
+            return
+
+        # Rewrites the table under an ACCESS EXCLUSIVE lock; give up rather
+        # than queue every other query behind a long-running transaction
+        print("🔨 Adding document_chunks.content_tsv (rewrites the table)")
+        conn.execute(
+            text("SELECT set_config('lock_timeout', :value, true)"),
+            {"value": lock_timeout},
+        )
+        conn.execute(
+            text(
+                "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv "
+                "tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) "
+                "STORED"
+            )
+        )
+
+
+def migrate_vector_index(conn, index_type, quantization, rebuild, force):
+    from database import VECTOR_INDEX_PREFIX, vector_index_name, vector_index_sql
+
+    name = vector_index_name(index_type, quantization)
+    row_count = conn.execute(
+        text("SELECT count(*) FROM document_chunks WHERE embedding IS NOT NULL")
+    ).scalar()
+    if index_type == "ivfflat" and row_count < IVFFLAT_MIN_ROWS and not force:
+        print(
+            f"⚠ Not building {name}: only {row_count} embedded chunks. IVFFlat "
+            "lists are trained at build time; load the data first or use --force"
+        )
+        return
+
+    indexes = _valid_indexes(conn)
+    if rebuild and indexes.get(name):
+        # Build the replacement alongside, then swap it in
+        _create_index(
+            conn,
+            f"{name}_rebuild",
+            vector_index_sql(index_type, quantization, row_count, f"{name}_rebuild"),
+        )
+        _drop_index(conn, name)
+        conn.execute(text(f"ALTER INDEX {name}_rebuild RENAME TO {name}"))
+    else:
+        _create_index(conn, name, vector_index_sql(index_type, quantization, row_count))
+
+    for stale in _valid_indexes(conn):
+        if stale.startswith(VECTOR_INDEX_PREFIX) and stale != name:
+            _drop_index(conn, stale)
+
+
+def main():
+    from database import VECTOR_INDEX_TYPE, VECTOR_QUANTIZATION
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--index-type",
+        choices=["hnsw", "ivfflat"],
+        default="ivfflat" if VECTOR_INDEX_TYPE == "ivfflat" else "hnsw",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=["none", "halfvec", "binary"],
+        default=VECTOR_QUANTIZATION,
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the ANN index, e.g. to retrain IVFFlat lists as data grows",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=f"Build an IVFFlat index on fewer than {IVFFLAT_MIN_ROWS} rows",
+    )
+    parser.add_argument("--lock-timeout", default="5s")
+    args = parser.parse_args()
+
+    from database import DOCUMENT_CHUNK_INDEXES, engine
+
+    add_content_tsv(engine, args.lock_timeout)
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, definition in DOCUMENT_CHUNK_INDEXES.items():
+            _create_index(
+                conn,
+                name,
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON document_chunks {definition}",
+            )
+        migrate_vector_index(
+            conn, args.index_type, args.quantization, args.rebuild, args.force
+        )
+    print("✓ document_chunks migrated")
+
+
+if __name__ == "__main__":
+    main()
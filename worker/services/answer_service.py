@@ -0,0 +1,766 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+import redis
+from llm import (
+    DocumentHandle,
+    RequestSkipped,
+    iter_batch_completions,
+    latency_tracker,
+    remap_pdf_citations,
+)
+from pydantic import BaseModel, Field
+from services.cache_service import get_redis_client
+from services.text_layer_service import split_pdf
+from settings import settings
+
+ANSWER_MODEL = "claude-sonnet-4-20250514"
+ANSWER_MAX_TOKENS = 16384
+
+CRITERION_PROMPT = """Based on the provided clinical notes, determine if the following medical criterion is met:
+
+CRITERION: {description}
+
+Please analyze the clinical notes thoroughly and respond with either:
+- "YES" if the criterion is clearly met based on the clinical documentation
+- "NO" if the criterion is clearly not met based on the clinical documentation
+- "UNCLEAR" if there is insufficient information in the clinical notes to make a determination
+
+Provide a brief explanation for your decision based on specific information found (or not found) in the clinical notes, and your confidence in the answer from 0 to 1."""
+
+GROUPED_CRITERIA_PROMPT = """Based on the provided clinical notes, determine whether each of the following medical criteria is met:
+
+<criteria>
+{criteria}
+</criteria>
+
+Please analyze the clinical notes thoroughly and, for every criterion above, respond with its id and either:
+- "YES" if the criterion is clearly met based on the clinical documentation
+- "NO" if the criterion is clearly not met based on the clinical documentation
+- "UNCLEAR" if there is insufficient information in the clinical notes to make a determination
+
+Provide a brief explanation for each decision based on specific information found (or not found) in the clinical notes, and your confidence in each answer from 0 to 1. Return exactly one answer per criterion id."""
+
+
+PASSAGES_CRITERION_PROMPT = """Based on the following excerpts from the clinical notes, determine if the following medical criterion is met:
+
+CRITERION: {description}
+
+<excerpts>
+{passages}
+</excerpts>
+
+Please analyze the excerpts thoroughly and respond with either:
+- "YES" if the criterion is clearly met based on the excerpts
+- "NO" if the criterion is clearly not met based on the excerpts
+- "UNCLEAR" if the excerpts do not contain enough information to make a determination
+
+Provide a brief explanation for your decision that cites the pages of the excerpts it relies on (e.g. "p. 12"), and your confidence in the answer from 0 to 1."""
+
+
+FACT_SHEET_CRITERION_PROMPT = """Based on the following fact sheet summarizing the patient's clinical notes, determine if the following medical criterion is met:
+
+CRITERION: {description}
+
+<fact_sheet>
+{fact_sheet}
+</fact_sheet>
+{passages}
+Please analyze the fact sheet thoroughly and respond with either:
+- "YES" if the criterion is clearly met based on the documented facts
+- "NO" if the criterion is clearly not met based on the documented facts
+- "UNCLEAR" if the facts do not contain enough information to make a determination
+
+Provide a brief explanation for your decision that cites the pages given for the facts it relies on (e.g. "p. 12"), and your confidence in the answer from 0 to 1."""
+
+
+class CriterionAnswer(BaseModel):
+    answer: str = Field(..., description="YES, NO, or UNCLEAR")
+    explanation: str = Field(..., description="Brief explanation for the decision")
+    confidence: float = Field(
+        1.0, ge=0, le=1, description="Confidence in the answer, from 0 to 1"
+    )
+
+
+class IdentifiedCriterionAnswer(BaseModel):
+    criterion_id: str = Field(..., description="The id of the criterion answered")
+    answer: str = Field(..., description="YES, NO, or UNCLEAR")
+    explanation: str = Field(..., description="Brief explanation for the decision")
+    confidence: float = Field(
+        1.0, ge=0, le=1, description="Confidence in the answer, from 0 to 1"
+    )
+
+
+class CriterionAnswerList(BaseModel):
+    answers: List[IdentifiedCriterionAnswer] = Field(
+        ..., description="One answer for each criterion id in the request"
+    )
+
+
+def answer_to_value_data(response: CriterionAnswer) -> Dict[str, Any]:
+    """Convert an answer into the value stored on a criterion node"""
+    return {
+        # Convert to boolean (YES = True, NO/UNCLEAR = False)
+        "is_met": response.answer.upper() == "YES",
+        "justification": response.explanation,
+        "answer": response.answer.upper(),
+    }
+
+
+def error_value_data(message: str) -> Dict[str, Any]:
+    """Value stored on a criterion node when no answer could be produced"""
+    return {
+        "is_met": False,
+        "justification": message,
+        "answer": "UNCLEAR",
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def plan_criterion_groups(
+    criteria: List[Dict[str, Any]],
+    token_budget: int,
+    max_group_size: int,
+    tokens_per_answer: int,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Pack criteria into groups that each fit a per-request token budget.
+
+    Each criterion costs its own description plus the expected size of its
+    answer, so short checkable criteria pack densely while long narrative
+    ones end up in smaller groups.
+    """
+    groups = []
+    current_group = []
+    current_tokens = 0
+
+    for criterion in criteria:
+        cost = estimate_tokens(criterion["description"]) + tokens_per_answer
+
+        if current_group and (
+            current_tokens + cost > token_budget or len(current_group) >= max_group_size
+        ):
+            groups.append(current_group)
+            current_group = []
+            current_tokens = 0
+
+        current_group.append(criterion)
+        current_tokens += cost
+
+    if current_group:
+        groups.append(current_group)
+
+    return groups
+
+
+def format_passages(passages: List[Dict[str, Any]]) -> str:
+    """Render retrieved passages as excerpts tagged with their pages"""
+    excerpts = []
+    for passage in passages:
+        pages = str(passage["page_start"])
+        if passage["page_end"] != passage["page_start"]:
+            pages = f"{passage['page_start']}-{passage['page_end']}"
+        excerpts.append(f'<excerpt pages="{pages}">\n{passage["content"]}\n</excerpt>')
+    return "\n".join(excerpts)
+
+
+def build_criterion_request(
+    criterion: Dict[str, Any],
+    document: DocumentHandle,
+    model: str = ANSWER_MODEL,
+    passages: Optional[List[Dict[str, Any]]] = None,
+    fact_sheet: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Request answering one criterion, against the fact sheet (with any
+    retrieved passages) or the retrieved passages if given, and the full
+    clinical notes document otherwise
+    """
+    if fact_sheet:
+        excerpts = ""
+        if passages:
+            excerpts = f"\n<excerpts>\n{format_passages(passages)}\n</excerpts>\n"
+        return {
+            "response_model": CriterionAnswer,
+            "user_message": FACT_SHEET_CRITERION_PROMPT.format(
+                description=criterion["description"],
+                fact_sheet=fact_sheet,
+                passages=excerpts,
+            ),
+            "model": model,
+            "provider": "anthropic",
+            "max_tokens": ANSWER_MAX_TOKENS,
+        }
+
+    if passages:
+        return {
+            "response_model": CriterionAnswer,
+            "user_message": PASSAGES_CRITERION_PROMPT.format(
+                description=criterion["description"],
+                passages=format_passages(passages),
+            ),
+            "model": model,
+            "provider": "anthropic",
+            "max_tokens": ANSWER_MAX_TOKENS,
+        }
+
+    return {
+        "response_model": CriterionAnswer,
+        "user_message": CRITERION_PROMPT.format(description=criterion["description"]),
+        "model": model,
+        "provider": "anthropic",
+        "document": document,
+        "max_tokens": ANSWER_MAX_TOKENS,
+    }
+
+
+def cite_original_pages(
+    response: Union[CriterionAnswer, Exception],
+    pdf_page_map: Optional[List[int]],
+) -> Union[CriterionAnswer, Exception]:
+    """
+    Map citations of the attached PDF's pages back to original page numbers
+    (see DocumentHandle.pdf_page_map)
+    """
+    if isinstance(response, Exception):
+        return response
+    explanation = remap_pdf_citations(response.explanation, pdf_page_map)
+    if explanation == response.explanation:
+        return response
+    return response.model_copy(update={"explanation": explanation})
+
+
+def needs_full_document(response: Union[CriterionAnswer, Exception]) -> bool:
+    """
+    Whether an answer from the fact sheet or retrieved passages should be
+    re-asked with the full notes
+    """
+    if isinstance(response, Exception):
+        return True
+    return (
+        response.answer.upper() not in ("YES", "NO")
+        or response.confidence < settings.RETRIEVAL_MIN_ANSWER_CONFIDENCE
+    )
+
+
+def build_group_request(
+    group: List[Dict[str, Any]], document: DocumentHandle, model: str = ANSWER_MODEL
+) -> Dict[str, Any]:
+    criteria_text = "\n".join(
+        f'<criterion id="{criterion["id"]}">{criterion["description"]}</criterion>'
+        for criterion in group
+    )
+    return {
+        "response_model": CriterionAnswerList,
+        "user_message": GROUPED_CRITERIA_PROMPT.format(criteria=criteria_text),
+        "model": model,
+        "provider": "anthropic",
+        "document": document,
+        "max_tokens": ANSWER_MAX_TOKENS,
+    }
+
+
+async def _iter_model_answers(
+    criteria: List[Dict[str, Any]],
+    document: DocumentHandle,
+    model: str,
+    max_concurrent: int,
+    passages: Dict[str, List[Dict[str, Any]]],
+    fact_sheet: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Union[CriterionAnswer, Exception]]]:
+    """
+    Answer criteria with one model, yielding answers as they arrive.
+
+    With a fact sheet, every criterion is first asked against it (plus its
+    retrieved passages, if any); otherwise criteria with retrieved passages
+    are asked against those passages alone. Answers that come back UNCLEAR,
+    below RETRIEVAL_MIN_ANSWER_CONFIDENCE or failed are re-asked against the
+    full document. In "grouped" mode the criteria asked against the full
+    document (at first or re-asked) share requests; criteria missing from a
+    group's answer list, or whose whole group failed to validate, are retried
+    with one request each once the grouped requests have finished.
+
+    Yields:
+        (criterion id, CriterionAnswer or the Exception that prevented an answer)
+    """
+    grounded = [
+        criterion
+        for criterion in criteria
+        if fact_sheet or passages.get(criterion["id"])
+    ]
+    ungrounded = [
+        criterion
+        for criterion in criteria
+        if not fact_sheet and not passages.get(criterion["id"])
+    ]
+
+    if settings.CRITERIA_ANSWER_MODE.lower() == "grouped":
+        document_groups = plan_criterion_groups(
+            ungrounded,
+            token_budget=settings.CRITERIA_GROUP_TOKEN_BUDGET,
+            max_group_size=settings.CRITERIA_GROUP_MAX_SIZE,
+            tokens_per_answer=settings.CRITERIA_GROUP_TOKENS_PER_ANSWER,
+        )
+        print(
+            f"Answering {len(ungrounded)} criteria in "
+            f"{len(document_groups)} grouped requests"
+        )
+    else:
+        document_groups = [[criterion] for criterion in ungrounded]
+
+    groups = [[criterion] for criterion in grounded] + document_groups
+    requests = [
+        build_criterion_request(
+            group[0], document, model, passages.get(group[0]["id"]), fact_sheet
+        )
+        if len(group) == 1
+        else build_group_request(group, document, model)
+        for group in groups
+    ]
+
+    full_document = []
+    fallback_criteria = []
+    async for index, response in iter_batch_completions(
+        requests, max_concurrent=max_concurrent
+    ):
+        group = groups[index]
+        if index < len(grounded) and needs_full_document(response):
+            full_document.extend(group)
+            continue
+
+        if len(group) == 1:
+            yield group[0]["id"], cite_original_pages(response, document.pdf_page_map)
+            continue
+
+        if isinstance(response, Exception):
+            print(f"✗ Grouped request failed, falling back per criterion: {response}")
+            fallback_criteria.extend(group)
+            continue
+
+        answered = set()
+        group_ids = {criterion["id"] for criterion in group}
+        for item in response.answers:
+            if item.criterion_id in group_ids and item.criterion_id not in answered:
+                answered.add(item.criterion_id)
+                yield item.criterion_id, CriterionAnswer(
+                    answer=item.answer,
+                    explanation=document.remap_citations(item.explanation),
+                    confidence=item.confidence,
+                )
+
+        fallback_criteria.extend(
+            criterion for criterion in group if criterion["id"] not in answered
+        )
+
+    if full_document:
+        # Asked like ungrounded criteria, so grouped mode groups them too
+        print(f"Re-asking {len(full_document)} criteria against the full document")
+        async for criterion_id, response in _iter_model_answers(
+            full_document, document, model, max_concurrent, {}
+        ):
+            yield criterion_id, response
+
+    if fallback_criteria:
+        print(
+            f"Retrying {len(fallback_criteria)} criteria individually "
+            "against the full document"
+        )
+        async for index, response in iter_batch_completions(
+            [
+                build_criterion_request(criterion, document, model)
+                for criterion in fallback_criteria
+            ],
+            max_concurrent=max_concurrent,
+        ):
+            yield fallback_criteria[index]["id"], cite_original_pages(
+                response, document.pdf_page_map
+            )
+
+
+def cascade_models() -> List[str]:
+    """Models to try in order, cheapest first (CRITERIA_CASCADE_MODELS)"""
+    models = [
+        model.strip()
+        for model in settings.CRITERIA_CASCADE_MODELS.split(",")
+        if model.strip()
+    ]
+    return models or [ANSWER_MODEL]
+
+
+def needs_escalation(response: Union[CriterionAnswer, Exception]) -> bool:
+    """
+    Whether a cheaper model's answer should be re-asked of the next model.
+
+    Any failure escalates, transient ones (rate limits, timeouts, 5xx)
+    included: only the last model's errors are final.
+    """
+    if isinstance(response, Exception):
+        return True
+    return (
+        response.answer.upper() not in ("YES", "NO")
+        or response.confidence < settings.CRITERIA_CASCADE_MIN_CONFIDENCE
+    )
+
+
+def window_page_size(document: DocumentHandle) -> int:
+    """Pages per window so each window fits the page, byte and token limits"""
+    pages = max(document.page_count, 1)
+    tokens_per_page = max(document.estimated_tokens / pages, 1)
+    bytes_per_page = max(len(document.content) / pages, 1)
+    return max(
+        1,
+        min(
+            settings.NOTES_WINDOW_MAX_PAGES,
+            int(settings.NOTES_WINDOW_MAX_TOKENS / tokens_per_page),
+            int(settings.NOTES_WINDOW_MAX_BYTES / bytes_per_page),
+        ),
+    )
+
+
+def needs_windowing(document: DocumentHandle) -> bool:
+    """Whether the notes are too long to send in one request"""
+    return (
+        document.media_type == "application/pdf"
+        and window_page_size(document) < document.page_count
+    )
+
+
+def split_document(
+    document: DocumentHandle, window_pages: int
+) -> Iterator[Tuple[Tuple[int, int], DocumentHandle]]:
+    """
+    Split notes into overlapping page windows of at most window_pages pages.
+    Windows are built as the iteration reaches them, so a caller that
+    handles one window at a time only holds one window's PDF.
+
+    Yields:
+        ((first page, last page), window document) pairs, with pages and each
+        window's page_map in the original document's numbering
+    """
+    for start, end, content in split_pdf(
+        document.content,
+        window_pages,
+        min(settings.NOTES_WINDOW_OVERLAP_PAGES, window_pages - 1),
+    ):
+        window = DocumentHandle(
+            content,
+            provider=document.provider,
+            filename=f"pages-{start}-{end}.pdf",
+            use_text_layer=document.use_text_layer,
+            page_map=[document.original_page(page) for page in range(start, end + 1)],
+        )
+        yield (window.page_map[0], window.page_map[-1]), window
+
+
+def reduce_window_answers(
+    answers: List[Tuple[Tuple[int, int], Union[CriterionAnswer, Exception]]]
+) -> Union[CriterionAnswer, Exception]:
+    """
+    Combine one criterion's answers from every page window.
+
+    YES from any window is conclusive. Otherwise a window that failed might
+    have held the evidence, so its error is returned; then NO wins over
+    UNCLEAR. The most confident answer of the winning kind is kept.
+    """
+    completed = [
+        (pages, response)
+        for pages, response in answers
+        if not isinstance(response, Exception)
+    ]
+    yes = [item for item in completed if item[1].answer.upper() == "YES"]
+    if yes:
+        return _with_pages(*max(yes, key=lambda item: item[1].confidence))
+
+    errors = [response for _, response in answers if isinstance(response, Exception)]
+    if errors:
+        return errors[0]
+
+    if not completed:
+        return ValueError("No page window produced an answer")
+    no = [item for item in completed if item[1].answer.upper() == "NO"]
+    return _with_pages(*max(no or completed, key=lambda item: item[1].confidence))
+
+
+def _with_pages(pages: Tuple[int, int], response: CriterionAnswer) -> CriterionAnswer:
+    return CriterionAnswer(
+        answer=response.answer,
+        explanation=f"(pp. {pages[0]}-{pages[1]}) {response.explanation}",
+        confidence=response.confidence,
+    )
+
+
+async def iter_windowed_answers(
+    criteria: List[Dict[str, Any]],
+    document: DocumentHandle,
+    windows: List[Tuple[Tuple[int, int], DocumentHandle]],
+    model: str,
+    max_concurrent: int,
+    stats: Dict[str, Any],
+    passages: Dict[str, List[Dict[str, Any]]],
+    fact_sheet: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Union[CriterionAnswer, Exception]]]:
+    """
+    Answer criteria with one model against notes too long for one request
+    (map-reduce).
+
+    Every criterion is asked of every page window (see split_document) in
+    parallel, window by window. A criterion is resolved by the first YES (or
+    a confident answer from the fact sheet or its retrieved passages); its
+    other requests are then skipped, or cancelled if already in flight, and
+    iteration stops as soon as every criterion is resolved. Other answers are
+    combined with reduce_window_answers once all of a criterion's windows
+    have answered.
+
+    Yields:
+        (criterion id, CriterionAnswer or the Exception that prevented an answer)
+    """
+    requests = []
+    targets = []
+    for criterion in criteria:
+        if fact_sheet or passages.get(criterion["id"]):
+            requests.append(
+                build_criterion_request(
+                    criterion,
+                    document,
+                    model,
+                    passages.get(criterion["id"]),
+                    fact_sheet,
+                )
+            )
+            targets.append((criterion["id"], None, document))
+    # Window-major order: later windows are only asked what earlier ones left open
+    for pages, window in windows:
+        for criterion in criteria:
+            requests.append(build_criterion_request(criterion, window, model))
+            targets.append((criterion["id"], pages, window))
+
+    outstanding = {criterion["id"]: 0 for criterion in criteria}
+    for criterion_id, _, _ in targets:
+        outstanding[criterion_id] += 1
+    window_answers = {criterion["id"]: [] for criterion in criteria}
+    resolved = set()
+    answered_requests = 0
+
+    for _, window in windows:
+        window.upload()
+
+    batch = iter_batch_completions(
+        requests,
+        max_concurrent=max_concurrent,
+        skip=lambda index: targets[index][0] in resolved,
+    )
+    try:
+        async for index, response in batch:
+            criterion_id, pages, source = targets[index]
+            if isinstance(response, RequestSkipped) or criterion_id in resolved:
+                continue
+            response = cite_original_pages(response, source.pdf_page_map)
+            answered_requests += 1
+            outstanding[criterion_id] -= 1
+
+            result = None
+            if pages is None:
+                if not needs_full_document(response):
+                    result = response
+            elif (
+                not isinstance(response, Exception) and response.answer.upper() == "YES"
+            ):
+                result = _with_pages(pages, response)
+            else:
+                window_answers[criterion_id].append((pages, response))
+
+            if result is None and outstanding[criterion_id] == 0:
+                result = reduce_window_answers(window_answers[criterion_id])
+
+            if result is not None:
+                resolved.add(criterion_id)
+                yield criterion_id, result
+                if len(resolved) == len(criteria):
+                    break
+    finally:
+        await batch.aclose()
+
+    windowed = stats.setdefault(
+        "windowed", {"windows": len(windows), "requests": 0, "requests_avoided": 0}
+    )
+    windowed["requests"] += len(requests)
+    windowed["requests_avoided"] += len(requests) - answered_requests
+    print(f"Windowed answering stats after {model}: {windowed}")
+
+
+async def iter_criterion_answers(
+    criteria: List[Dict[str, Any]],
+    document: DocumentHandle,
+    max_concurrent: int = 5,
+    stats: Optional[Dict[str, Any]] = None,
+    passages: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    fact_sheet: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Union[CriterionAnswer, Exception]]]:
+    """
+    Answer criteria against the clinical notes, yielding answers as they arrive.
+
+    Criteria go through the model cascade: each model answers what the one
+    before it could not, escalating on UNCLEAR, confidence below
+    CRITERIA_CASCADE_MIN_CONFIDENCE or any failed request (validation errors,
+    rate limits, timeouts, server errors).
+    The last model's answers are final. Notes too long for one request are
+    split into overlapping page windows (NOTES_WINDOW_*) and each model
+    answers over all of them (see iter_windowed_answers).
+
+    Args:
+        stats: Optional dict filled with per-model answered/escalated/errored
+            counts (errored: escalated because the request failed) and the
+            estimated per-request latency saved by the cascade
+        passages: Optional retrieved passages per criterion id (see
+            retrieve_passages); those criteria are answered from the passages
+            instead of the full document where possible
+        fact_sheet: Optional formatted clinical fact sheet (see
+            format_fact_sheet); criteria are answered from it first and only
+            re-asked against the full document when it is not enough
+
+    Yields:
+        (criterion id, CriterionAnswer or the Exception that prevented an answer)
+    """
+    models = cascade_models()
+    stats = stats if stats is not None else {}
+    stats.setdefault("models", {})
+    stats.setdefault("request_latency_saved_seconds", 0.0)
+
+    windows = []
+    if needs_windowing(document):
+        window_pages = window_page_size(document)
+        # Every window is asked in parallel and again by each cascade model
+        windows = list(split_document(document, window_pages))
+        print(
+            f"📚 Answering {len(criteria)} criteria over {len(windows)} windows "
+            f"of up to {window_pages} pages"
+        )
+
+    try:
+        remaining = criteria
+        for tier, model in enumerate(models):
+            is_last = tier == len(models) - 1
+            criteria_by_id = {criterion["id"]: criterion for criterion in remaining}
+            model_stats = stats["models"].setdefault(
+                model, {"answered": 0, "escalated": 0, "errored": 0}
+            )
+            escalated = []
+
+            if windows:
+                answers = iter_windowed_answers(
+                    remaining,
+                    document,
+                    windows,
+                    model,
+                    max_concurrent,
+                    stats,
+                    passages or {},
+                    fact_sheet,
+                )
+            else:
+                answers = _iter_model_answers(
+                    remaining,
+                    document,
+                    model,
+                    max_concurrent,
+                    passages or {},
+                    fact_sheet,
+                )
+
+            async for criterion_id, response in answers:
+                if not is_last and needs_escalation(response):
+                    escalated.append(criteria_by_id[criterion_id])
+                    # Failures are counted apart from low-confidence answers
+                    if isinstance(response, Exception):
+                        model_stats["errored"] += 1
+                    else:
+                        model_stats["escalated"] += 1
+                    continue
+
+                model_stats["answered"] += 1
+                if not is_last:
+                    stats["request_latency_saved_seconds"] += _latency_saved(
+                        model, models[-1]
+                    )
+                yield criterion_id, response
+
+            if escalated:
+                print(f"⤴ Escalating {len(escalated)} criteria from {model}")
+            remaining = escalated
+            if not remaining:
+                break
+    finally:
+        for _, window in windows:
+            window.close()
+
+
+def _latency_saved(model: str, final_model: str) -> float:
+    """Median latency difference between the final model and a cheaper one"""
+    final_p50 = latency_tracker.quantile(final_model, 0.5)
+    model_p50 = latency_tracker.quantile(model, 0.5)
+    if final_p50 is None or model_p50 is None:
+        return 0.0
+    return max(0.0, final_p50 - model_p50)
+
+
+def group_batch_answers(
+    results: Dict[str, Union[CriterionAnswer, Exception]],
+    request_map: Dict[str, List[Any]],
+    page_maps: Optional[Dict[str, List[int]]] = None,
+) -> Dict[str, Dict[str, Union[CriterionAnswer, Exception]]]:
+    """
+    Map message batch results back to prior auths and criteria.
+
+    Args:
+        results: custom_id -> answer or Exception (see retrieve_message_batch)
+        request_map: custom_id -> [prior_auth_id, criterion_id, window pages
+            or None]; answers from page windows are combined per criterion
+            with reduce_window_answers
+        page_maps: custom_id -> pdf_page_map of the document the request
+            attached, where it differs from the original numbering
+
+    Returns:
+        prior_auth_id -> criterion_id -> CriterionAnswer or Exception
+    """
+    window_answers: Dict[str, Dict[str, List[Any]]] = {}
+    for custom_id, (prior_auth_id, criterion_id, *window) in request_map.items():
+        response = cite_original_pages(
+            results.get(custom_id, RuntimeError("Missing from batch results")),
+            (page_maps or {}).get(custom_id),
+        )
+        pages = tuple(window[0]) if window and window[0] else None
+        window_answers.setdefault(prior_auth_id, {}).setdefault(
+            criterion_id, []
+        ).append((pages, response))
+
+    answers_by_auth: Dict[str, Dict[str, Union[CriterionAnswer, Exception]]] = {}
+    for prior_auth_id, criteria in window_answers.items():
+        for criterion_id, answers in criteria.items():
+            response = answers[0][1]
+            if answers[0][0] is not None:
+                response = reduce_window_answers(answers)
+            answers_by_auth.setdefault(prior_auth_id, {})[criterion_id] = response
+    return answers_by_auth
+
+
+def record_cascade_stats(policy_id: str, stats: Dict[str, Any]) -> None:
+    """Accumulate cascade escalation and latency stats per policy document in Redis"""
+    try:
+        client = get_redis_client()
+        key = f"cascade_stats:{policy_id}"
+        pipe = client.pipeline()
+        for model, counts in stats.get("models", {}).items():
+            pipe.hincrby(key, f"{model}:answered", counts["answered"])
+            pipe.hincrby(key, f"{model}:escalated", counts["escalated"])
+            pipe.hincrby(key, f"{model}:errored", counts.get("errored", 0))
+        pipe.hincrbyfloat(
+            key,
+            "request_latency_saved_seconds",
+            stats.get("request_latency_saved_seconds", 0.0),
+        )
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠ Failed to record cascade stats: {str(e)}")
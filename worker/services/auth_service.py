@@ -1,9 +1,16 @@
 import re
 import uuid
-from typing import Any, Dict, List
-
-from llm import run_anthropic_instructor
+from typing import Any, Dict, List, Tuple, Union
+
+from llm import (
+    count_pdf_pages,
+    run_anthropic_instructor,
+    run_async,
+    run_batch_completions,
+)
 from pydantic import BaseModel, Field
+from services.text_layer_service import split_pdf
+from settings import settings
 
 PROMPT = """The document contains medical necessity criteria. Your task is to extract approval criteria from the document and format it.
 
@@ -27,6 +34,12 @@ Here are some guidelines to follow:
 </guidelines> 
 """
 
+WINDOW_PROMPT = """The attached PDF is pages {start}-{end} of a {page_count}-page document; other pages are processed separately and the results merged.
+
+Extract only the criteria that appear on these pages. When criteria continue a group started on an earlier page, repeat that group's header (and the headers of any groups enclosing it) exactly as written, so the parts can be merged. Return an empty string if these pages contain no approval criteria.
+
+"""
+
 
 class Criteria(BaseModel):
     criteria: str = Field(
@@ -34,13 +47,126 @@ class Criteria(BaseModel):
     )
 
 
-def extract_and_format_statements(pdf_bytes: bytes) -> str:
-    response = run_anthropic_instructor(
-        Criteria,
-        PROMPT,
-        pdf_content=pdf_bytes,
+def extract_and_format_statements(pdf_bytes: Union[bytes, memoryview]) -> str:
+    """
+    Extract the approval criteria of an auth document as bullet text.
+
+    Documents longer than POLICY_WINDOW_PAGES pages are split into
+    overlapping page windows that are extracted in parallel and merged (see
+    merge_criteria), so extraction time follows the longest window rather
+    than the whole document, and no single response has to hold every
+    indication. A window that still fails after its retries is re-run once
+    more; if it fails again the extraction raises, since a merge without it
+    would silently drop that window's criteria.
+    """
+    page_count = count_pdf_pages(pdf_bytes)
+    if page_count <= settings.POLICY_WINDOW_PAGES:
+        response = run_anthropic_instructor(
+            Criteria,
+            PROMPT,
+            pdf_content=pdf_bytes,
+        )
+        return response.criteria
+
+    windows = list(
+        split_pdf(
+            pdf_bytes,
+            settings.POLICY_WINDOW_PAGES,
+            min(settings.POLICY_WINDOW_OVERLAP_PAGES, settings.POLICY_WINDOW_PAGES - 1),
+        )
+    )
+    print(f"📑 Extracting criteria from {page_count} pages in {len(windows)} windows")
+    responses = _extract_windows(windows, page_count)
+
+    failed = [
+        index
+        for index, response in enumerate(responses)
+        if isinstance(response, Exception)
+    ]
+    if failed:
+        print(f"↻ Re-running {len(failed)} failed criteria extraction windows")
+        retried = _extract_windows([windows[index] for index in failed], page_count)
+        for index, response in zip(failed, retried):
+            if isinstance(response, Exception):
+                start, end, _ = windows[index]
+                print(f"✗ Criteria extraction failed for pages {start}-{end}")
+                raise response
+            responses[index] = response
+
+    return merge_criteria([response.criteria for response in responses])
+
+
+def _extract_windows(
+    windows: List[Tuple[int, int, bytes]], page_count: int
+) -> List[Union[Criteria, Exception]]:
+    """Extract criteria from page windows in parallel, one result or error each"""
+    return run_async(
+        run_batch_completions(
+            [
+                {
+                    "response_model": Criteria,
+                    "user_message": WINDOW_PROMPT.format(
+                        start=start, end=end, page_count=page_count
+                    )
+                    + PROMPT,
+                    "model": "claude-sonnet-4-20250514",
+                    "provider": "anthropic",
+                    "pdf_content": content,
+                    "max_tokens": 16384,
+                }
+                for start, end, content in windows
+            ],
+            max_concurrent=settings.POLICY_EXTRACTION_MAX_CONCURRENCY,
+            return_exceptions=True,
+            request_timeout=settings.LLM_EXTRACTION_REQUEST_TIMEOUT,
+        )
     )
-    return response.criteria
+
+
+def _criterion_key(text: str) -> str:
+    # Case, spacing and trailing punctuation vary between windows
+    return re.sub(r"\s+", " ", text).strip().rstrip(".,;:").lower()
+
+
+def _merge_items(
+    merged: List[Dict[str, Any]], items: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    by_key = {_criterion_key(item["text"]): item for item in merged}
+    for item in items:
+        existing = by_key.get(_criterion_key(item["text"]))
+        if existing is None:
+            existing = {"text": item["text"], "level": item["level"], "children": []}
+            by_key[_criterion_key(item["text"])] = existing
+            merged.append(existing)
+        _merge_items(existing["children"], item["children"])
+    return merged
+
+
+def format_hierarchy(items: List[Dict[str, Any]], level: int = 0) -> List[str]:
+    """Render parse_hierarchy items back into bullet lines"""
+    lines = []
+    for item in items:
+        lines.append(f"{'  ' * level}- {item['text']}")
+        lines.extend(format_hierarchy(item["children"], level + 1))
+    return lines
+
+
+def merge_criteria(contents: List[str]) -> str:
+    """
+    Merge criteria extracted from several windows of one document.
+
+    Each window's bullets are parsed with parse_hierarchy; groups and
+    statements repeated across windows (overlapping pages, or a group
+    continued on later pages) are merged under the same parent, keeping the
+    order in which they first appear.
+
+    Returns:
+        Bullet text of the merged hierarchy, for parse_to_boolean_structure
+    """
+    merged = []
+    for content in contents:
+        _merge_items(merged, parse_hierarchy(content.split("\n")))
+    return "\n".join(format_hierarchy(merged))
 
 
 def parse_to_boolean_structure(content: str) -> Dict[str, Any]:
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional, Type
+
+import redis
+from pydantic import BaseModel
+from settings import settings
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    """Process-wide client for REDIS_URL; its connection pool is shared"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_cache_key(
+    model: str,
+    provider: str,
+    user_message: str,
+    response_model: Type[BaseModel],
+    pdf_sha256: Optional[str] = None,
+    generation_kwargs: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Build a content-addressed key for an LLM request.
+
+    The key covers everything that can change the response: model, prompt,
+    attached document, expected output schema and generation parameters.
+    """
+    payload = {
+        "model": model,
+        "provider": provider.lower(),
+        "prompt": user_message,
+        "pdf_sha256": pdf_sha256,
+        "schema": response_model.model_json_schema(),
+        "kwargs": generation_kwargs or {},
+    }
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class DiskCacheBackend:
+    """Stores cached responses as JSON files under a directory, evicting LRU"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("expires_at") and entry["expires_at"] < time.time():
+            self._remove(path)
+            return None
+
+        # Touch the file so mtime tracks last access for LRU eviction
+        os.utime(path, None)
+        return entry["value"]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            replaced_size = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced_size = 0
+
+        entry = {"expires_at": time.time() + ttl if ttl else None, "value": value}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._scan())
+        else:
+            # Overwriting an entry replaces its bytes rather than adding to them
+            self._size += os.path.getsize(path) - replaced_size
+
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _scan(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _is_expired(self, path: str, now: float) -> bool:
+        try:
+            with open(path, "r") as f:
+                expires_at = json.load(f).get("expires_at")
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Unreadable entries (e.g. a write in progress elsewhere) are kept
+            return False
+        return bool(expires_at) and expires_at < now
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones, down to 90% of the cap"""
+        now = time.time()
+        entries = []
+        total = 0
+        for path, mtime, size in self._scan():
+            if self._is_expired(path, now):
+                self._remove(path)
+                continue
+            entries.append((path, mtime, size))
+            total += size
+
+        target = int(self.max_bytes * 0.9)
+        for path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+
+        self._size = total
+
+
+class RedisCacheBackend:
+    """Stores cached responses in Redis with TTL, bounding entry count by LRU"""
+
+    PREFIX = "llm_cache:"
+    LRU_KEY = "llm_cache:lru"
+
+    def __init__(self, redis_url: str, max_entries: int):
+        self.client = redis.Redis.from_url(redis_url)
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.PREFIX + key)
+        if value is None:
+            self.client.zrem(self.LRU_KEY, key)
+            return None
+
+        self.client.zadd(self.LRU_KEY, {key: time.time()})
+        return value.decode("utf-8")
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self.PREFIX + key, value, ex=ttl or None)
+        pipe.zadd(self.LRU_KEY, {key: time.time()})
+        pipe.zcard(self.LRU_KEY)
+        _, _, count = pipe.execute()
+
+        overflow = count - self.max_entries
+        if overflow > 0:
+            evicted = self.client.zpopmin(self.LRU_KEY, overflow)
+            if evicted:
+                self.client.delete(
+                    *[self.PREFIX + member.decode("utf-8") for member, _ in evicted]
+                )
+
+    def record_stat(self, name: str) -> None:
+        self.client.hincrby("llm_cache:stats", name, 1)
+
+
+class LLMResponseCache:
+    """Caches structured LLM responses by content-addressed key"""
+
+    def __init__(self, backend: Any, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, response_model: Type[BaseModel]) -> Optional[BaseModel]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠ LLM cache read failed: {str(e)}")
+            value = None
+
+        if value is not None:
+            try:
+                response = response_model.model_validate_json(value)
+                self._record("hits")
+                return response
+            except ValueError:
+                # Schema drifted since the entry was written; treat as a miss
+                pass
+
+        self._record("misses")
+        return None
+
+    def set(self, key: str, response: BaseModel) -> None:
+        try:
+            self.backend.set(key, response.model_dump_json(), self.ttl)
+        except Exception as e:
+            print(f"⚠ LLM cache write failed: {str(e)}")
+
+    def _record(self, name: str) -> None:
+        setattr(self, name, getattr(self, name) + 1)
+        if hasattr(self.backend, "record_stat"):
+            try:
+                self.backend.record_stat(name)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide response cache, or None if caching is disabled"""
+    global _response_cache
+    backend_name = settings.LLM_CACHE_BACKEND.lower()
+
+    if backend_name == "none":
+        return None
+
+    if _response_cache is None:
+        if backend_name == "disk":
+            backend = DiskCacheBackend(settings.CACHE_DIR, settings.LLM_CACHE_MAX_BYTES)
+        elif backend_name == "redis":
+            backend = RedisCacheBackend(
+                settings.LLM_CACHE_REDIS_URL, settings.LLM_CACHE_MAX_ENTRIES
+            )
+        else:
+            raise ValueError(
+                f"Unsupported LLM cache backend: {backend_name}. "
+                "Use 'disk', 'redis' or 'none'."
+            )
+        _response_cache = LLMResponseCache(backend, settings.LLM_CACHE_TTL_SECONDS)
+
+    return _response_cache
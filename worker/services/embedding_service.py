@@ -0,0 +1,172 @@
+import asyncio
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from database import EmbeddingCacheEntry
+from llm import get_raw_client, is_retryable_error, resolve_provider, retry_delay
+from services.cache_service import hash_bytes
+from settings import settings
+from sqlalchemy.dialects.postgresql import insert
+
+
+def _embedding_kwargs() -> dict:
+    kwargs = {"model": settings.EMBEDDING_MODEL}
+    # Only the text-embedding-3 family accepts a dimensions override
+    if settings.EMBEDDING_MODEL.startswith("text-embedding-3"):
+        kwargs["dimensions"] = settings.EMBEDDING_DIMENSIONS
+    return kwargs
+
+
+async def embed_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Embed one batch of texts in a single API call.
+
+    Transient failures (rate limits, overloads, timeouts) are retried with
+    the same jittered backoff as completion requests.
+
+    Returns:
+        One embedding per input text, in input order
+    """
+    client = get_raw_client(resolve_provider("openai"), is_async=True)
+
+    attempt = 0
+    while True:
+        try:
+            response = await client.embeddings.create(
+                input=texts, **_embedding_kwargs()
+            )
+            data = sorted(response.data, key=lambda item: item.index)
+            return [item.embedding for item in data]
+        except Exception as e:
+            attempt += 1
+            if attempt >= settings.LLM_RETRY_MAX_ATTEMPTS or not is_retryable_error(e):
+                raise
+            delay = retry_delay(e, attempt)
+            print(
+                f"↻ Retrying embedding batch in {delay:.1f}s after {type(e).__name__}"
+            )
+            await asyncio.sleep(delay)
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed any number of texts in EMBEDDING_BATCH_SIZE batches, running at
+    most EMBEDDING_MAX_CONCURRENCY batches at once.
+
+    Returns:
+        One embedding per input text, in input order
+    """
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    size = settings.EMBEDDING_BATCH_SIZE
+
+    async def _embed(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await embed_batch(batch)
+
+    batches = await asyncio.gather(
+        *[_embed(texts[start : start + size]) for start in range(0, len(texts), size)]
+    )
+    return [embedding for batch in batches for embedding in batch]
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of text for cache keys: NFKC, collapsed whitespace, trimmed"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def embedding_cache_model() -> str:
+    """Cache namespace: the same text embeds differently per model and size"""
+    return f"{settings.EMBEDDING_MODEL}@{settings.EMBEDDING_DIMENSIONS}"
+
+
+def _lookup_cached_embeddings(db, text_hashes: List[str]) -> Dict[str, Any]:
+    rows = (
+        db.query(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.embedding)
+        .filter(
+            EmbeddingCacheEntry.model == embedding_cache_model(),
+            EmbeddingCacheEntry.text_hash.in_(text_hashes),
+        )
+        .all()
+    )
+    return {row.text_hash: row.embedding for row in rows}
+
+
+def _store_cached_embeddings(db, embeddings: Dict[str, List[float]]) -> None:
+    model = embedding_cache_model()
+    rows = [
+        {"text_hash": text_hash, "model": model, "embedding": embedding}
+        for text_hash, embedding in embeddings.items()
+    ]
+    # Concurrent ingestions may embed the same boilerplate; first write wins
+    db.execute(
+        insert(EmbeddingCacheEntry.__table__).on_conflict_do_nothing(
+            index_elements=["text_hash", "model"]
+        ),
+        rows,
+    )
+    db.commit()
+
+
+async def embed_texts_cached(
+    db,
+    texts: List[str],
+    stats: Optional[Dict[str, int]] = None,
+) -> List[Any]:
+    """
+    Embed texts, calling the embedding API only for text not seen before.
+
+    Texts are keyed by the hash of their normalized form and the embedding
+    model, so repeated boilerplate and re-uploaded notes are embedded once.
+    Duplicates within the call are embedded once as well.
+
+    Args:
+        stats: Optional dict whose "embedding_cache_hits" and
+            "embedding_cache_misses" counts are incremented
+
+    Returns:
+        One embedding per input text, in input order
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("embedding_cache_hits", 0)
+    stats.setdefault("embedding_cache_misses", 0)
+
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        stats["embedding_cache_misses"] += len(texts)
+        return await embed_texts(texts)
+
+    text_hashes = [hash_bytes(normalize_text(text).encode("utf-8")) for text in texts]
+    try:
+        embeddings = _lookup_cached_embeddings(db, list(set(text_hashes)))
+    except Exception as e:
+        db.rollback()
+        print(f"⚠ Embedding cache read failed: {str(e)}")
+        embeddings = {}
+
+    # One representative text per uncached hash
+    missing = {}
+    for text, text_hash in zip(texts, text_hashes):
+        if text_hash not in embeddings:
+            missing.setdefault(text_hash, text)
+
+    hits = sum(1 for text_hash in text_hashes if text_hash in embeddings)
+    stats["embedding_cache_hits"] += hits
+    stats["embedding_cache_misses"] += len(texts) - hits
+
+    if missing:
+        fresh = dict(zip(missing, await embed_texts(list(missing.values()))))
+        try:
+            _store_cached_embeddings(db, fresh)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠ Embedding cache write failed: {str(e)}")
+        embeddings.update(fresh)
+
+    return [embeddings[text_hash] for text_hash in text_hashes]
+
+
+def embedding_cache_hit_rate(stats: Dict[str, int]) -> float:
+    total = stats.get("embedding_cache_hits", 0) + stats.get(
+        "embedding_cache_misses", 0
+    )
+    return round(stats.get("embedding_cache_hits", 0) / total, 3) if total else 0.0
@@ -0,0 +1,179 @@
+from typing import Any, Dict, List, Optional
+
+from database import ClinicalFactSheet
+from llm import DocumentHandle, iter_batch_completions
+from pydantic import BaseModel, Field
+from services.answer_service import needs_windowing, split_document, window_page_size
+from settings import settings
+from sqlalchemy.dialects.postgresql import insert
+
+FACT_SHEET_PROMPT = """Read the provided clinical notes and extract a fact sheet of everything a reviewer would need to decide whether prior authorization criteria are met.
+
+Extract, as separate facts:
+- Demographics: age, sex, and other patient characteristics such as BMI or pregnancy status
+- Diagnoses, with their ICD-10 codes when documented and dates of diagnosis
+- Medications, with dose, start date and duration, and whether they are current or discontinued (and why)
+- Prior therapies and treatments (physical therapy, injections, surgery, etc.), with dates, duration and outcome
+- Imaging studies, with dates and findings
+- Laboratory results, with values, units and dates
+- Procedures, with CPT codes when documented and dates
+- Other findings relevant to medical necessity (symptoms and their duration, functional limitations, specialist recommendations)
+
+Record facts exactly as documented, without interpretation. Cite the page(s) of the clinical notes each fact comes from. Leave a section empty if the notes say nothing about it."""
+
+SECTION_TITLES = {
+    "demographics": "Demographics",
+    "diagnoses": "Diagnoses",
+    "medications": "Medications",
+    "prior_therapies": "Prior therapies",
+    "imaging": "Imaging",
+    "labs": "Labs",
+    "procedures": "Procedures",
+    "other_findings": "Other findings",
+}
+
+
+class CitedFact(BaseModel):
+    fact: str = Field(..., description="The fact, as documented in the notes")
+    code: Optional[str] = Field(
+        None, description="ICD-10, CPT or other code, if documented"
+    )
+    date: Optional[str] = Field(
+        None, description="Date, date range or duration, if documented"
+    )
+    pages: List[int] = Field(
+        default_factory=list, description="Pages of the notes the fact comes from"
+    )
+
+
+class FactSheet(BaseModel):
+    demographics: List[CitedFact] = Field(default_factory=list)
+    diagnoses: List[CitedFact] = Field(default_factory=list)
+    medications: List[CitedFact] = Field(default_factory=list)
+    prior_therapies: List[CitedFact] = Field(default_factory=list)
+    imaging: List[CitedFact] = Field(default_factory=list)
+    labs: List[CitedFact] = Field(default_factory=list)
+    procedures: List[CitedFact] = Field(default_factory=list)
+    other_findings: List[CitedFact] = Field(default_factory=list)
+
+
+def fact_sheet_extractor() -> str:
+    """Cache namespace: sheets are rebuilt when the model or prompt version changes"""
+    return f"{settings.FACT_SHEET_MODEL}@v{settings.FACT_SHEET_VERSION}"
+
+
+def format_fact_sheet(facts: Dict[str, Any]) -> str:
+    """Render a stored fact sheet as compact, page-cited text for prompts"""
+    sections = []
+    for key, title in SECTION_TITLES.items():
+        lines = []
+        for item in facts.get(key, []):
+            details = ", ".join(
+                value for value in (item.get("code"), item.get("date")) if value
+            )
+            line = f"- {item['fact']}"
+            if details:
+                line += f" ({details})"
+            if item.get("pages"):
+                line += f" [p. {', '.join(str(page) for page in item['pages'])}]"
+            lines.append(line)
+        if lines:
+            sections.append(f"## {title}\n" + "\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def get_fact_sheet(db, file_hash: str) -> Optional[Dict[str, Any]]:
+    """The stored fact sheet for a notes file, if one has been extracted"""
+    entry = (
+        db.query(ClinicalFactSheet)
+        .filter(
+            ClinicalFactSheet.file_hash == file_hash,
+            ClinicalFactSheet.extractor == fact_sheet_extractor(),
+        )
+        .first()
+    )
+    return entry.facts if entry is not None else None
+
+
+def store_fact_sheet(db, file_hash: str, facts: Dict[str, Any]) -> None:
+    # The same notes may be attached to concurrent prior auths; first write wins
+    db.execute(
+        insert(ClinicalFactSheet.__table__).on_conflict_do_nothing(
+            index_elements=["file_hash", "extractor"]
+        ),
+        [
+            {
+                "file_hash": file_hash,
+                "extractor": fact_sheet_extractor(),
+                "facts": facts,
+            }
+        ],
+    )
+    db.commit()
+
+
+def _fact_sheet_request(document: DocumentHandle) -> Dict[str, Any]:
+    return {
+        "response_model": FactSheet,
+        "user_message": FACT_SHEET_PROMPT,
+        "model": settings.FACT_SHEET_MODEL,
+        "provider": "anthropic",
+        "document": document,
+        "max_tokens": settings.FACT_SHEET_MAX_TOKENS,
+    }
+
+
+async def extract_fact_sheet(document: DocumentHandle) -> Dict[str, Any]:
+    """
+    Extract a fact sheet from clinical notes with the LLM.
+
+    Notes too long for one request are extracted per page window (see
+    iter_windowed_answers) in parallel and the sections concatenated. Every
+    window is shown, and cites, the original page numbers of the notes (see
+    DocumentHandle.page_map).
+
+    Returns:
+        FactSheet as a dict
+    """
+    windows = [document]
+    if needs_windowing(document):
+        windows = [
+            window for _, window in split_document(document, window_page_size(document))
+        ]
+
+    merged = FactSheet().model_dump()
+    try:
+        async for index, response in iter_batch_completions(
+            [_fact_sheet_request(window) for window in windows],
+            max_concurrent=settings.FACT_SHEET_MAX_CONCURRENCY,
+            request_timeout=settings.LLM_EXTRACTION_REQUEST_TIMEOUT,
+        ):
+            if isinstance(response, Exception):
+                raise response
+            for key, items in response.model_dump().items():
+                merged[key].extend(items)
+    finally:
+        for window in windows:
+            if window is not document:
+                window.close()
+
+    return merged
+
+
+async def build_fact_sheet(db, document: DocumentHandle) -> Dict[str, Any]:
+    """
+    Return the fact sheet for a clinical notes file, extracting and storing
+    it the first time its file hash is seen.
+    """
+    facts = get_fact_sheet(db, document.sha256)
+    if facts is not None:
+        print(f"✓ Reusing fact sheet for clinical notes {document.sha256[:12]}")
+        return facts
+
+    facts = await extract_fact_sheet(document)
+    store_fact_sheet(db, document.sha256, facts)
+    print(
+        f"✓ Extracted fact sheet for clinical notes {document.sha256[:12]}: "
+        + ", ".join(f"{len(facts[key])} {key}" for key in SECTION_TITLES)
+    )
+    return facts
@@ -0,0 +1,546 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Type
+
+from anthropic.types.messages import MessageBatch, MessageBatchIndividualResponse
+from pydantic import BaseModel
+from pypdf import PdfReader
+from services.file_service import FileService
+from settings import settings
+
+
+class FakeRateLimitError(Exception):
+    """Simulated 429 from the fake provider; classified like a real rate limit"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Simulated rate limit, retry after {retry_after:.1f}s")
+        self.response = FakeResponse(429, {"retry-after": str(retry_after)})
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeUsage:
+    """Token usage shaped like the Anthropic SDK's, so TokenUsage can read it"""
+
+    def __init__(
+        self,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_creation_input_tokens: int = 0,
+        cache_read_input_tokens: int = 0,
+    ):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_creation_input_tokens = cache_creation_input_tokens
+        self.cache_read_input_tokens = cache_read_input_tokens
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class FakeCompletion:
+    def __init__(self, model: str, usage: FakeUsage):
+        self.model = model
+        self.usage = usage
+
+
+def _rng_for(*parts: Any) -> random.Random:
+    """Random generator seeded from FAKE_LLM_SEED and the request content"""
+    digest = hashlib.sha256(
+        json.dumps([settings.FAKE_LLM_SEED, *parts], default=str).encode("utf-8")
+    ).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _fake_value(
+    schema: Dict[str, Any],
+    defs: Dict[str, Any],
+    name: str,
+    rng: random.Random,
+    label: str = "",
+) -> Any:
+    """
+    Build a value matching a JSON schema, with plausible stand-in content.
+    Free-text strings mention label (e.g. a batch request's custom_id) if given.
+    """
+    if "$ref" in schema:
+        return _fake_value(defs[schema["$ref"].split("/")[-1]], defs, name, rng, label)
+    if "anyOf" in schema:
+        return _fake_value(schema["anyOf"][0], defs, name, rng, label)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+
+    schema_type = schema.get("type", "string")
+    if schema_type == "object":
+        return {
+            key: _fake_value(value, defs, key, rng, label)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [
+            _fake_value(schema.get("items", {}), defs, name, rng, label)
+            for _ in range(rng.randint(1, 3))
+        ]
+    if schema_type == "number":
+        return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1)), 2)
+    if schema_type == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+
+    if name == "answer":
+        return rng.choice(["YES", "YES", "NO", "UNCLEAR"])
+    if name == "criteria":
+        # Hierarchical bullet format expected by parse_to_boolean_structure
+        statements = "\n".join(
+            f"  - Stand-in statement {i + 1}" for i in range(rng.randint(2, 5))
+        )
+        return f"- [AND] Stand-in criteria\n{statements}"
+    if label:
+        return f"Stand-in {name or 'value'} for {label}"
+    return f"Stand-in {name or 'value'}"
+
+
+def fake_response(response_model: Type[BaseModel], user_message: str) -> BaseModel:
+    """
+    Schema-valid response for a request, deterministic for a given prompt.
+
+    Grouped criteria prompts get one answer per criterion id they list.
+    """
+    data = fake_tool_input(
+        response_model.__name__, response_model.model_json_schema(), user_message
+    )
+    return response_model.model_validate(data)
+
+
+def fake_tool_input(
+    name: str, schema: Dict[str, Any], user_message: str, label: str = ""
+) -> Any:
+    """
+    fake_response's data for a tool (name, JSON input schema), before
+    validation; also used by scripts/fake_anthropic_server.py
+    """
+    rng = _rng_for(name, user_message)
+    data = _fake_value(schema, schema.get("$defs", {}), "", rng, label)
+
+    criterion_ids = _criterion_ids(user_message)
+    if criterion_ids and isinstance(data.get("answers"), list) and data["answers"]:
+        template = data["answers"][0]
+        data["answers"] = [
+            {
+                **template,
+                "criterion_id": criterion_id,
+                "answer": rng.choice(["YES", "YES", "NO", "UNCLEAR"]),
+            }
+            for criterion_id in criterion_ids
+        ]
+    return data
+
+
+def _criterion_ids(user_message: str) -> List[str]:
+    ids = []
+    for part in user_message.split('<criterion id="')[1:]:
+        ids.append(part.split('"', 1)[0])
+    return ids
+
+
+def sample_latency(rng: random.Random) -> float:
+    """Log-normal latency around FAKE_LLM_LATENCY_MEDIAN, like real provider tails"""
+    return rng.lognormvariate(
+        math.log(max(settings.FAKE_LLM_LATENCY_MEDIAN, 1e-3)),
+        settings.FAKE_LLM_LATENCY_SIGMA,
+    )
+
+
+def _message_tokens(messages: List[Dict[str, Any]]) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        blocks = content if isinstance(content, list) else [content]
+        for block in blocks:
+            if isinstance(block, str):
+                tokens += len(block) // 4 + 1
+            elif block.get("type") == "text":
+                tokens += len(block["text"]) // 4 + 1
+            elif block["source"].get("type") == "base64":
+                pages = _pdf_page_count(block["source"]["data"])
+                tokens += pages * settings.PDF_TOKENS_PER_PAGE
+            else:
+                tokens += settings.PDF_TOKENS_PER_PAGE
+    return tokens
+
+
+@functools.lru_cache(maxsize=16)
+def _pdf_page_count(data: str) -> int:
+    """Pages of a base64 PDF block; requests share the block, so parse it once"""
+    try:
+        return len(PdfReader(io.BytesIO(base64.b64decode(data))).pages)
+    except Exception:
+        return 1
+
+
+def message_text(messages: List[Dict[str, Any]]) -> str:
+    """The text blocks of a request's messages, i.e. its prompt"""
+    return "\n".join(
+        block["text"] if isinstance(block, dict) else block
+        for message in messages
+        for block in (
+            message["content"]
+            if isinstance(message["content"], list)
+            else [message["content"]]
+        )
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+class _FakeCompletions:
+    def __init__(self, client: "FakeLLMClient"):
+        self.client = client
+
+    def _plan(
+        self,
+        model: str,
+        response_model: Type[BaseModel],
+        messages: List[Dict[str, Any]],
+    ):
+        """Pick the outcome of one call: (latency, response or error, completion)"""
+        # Per-call randomness for latency and errors; deterministic if seeded
+        rng = self.client.next_rng()
+        latency = sample_latency(rng)
+
+        if rng.random() < settings.FAKE_LLM_RATE_LIMIT_RATE:
+            self.client.observe(429, {"retry-after": "1"})
+            return latency * 0.1, FakeRateLimitError(retry_after=1.0), None
+
+        response = fake_response(response_model, message_text(messages))
+        usage = FakeUsage(
+            input_tokens=_message_tokens(messages),
+            output_tokens=len(response.model_dump_json()) // 4 + 1,
+        )
+        self.client.observe(200, {})
+        return latency, response, FakeCompletion(model, usage)
+
+    def create_with_completion(
+        self,
+        model: str,
+        response_model: Type[BaseModel],
+        messages: List[Dict[str, Any]],
+        **kwargs,
+    ):
+        latency, outcome, completion = self._plan(model, response_model, messages)
+        if self.client.is_async:
+            return self._finish_async(latency, outcome, completion)
+
+        time.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, completion
+
+    async def _finish_async(self, latency, outcome, completion):
+        await asyncio.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome, completion
+
+
+class _FakeChat:
+    def __init__(self, client: "FakeLLMClient"):
+        self.completions = _FakeCompletions(client)
+
+
+class _FakeMessageBatches:
+    """
+    Message Batches stand-in: every request succeeds with a fake_tool_input
+    tool call and batches end as soon as they are submitted. Batches are kept
+    in file storage (FAKE_LLM_BATCH_PREFIX) so the worker polling a batch
+    need not be the one that submitted it.
+    """
+
+    def _path(self, batch_id: str) -> str:
+        return f"{settings.FAKE_LLM_BATCH_PREFIX}/{batch_id}.json"
+
+    def _result(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        params = entry["params"]
+        tool = params["tools"][0]
+        tool_input = fake_tool_input(
+            tool["name"], tool["input_schema"], message_text(params["messages"])
+        )
+        return {
+            "custom_id": entry["custom_id"],
+            "result": {
+                "type": "succeeded",
+                "message": {
+                    "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": params["model"],
+                    "content": [
+                        {
+                            "type": "tool_use",
+                            "id": f"toolu_fake_{uuid.uuid4().hex[:24]}",
+                            "name": tool["name"],
+                            "input": tool_input,
+                        }
+                    ],
+                    "stop_reason": "tool_use",
+                    "stop_sequence": None,
+                    "usage": {
+                        "input_tokens": _message_tokens(params["messages"]),
+                        "output_tokens": len(json.dumps(tool_input)) // 4 + 1,
+                    },
+                },
+            },
+        }
+
+    def create(self, requests: List[Dict[str, Any]], **kwargs) -> MessageBatch:
+        batch = {
+            "id": f"msgbatch_fake_{uuid.uuid4().hex[:24]}",
+            "created_at": time.time(),
+            "results": [self._result(entry) for entry in requests],
+        }
+        FileService.write_file(
+            self._path(batch["id"]), json.dumps(batch).encode("utf-8")
+        )
+        return self._batch(batch)
+
+    def _load(self, batch_id: str) -> Dict[str, Any]:
+        return json.loads(FileService.read_file(self._path(batch_id)))
+
+    def _batch(self, batch: Dict[str, Any]) -> MessageBatch:
+        created_at = datetime.fromtimestamp(batch["created_at"], timezone.utc)
+        return MessageBatch.model_validate(
+            {
+                "id": batch["id"],
+                "type": "message_batch",
+                "processing_status": "ended",
+                "request_counts": {
+                    "processing": 0,
+                    "succeeded": len(batch["results"]),
+                    "errored": 0,
+                    "canceled": 0,
+                    "expired": 0,
+                },
+                "created_at": created_at,
+                "ended_at": created_at,
+                "expires_at": created_at + timedelta(days=1),
+                "archived_at": None,
+                "cancel_initiated_at": None,
+                "results_url": None,
+            }
+        )
+
+    def retrieve(self, batch_id: str, **kwargs) -> MessageBatch:
+        return self._batch(self._load(batch_id))
+
+    def results(self, batch_id: str, **kwargs) -> List[Any]:
+        return [
+            MessageBatchIndividualResponse.model_validate(result)
+            for result in self._load(batch_id)["results"]
+        ]
+
+
+class _FakeMessages:
+    def __init__(self):
+        self.batches = _FakeMessageBatches()
+
+
+class _FakeBeta:
+    def __init__(self):
+        self.messages = _FakeMessages()
+
+
+class FakeEmbedding:
+    def __init__(self, index: int, embedding: List[float]):
+        self.index = index
+        self.embedding = embedding
+
+
+class FakeEmbeddingResponse:
+    def __init__(self, model: str, data: List[FakeEmbedding], usage: FakeUsage):
+        self.model = model
+        self.data = data
+        self.usage = usage
+
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit vector for a text, so identical texts embed identically"""
+    rng = _rng_for("embedding", text)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class _FakeEmbeddings:
+    def __init__(self, client: "FakeLLMClient"):
+        self.client = client
+
+    def _respond(self, model: str, input: List[str], dimensions: Optional[int]):
+        dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        data = [
+            FakeEmbedding(index, fake_embedding(text, dimensions))
+            for index, text in enumerate(input)
+        ]
+        tokens = sum(len(text) // 4 + 1 for text in input)
+        self.client.observe(200, {})
+        return FakeEmbeddingResponse(model, data, FakeUsage(input_tokens=tokens))
+
+    def create(
+        self,
+        model: str,
+        input: List[str],
+        dimensions: Optional[int] = None,
+        **kwargs,
+    ):
+        # Embedding calls are much faster than completions
+        latency = sample_latency(self.client.next_rng()) / 10
+        response = self._respond(model, input, dimensions)
+        if self.client.is_async:
+            return self._finish_async(latency, response)
+
+        time.sleep(latency)
+        return response
+
+    async def _finish_async(self, latency, response):
+        await asyncio.sleep(latency)
+        return response
+
+
+class FakeLLMClient:
+    """
+    Offline stand-in for an instructor client (provider="fake").
+
+    Returns schema-valid responses after a simulated latency, occasionally
+    raising a simulated 429, and reports made-up token usage. Also serves
+    deterministic embeddings and message batches. Set FAKE_LLM_SEED to make latency and error
+    sequences reproducible.
+    """
+
+    def __init__(self, is_async: bool, limiter: Any = None):
+        self.is_async = is_async
+        self.limiter = limiter
+        self.chat = _FakeChat(self)
+        self.embeddings = _FakeEmbeddings(self)
+        self.messages = _FakeMessages()
+        self.beta = _FakeBeta()
+        self._calls = 0
+        self._random = random.Random()
+
+    def next_rng(self) -> random.Random:
+        self._calls += 1
+        if settings.FAKE_LLM_SEED:
+            return _rng_for("call", self._calls)
+        return random.Random(self._random.random())
+
+    def observe(self, status_code: int, headers: Dict[str, str]) -> None:
+        """Feed simulated responses to the shared rate limiter, like the httpx hooks"""
+        if self.limiter is not None:
+            self.limiter.observe_response(status_code, headers)
+
+    def close(self):
+        if self.is_async:
+            return self._aclose()
+
+    async def _aclose(self):
+        return None
+
+
+class RecordingStore:
+    """
+    Recorded LLM responses on disk, one JSON file per request key.
+
+    Each recording keeps the response, its token usage and the observed
+    latency, so replayed runs reproduce both results and timing.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(
+        self,
+        key: str,
+        model: str,
+        response: BaseModel,
+        usage: Dict[str, int],
+        latency: float,
+    ) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {
+            "model": model,
+            "response": response.model_dump(mode="json"),
+            "usage": usage,
+            "latency": latency,
+            "recorded_at": time.time(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+
+def completion_usage(completion: Any) -> Dict[str, int]:
+    """Token counts from a provider completion, for storing in a recording"""
+    usage = getattr(completion, "usage", None)
+    return {
+        "input_tokens": getattr(usage, "input_tokens", None)
+        or getattr(usage, "prompt_tokens", None)
+        or 0,
+        "output_tokens": getattr(usage, "output_tokens", None)
+        or getattr(usage, "completion_tokens", None)
+        or 0,
+        "cache_creation_input_tokens": getattr(
+            usage, "cache_creation_input_tokens", None
+        )
+        or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None)
+        or 0,
+    }
+
+
+_recording_store: Optional[RecordingStore] = None
+
+
+def get_recording_store() -> Optional[RecordingStore]:
+    """Return the recording store, or None unless LLM_RECORD_MODE is record/replay"""
+    global _recording_store
+    mode = settings.LLM_RECORD_MODE.lower()
+
+    if mode == "off":
+        return None
+    if mode not in ("record", "replay"):
+        raise ValueError(
+            f"Unsupported LLM record mode: {mode}. Use 'off', 'record' or 'replay'."
+        )
+
+    if _recording_store is None:
+        _recording_store = RecordingStore(settings.LLM_RECORDINGS_DIR)
+    return _recording_store
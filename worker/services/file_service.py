@@ -1,24 +1,115 @@
+import io
+import mmap
 import os
+import tempfile
+from typing import Any, Callable, List, Union
 
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from settings import settings
 
 
+class BufferReader(io.RawIOBase):
+    """
+    Seekable read-only file object over a buffer, without copying it.
+
+    Lets stream consumers (pypdf, multipart uploads) read a FileBuffer view
+    where they would otherwise need io.BytesIO(bytes(view)).
+    """
+
+    def __init__(self, buffer: Any):
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(offset, 0)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        data = self._view[self._position : end].tobytes()
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class FileBuffer:
+    """
+    A fetched file exposed as a read-only memoryview (`view`).
+
+    Files up to FILE_SPOOL_MAX_MEMORY bytes are held in memory; larger ones
+    live in a (spooled) temporary file or the local file itself and are
+    memory-mapped, so their pages are backed by the file rather than the
+    task's heap. Use as a context manager; the view is invalid after close().
+    """
+
+    def __init__(self, view: memoryview, closers: List[Callable[[], None]]):
+        self.view = view
+        self._closers = closers
+
+    @property
+    def size(self) -> int:
+        return len(self.view)
+
+    def close(self) -> None:
+        self.view.release()
+        for close in self._closers:
+            try:
+                close()
+            except BufferError:
+                # A slice of the mapping is still referenced somewhere; it is
+                # unmapped when that slice is garbage collected
+                pass
+        self._closers = []
+
+    def __enter__(self) -> "FileBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
 class FileService:
     """Handles file operations for both local and S3 files"""
 
     @staticmethod
     def read_file(file_path: str) -> bytes:
-        """Read file from local path or S3 based on environment"""
+        """Read a whole file into memory; prefer open_file for large documents"""
+        with FileService.open_file(file_path) as buffer:
+            return buffer.view.tobytes()
+
+    @staticmethod
+    def open_file(file_path: str) -> FileBuffer:
+        """
+        Fetch a file from local path or S3 without holding it all in memory.
+
+        Returns:
+            FileBuffer whose view the LLM and PDF layers read without copying
+        """
         if settings.DEVELOPMENT_MODE:
-            return FileService._read_local_file(file_path)
+            return FileService._open_local_file(file_path)
         else:
-            return FileService._read_s3_file(file_path)
+            return FileService._open_s3_file(file_path)
 
     @staticmethod
-    def _read_local_file(file_path: str) -> bytes:
-        """Read file from local filesystem"""
+    def _local_path(file_path: str) -> str:
         # Handle both absolute and relative paths
         if not os.path.isabs(file_path):
             file_path = os.path.join(settings.LOCAL_PDF_DIR, file_path)
@@ -26,30 +117,72 @@ class FileService:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        with open(file_path, "rb") as f:
-            return f.read()
+        return file_path
+
+    @staticmethod
+    def _open_local_file(file_path: str) -> FileBuffer:
+        """Memory-map a file from the local filesystem"""
+        with open(FileService._local_path(file_path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return FileBuffer(memoryview(b""), [])
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return FileBuffer(memoryview(mapping), [mapping.close])
 
     @staticmethod
-    def _read_s3_file(s3_key: str) -> bytes:
-        """Read file from S3"""
+    def write_file(file_path: str, data: Union[bytes, memoryview]) -> None:
+        """Write a file (bytes or a FileBuffer view) to local path or S3"""
+        if settings.DEVELOPMENT_MODE:
+            FileService._write_local_file(file_path, data)
+        else:
+            FileService._write_s3_file(file_path, data)
+
+    @staticmethod
+    def _write_local_file(file_path: str, data: Union[bytes, memoryview]) -> None:
+        """Write a file to the local filesystem, replacing it atomically"""
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(settings.LOCAL_PDF_DIR, file_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def _s3_client():
         if not settings.S3_BUCKET_NAME:
             raise ValueError("S3_BUCKET_NAME not configured")
 
         if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
             raise ValueError("AWS credentials not configured")
 
+        return boto3.client(
+            "s3",
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        )
+
+    @staticmethod
+    def _write_s3_file(s3_key: str, data: Union[bytes, memoryview]) -> None:
+        """Write a file to S3, streaming the body from the buffer"""
+        s3_client = FileService._s3_client()
         try:
-            # Create S3 client
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            s3_client.put_object(
+                Bucket=settings.S3_BUCKET_NAME, Key=s3_key, Body=BufferReader(data)
             )
+        except NoCredentialsError:
+            raise ValueError("AWS credentials are invalid or not provided")
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error writing to S3: {e}")
 
-            # Get object from S3
-            response = s3_client.get_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+    @staticmethod
+    def _get_s3_object(s3_key: str) -> dict:
+        """Start a GetObject request; the body is read by the caller"""
+        s3_client = FileService._s3_client()
 
-            return response["Body"].read()
+        try:
+            # Get object from S3
+            return s3_client.get_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
 
         except NoCredentialsError:
             raise ValueError("AWS credentials are invalid or not provided")
@@ -64,6 +197,40 @@ class FileService:
         except Exception as e:
             raise RuntimeError(f"Unexpected error reading from S3: {e}")
 
+    @staticmethod
+    def _open_s3_file(s3_key: str) -> FileBuffer:
+        """
+        Stream a file from S3 into a spooled temporary file.
+
+        The body is copied FILE_STREAM_CHUNK_SIZE bytes at a time; past
+        FILE_SPOOL_MAX_MEMORY bytes the spool moves to disk and is
+        memory-mapped instead of read back.
+        """
+        response = FileService._get_s3_object(s3_key)
+        spool = tempfile.SpooledTemporaryFile(max_size=settings.FILE_SPOOL_MAX_MEMORY)
+        try:
+            for chunk in response["Body"].iter_chunks(settings.FILE_STREAM_CHUNK_SIZE):
+                spool.write(chunk)
+            size = spool.tell()
+
+            if size <= settings.FILE_SPOOL_MAX_MEMORY:
+                spool.seek(0)
+                data = spool.read()
+                spool.close()
+                return FileBuffer(memoryview(data), [])
+
+            return FileService.map_file(spool)
+        except Exception as e:
+            spool.close()
+            raise RuntimeError(f"Unexpected error reading from S3: {e}")
+
+    @staticmethod
+    def map_file(f: Any) -> FileBuffer:
+        """Memory-map an open (temporary) file; the FileBuffer closes it"""
+        f.flush()
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return FileBuffer(memoryview(mapping), [mapping.close, f.close])
+
     @staticmethod
     def get_file_name(file_path: str) -> str:
         """Extract filename from path or S3 key"""
@@ -0,0 +1,194 @@
+import asyncio
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database import DocumentChunk
+from services.embedding_service import embed_texts_cached
+from services.text_layer_service import iter_page_text
+from settings import settings
+
+
+def _break_point(text: str, limit: int) -> int:
+    """Where to end a chunk of at most `limit` characters (paragraph, sentence, word)"""
+    if len(text) <= limit:
+        return len(text)
+
+    floor = limit // 2
+    for separator in ("\n\n", ". ", "\n", " "):
+        position = text.rfind(separator, floor, limit)
+        if position != -1:
+            return position + len(separator)
+    return limit
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Split streamed page text into overlapping chunks of about chunk_size characters.
+
+    Chunks may span pages. Each chunk's metadata records where it starts and
+    ends as (page, character offset within that page), so answers can cite
+    their source.
+
+    Yields:
+        Dicts with "chunk_index", "content" and "chunk_metadata"
+    """
+    buffer = ""
+    # (buffer position where the page's text starts, page number); positions
+    # go negative once the start of a page has been consumed
+    page_starts: List[Tuple[int, int]] = []
+    chunk_index = 0
+
+    def _locate(position: int) -> Tuple[int, int]:
+        start, page_number = page_starts[0]
+        for page_start, number in page_starts:
+            if page_start > position:
+                break
+            start, page_number = page_start, number
+        return page_number, position - start
+
+    def _emit(end: int) -> Dict[str, Any]:
+        page_start, offset_start = _locate(0)
+        page_end, offset_end = _locate(max(end - 1, 0))
+        return {
+            "chunk_index": chunk_index,
+            "content": buffer[:end].strip(),
+            "chunk_metadata": {
+                "page_start": page_start,
+                "page_end": page_end,
+                "char_start": offset_start,
+                "char_end": offset_end + 1,
+            },
+        }
+
+    for page_number, text in pages:
+        if not text.strip():
+            continue
+        if buffer:
+            buffer += "\n"
+        page_starts.append((len(buffer), page_number))
+        buffer += text
+
+        while len(buffer) >= chunk_size:
+            end = _break_point(buffer, chunk_size)
+            chunk = _emit(end)
+            if chunk["content"]:
+                yield chunk
+                chunk_index += 1
+
+            # Start the next chunk chunk_overlap characters back, on a word boundary
+            start = max(end - chunk_overlap, 0)
+            word_start = buffer.find(" ", start, end)
+            start = word_start + 1 if word_start != -1 and start > 0 else end
+            buffer = buffer[start:]
+            page_starts = [(position - start, page) for position, page in page_starts]
+            while len(page_starts) > 1 and page_starts[1][0] <= 0:
+                page_starts.pop(0)
+
+    if buffer.strip():
+        yield _emit(len(buffer))
+
+
+def store_chunks(
+    db,
+    prior_auth_id: str,
+    file_id: str,
+    chunks: List[Dict[str, Any]],
+    embeddings: List[List[float]],
+) -> None:
+    """Insert embedded chunks with one multi-row INSERT (executemany) and commit"""
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "prior_authorization_id": prior_auth_id,
+            "file_id": file_id,
+            "chunk_index": chunk["chunk_index"],
+            "content": chunk["content"],
+            "chunk_metadata": chunk["chunk_metadata"],
+            "embedding": embedding,
+        }
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    db.execute(DocumentChunk.__table__.insert(), rows)
+    db.commit()
+
+
+async def ingest_document(
+    db,
+    prior_auth_id: str,
+    file_id: str,
+    pdf_content: bytes,
+    stats: Optional[Dict[str, int]] = None,
+) -> int:
+    """
+    Extract, chunk, embed and store a PDF's text as DocumentChunks.
+
+    Chunks flow through in EMBEDDING_BATCH_SIZE batches with at most
+    EMBEDDING_MAX_CONCURRENCY batches embedding at once; each batch is
+    inserted as soon as its embeddings arrive, so memory use is bounded by
+    the batches in flight rather than by the size of the document. Existing
+    chunks for the file are replaced, so re-running is safe. Only chunks
+    missing from the embedding cache are sent to the embedding API.
+
+    Args:
+        stats: Optional dict filled with embedding cache hit/miss counts
+
+    Returns:
+        Number of chunks stored
+    """
+    db.query(DocumentChunk).filter(
+        DocumentChunk.prior_authorization_id == prior_auth_id,
+        DocumentChunk.file_id == file_id,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    in_flight = set()
+    stored = 0
+
+    async def _embed_and_store(batch: List[Dict[str, Any]]) -> None:
+        nonlocal stored
+        try:
+            embeddings = await embed_texts_cached(
+                db, [chunk["content"] for chunk in batch], stats
+            )
+            store_chunks(db, prior_auth_id, file_id, batch, embeddings)
+            stored += len(batch)
+        finally:
+            semaphore.release()
+
+    async def _submit(batch: List[Dict[str, Any]]) -> None:
+        # Waiting for a free slot here is what keeps memory flat: extraction
+        # pauses until an in-flight batch has been embedded and stored
+        await semaphore.acquire()
+        in_flight.add(asyncio.ensure_future(_embed_and_store(batch)))
+
+        # Surface failures early instead of extracting the rest of the document
+        for task in [task for task in in_flight if task.done()]:
+            in_flight.discard(task)
+            task.result()
+
+    try:
+        batch = []
+        chunks = iter_chunks(
+            iter_page_text(pdf_content),
+            chunk_size=settings.CHUNK_SIZE_CHARS,
+            chunk_overlap=settings.CHUNK_OVERLAP_CHARS,
+        )
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= settings.EMBEDDING_BATCH_SIZE:
+                await _submit(batch)
+                batch = []
+        if batch:
+            await _submit(batch)
+
+        await asyncio.gather(*in_flight)
+    finally:
+        for task in list(in_flight):
+            task.cancel()
+
+    return stored
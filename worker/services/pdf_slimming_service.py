@@ -0,0 +1,231 @@
+import hashlib
+import json
+import tempfile
+from typing import Any, Dict
+
+import redis
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from services.cache_service import get_redis_client, hash_bytes
+from services.file_service import BufferReader, FileBuffer, FileService
+from settings import settings
+
+# A page with no text, images or annotations whose content stream is at most
+# this long only draws rules or borders
+BLANK_PAGE_MAX_CONTENT_BYTES = 256
+
+
+def _page_xobjects(page) -> Dict[str, Any]:
+    resources = page.get("/Resources")
+    if resources is None:
+        return {}
+    xobjects = resources.get_object().get("/XObject")
+    return xobjects.get_object() if xobjects is not None else {}
+
+
+def _page_content(page) -> bytes:
+    contents = page.get_contents()
+    return contents.get_data() if contents is not None else b""
+
+
+def page_fingerprint(page) -> str:
+    """Hash of what a page draws: its content stream and the XObjects it uses"""
+    digest = hashlib.sha256(_page_content(page))
+    xobjects = _page_xobjects(page)
+    for name in sorted(xobjects):
+        digest.update(name.encode("utf-8"))
+        digest.update(xobjects[name].get_object().get_data())
+    return digest.hexdigest()
+
+
+def is_blank_page(page) -> bool:
+    """No text, no images or forms, no annotations and (almost) nothing drawn"""
+    if page.get("/Annots") or _page_xobjects(page):
+        return False
+    if len(_page_content(page).strip()) > BLANK_PAGE_MAX_CONTENT_BYTES:
+        return False
+    try:
+        return not (page.extract_text() or "").strip()
+    except Exception:
+        return False
+
+
+def downsample_images(page) -> int:
+    """
+    Re-encode a (writer) page's images above PDF_SLIM_TARGET_DPI at that DPI.
+
+    Resolution is estimated against the page width, which never overstates
+    it for an image drawn narrower than the page. Bilevel scans are already
+    compact and are left alone.
+
+    Returns:
+        Number of images replaced
+    """
+    page_inches = float(page.mediabox.width) / 72
+    replaced = 0
+    for image in page.images:
+        try:
+            picture = image.image
+            if picture is None or picture.mode == "1" or page_inches <= 0:
+                continue
+            dpi = picture.width / page_inches
+            if dpi <= settings.PDF_SLIM_TARGET_DPI * 1.1:
+                continue
+
+            scale = settings.PDF_SLIM_TARGET_DPI / dpi
+            size = (
+                max(1, int(picture.width * scale)),
+                max(1, int(picture.height * scale)),
+            )
+            resized = picture.resize(size, Image.LANCZOS)
+            if resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            image.replace(resized, quality=settings.PDF_SLIM_JPEG_QUALITY)
+            replaced += 1
+        except Exception as e:
+            print(f"⚠ Could not downsample image {image.name}: {str(e)}")
+    return replaced
+
+
+def slim_pdf(pdf_content: bytes) -> Dict[str, Any]:
+    """
+    Shrink a PDF before it is sent to the LLM.
+
+    Drops blank pages and exact duplicates of earlier pages, downsamples
+    images to PDF_SLIM_TARGET_DPI and removes duplicate and unreferenced
+    objects (such as fonts and images only used by dropped pages).
+
+    The slimmed PDF is written to a temporary file rather than held in
+    memory, and returned memory-mapped.
+
+    Returns:
+        Dict with the slimmed "content" (a FileBuffer the caller closes), the
+        "page_map" (original page number of each remaining page, in order),
+        "blank_pages", "duplicate_pages" ([original page, earlier page it
+        repeats] pairs), "images_downsampled" and the "original_bytes" and
+        "slim_bytes" sizes
+    """
+    reader = PdfReader(BufferReader(pdf_content))
+    writer = PdfWriter()
+
+    page_map = []
+    blank_pages = []
+    duplicate_pages = []
+    seen = {}
+    for page_number, page in enumerate(reader.pages, start=1):
+        if settings.PDF_SLIM_DROP_BLANK_PAGES and is_blank_page(page):
+            blank_pages.append(page_number)
+            continue
+        if settings.PDF_SLIM_DROP_DUPLICATE_PAGES:
+            fingerprint = page_fingerprint(page)
+            if fingerprint in seen:
+                duplicate_pages.append([page_number, seen[fingerprint]])
+                continue
+            seen[fingerprint] = page_number
+        writer.add_page(page)
+        page_map.append(page_number)
+
+    if not page_map:
+        # Never send an empty document; keep the first page
+        writer.add_page(reader.pages[0])
+        page_map.append(1)
+        blank_pages = blank_pages[1:]
+
+    images_downsampled = 0
+    for page in writer.pages:
+        images_downsampled += downsample_images(page)
+        page.compress_content_streams()
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+    output = tempfile.TemporaryFile()
+    try:
+        writer.write(output)
+        content = FileService.map_file(output)
+    except Exception:
+        output.close()
+        raise
+    return {
+        "content": content,
+        "page_map": page_map,
+        "blank_pages": blank_pages,
+        "duplicate_pages": duplicate_pages,
+        "images_downsampled": images_downsampled,
+        "original_bytes": len(pdf_content),
+        "slim_bytes": output.tell(),
+    }
+
+
+def _cache_key(sha256: str) -> str:
+    # Options are part of the key so retuning them re-slims documents
+    return (
+        f"slim_pdf:{sha256}:{settings.PDF_SLIM_TARGET_DPI}:"
+        f"{settings.PDF_SLIM_JPEG_QUALITY}:{settings.PDF_SLIM_DROP_BLANK_PAGES}:"
+        f"{settings.PDF_SLIM_DROP_DUPLICATE_PAGES}"
+    )
+
+
+def get_slim_pdf(pdf_content: bytes) -> Dict[str, Any]:
+    """
+    slim_pdf, cached per content hash: the slimmed file in file storage
+    (PDF_SLIM_CACHE_PREFIX) and its metadata in Redis, which is also the
+    Celery broker and must not hold document bodies.
+
+    "content" is a FileBuffer for the caller to close: the memory-mapped
+    slimmed file, or a view of pdf_content when slimming is disabled, fails or
+    would not make the file smaller ("page_map" is then None).
+    """
+    unchanged = {"content": FileBuffer(memoryview(pdf_content), []), "page_map": None}
+    if not settings.PDF_SLIM_ENABLED:
+        return unchanged
+
+    key = _cache_key(hash_bytes(pdf_content))
+    try:
+        meta = get_redis_client().get(key)
+    except redis.RedisError as e:
+        print(f"⚠ PDF slimming cache read failed: {str(e)}")
+        meta = None
+
+    if meta is not None:
+        slimmed = json.loads(meta)
+        if slimmed.get("unchanged"):
+            return unchanged
+        try:
+            return {**slimmed, "content": FileService.open_file(slimmed["path"])}
+        except Exception as e:
+            print(f"⚠ Cached slim PDF unavailable, slimming again: {str(e)}")
+
+    try:
+        slimmed = slim_pdf(pdf_content)
+    except Exception as e:
+        print(f"⚠ PDF slimming failed, sending the original: {str(e)}")
+        return unchanged
+
+    smaller = slimmed["slim_bytes"] < slimmed["original_bytes"]
+    print(
+        f"🗜 Slimmed PDF from {slimmed['original_bytes']} to "
+        f"{slimmed['slim_bytes']} bytes: "
+        f"{len(slimmed['blank_pages'])} blank and "
+        f"{len(slimmed['duplicate_pages'])} duplicate pages dropped, "
+        f"{slimmed['images_downsampled']} images downsampled"
+        + ("" if smaller else " (keeping the original)")
+    )
+
+    try:
+        ttl = settings.LLM_CACHE_TTL_SECONDS or None
+        if not smaller:
+            get_redis_client().set(key, json.dumps({"unchanged": True}), ex=ttl)
+        elif slimmed["slim_bytes"] <= settings.PDF_SLIM_CACHE_MAX_BYTES:
+            meta = {k: v for k, v in slimmed.items() if k != "content"}
+            meta["path"] = (
+                f"{settings.PDF_SLIM_CACHE_PREFIX}/"
+                f"{hash_bytes(key.encode('utf-8'))}.pdf"
+            )
+            FileService.write_file(meta["path"], slimmed["content"].view)
+            get_redis_client().set(key, json.dumps(meta), ex=ttl)
+    except Exception as e:
+        print(f"⚠ PDF slimming cache write failed: {str(e)}")
+
+    if not smaller:
+        slimmed["content"].close()
+        return unchanged
+    return slimmed
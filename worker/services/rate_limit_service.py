@@ -0,0 +1,306 @@
+import asyncio
+import time
+from typing import Dict, Mapping, Optional
+
+import redis
+from services.cache_service import get_redis_client
+from settings import settings
+
+# Token bucket refilled continuously at rpm/tpm per minute. Limits live in a
+# separate hash so AIMD adjustments apply to every worker at once. Returns the
+# seconds to wait (as a string), or "0" once the request has been admitted.
+ACQUIRE_SCRIPT = """
+local limits = redis.call('HMGET', KEYS[1], 'rpm', 'tpm')
+local rpm = tonumber(limits[1]) or tonumber(ARGV[1])
+local tpm = tonumber(limits[2]) or tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+
+local pause_ms = redis.call('PTTL', KEYS[3])
+if pause_ms > 0 then
+  return tostring(pause_ms / 1000)
+end
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[2], 'requests', 'tokens', 'updated_at')
+local requests = tonumber(bucket[1]) or rpm
+local tokens = tonumber(bucket[2]) or tpm
+local updated_at = tonumber(bucket[3]) or now
+local elapsed = math.max(0, now - updated_at)
+
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local wait = 0
+if requests < 1 then
+  wait = (1 - requests) * 60 / rpm
+end
+if tokens < cost then
+  wait = math.max(wait, (cost - tokens) * 60 / tpm)
+end
+if wait == 0 then
+  requests = requests - 1
+  tokens = tokens - cost
+end
+
+redis.call('HSET', KEYS[2], 'requests', requests, 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[2], 300)
+return tostring(wait)
+"""
+
+# AIMD adjustment of the shared limits:
+#   increase - additive step after a successful request, up to the ceiling
+#   decrease - multiplicative back-off after a 429/529, at most once per cooldown
+#   observe  - adopt provider-declared limits as the ceiling (raising the
+#              limits when the provider allows more than configured) and clamp
+#              the bucket to what the provider says is remaining
+ADJUST_SCRIPT = """
+local mode = ARGV[1]
+local limits = redis.call('HMGET', KEYS[1], 'rpm', 'tpm', 'rpm_ceiling', 'tpm_ceiling', 'decreased_at')
+local rpm = tonumber(limits[1]) or tonumber(ARGV[2])
+local tpm = tonumber(limits[2]) or tonumber(ARGV[3])
+local rpm_ceiling = tonumber(limits[3]) or tonumber(ARGV[2])
+local tpm_ceiling = tonumber(limits[4]) or tonumber(ARGV[3])
+local decreased_at = tonumber(limits[5]) or 0
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+if mode == 'increase' then
+  local step = tonumber(ARGV[4])
+  rpm = math.min(rpm_ceiling, rpm + step)
+  tpm = math.min(tpm_ceiling, tpm + step * tpm_ceiling / rpm_ceiling)
+elseif mode == 'decrease' then
+  local factor = tonumber(ARGV[4])
+  local min_rpm = tonumber(ARGV[5])
+  local pause_ms = tonumber(ARGV[6])
+  local cooldown = tonumber(ARGV[7])
+  if pause_ms and pause_ms > 0 then
+    redis.call('SET', KEYS[3], 1, 'PX', math.floor(pause_ms))
+  end
+  if now - decreased_at >= cooldown then
+    rpm = math.max(min_rpm, rpm * factor)
+    tpm = math.max(min_rpm * tpm_ceiling / rpm_ceiling, tpm * factor)
+    decreased_at = now
+  end
+elseif mode == 'observe' then
+  local header_rpm = tonumber(ARGV[4])
+  local header_tpm = tonumber(ARGV[5])
+  local remaining_requests = tonumber(ARGV[6])
+  local remaining_tokens = tonumber(ARGV[7])
+  -- Configured limits are only a starting point: a higher provider limit
+  -- raises the current limit by the same amount, a lower one caps it
+  if header_rpm then
+    if header_rpm > rpm_ceiling then
+      rpm = rpm + header_rpm - rpm_ceiling
+    end
+    rpm_ceiling = header_rpm
+    rpm = math.min(rpm, rpm_ceiling)
+  end
+  if header_tpm then
+    if header_tpm > tpm_ceiling then
+      tpm = tpm + header_tpm - tpm_ceiling
+    end
+    tpm_ceiling = header_tpm
+    tpm = math.min(tpm, tpm_ceiling)
+  end
+  local bucket = redis.call('HMGET', KEYS[2], 'requests', 'tokens')
+  if remaining_requests and tonumber(bucket[1]) then
+    redis.call('HSET', KEYS[2], 'requests', math.min(tonumber(bucket[1]), remaining_requests))
+  end
+  if remaining_tokens and tonumber(bucket[2]) then
+    redis.call('HSET', KEYS[2], 'tokens', math.min(tonumber(bucket[2]), remaining_tokens))
+  end
+end
+
+redis.call('HSET', KEYS[1], 'rpm', rpm, 'tpm', tpm, 'rpm_ceiling', rpm_ceiling,
+  'tpm_ceiling', tpm_ceiling, 'decreased_at', decreased_at)
+return {tostring(rpm), tostring(tpm)}
+"""
+
+# Return tokens charged up front but not used (or charge the shortfall) once
+# the provider has reported a request's actual input tokens
+SETTLE_SCRIPT = """
+local tpm = tonumber(redis.call('HGET', KEYS[1], 'tpm')) or tonumber(ARGV[1])
+local tokens = tonumber(redis.call('HGET', KEYS[2], 'tokens'))
+if tokens then
+  redis.call('HSET', KEYS[2], 'tokens', math.min(tpm, tokens + tonumber(ARGV[2])))
+end
+return 0
+"""
+
+# Provider headers carrying declared limits and remaining capacity
+RATE_LIMIT_HEADERS = {
+    "anthropic": {
+        "requests_limit": "anthropic-ratelimit-requests-limit",
+        "tokens_limit": "anthropic-ratelimit-input-tokens-limit",
+        "requests_remaining": "anthropic-ratelimit-requests-remaining",
+        "tokens_remaining": "anthropic-ratelimit-input-tokens-remaining",
+    },
+    "openai": {
+        "requests_limit": "x-ratelimit-limit-requests",
+        "tokens_limit": "x-ratelimit-limit-tokens",
+        "requests_remaining": "x-ratelimit-remaining-requests",
+        "tokens_remaining": "x-ratelimit-remaining-tokens",
+    },
+}
+
+
+def _header_number(headers: Mapping[str, str], name: Optional[str]) -> str:
+    """Return a numeric header as a string, or "" if absent or not numeric"""
+    value = headers.get(name) if name else None
+    try:
+        return str(float(value)) if value is not None else ""
+    except ValueError:
+        return ""
+
+
+class RateLimiter:
+    """
+    Cluster-wide request and token budget for one provider, shared through Redis.
+
+    Limits start at the configured rpm/tpm, follow the limits the provider
+    advertises in its rate-limit headers, back off multiplicatively on 429/529
+    responses and recover additively on success.
+
+    Redis calls are blocking; the async methods run them in a thread so the
+    event loop keeps serving other requests. If Redis is unavailable the
+    limiter fails open and requests go out unthrottled.
+    """
+
+    def __init__(self, provider: str, rpm: float, tpm: float):
+        self.client = get_redis_client()
+        self.provider = provider
+        self.default_rpm = rpm
+        self.default_tpm = tpm
+        self.limits_key = f"llm_rate:{provider}:limits"
+        self.bucket_key = f"llm_rate:{provider}:bucket"
+        self.pause_key = f"llm_rate:{provider}:pause"
+        self._acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+        self._adjust_script = self.client.register_script(ADJUST_SCRIPT)
+        self._settle_script = self.client.register_script(SETTLE_SCRIPT)
+
+    @property
+    def _keys(self):
+        return [self.limits_key, self.bucket_key, self.pause_key]
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and `tokens` from the bucket; returns seconds to wait (0 if admitted)"""
+        wait = self._acquire_script(
+            keys=self._keys, args=[self.default_rpm, self.default_tpm, tokens]
+        )
+        return float(wait)
+
+    async def acquire(self, tokens: int) -> None:
+        while True:
+            try:
+                wait = await asyncio.to_thread(self.try_acquire, tokens)
+            except redis.RedisError as e:
+                print(f"⚠ Rate limiter unavailable, not throttling: {str(e)}")
+                return
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int) -> None:
+        while True:
+            try:
+                wait = self.try_acquire(tokens)
+            except redis.RedisError as e:
+                print(f"⚠ Rate limiter unavailable, not throttling: {str(e)}")
+                return
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def settle(self, charged: int, used: int) -> None:
+        """Correct the bucket once a request's actual input tokens are known"""
+        if charged == used:
+            return
+        try:
+            self._settle_script(
+                keys=self._keys, args=[self.default_tpm, charged - used]
+            )
+        except redis.RedisError as e:
+            print(f"⚠ Rate limiter update failed: {str(e)}")
+
+    async def settle_async(self, charged: int, used: int) -> None:
+        await asyncio.to_thread(self.settle, charged, used)
+
+    def _adjust(self, mode: str, *args) -> None:
+        self._adjust_script(
+            keys=self._keys, args=[mode, self.default_rpm, self.default_tpm, *args]
+        )
+
+    def on_success(self) -> None:
+        self._adjust("increase", settings.LLM_RATE_LIMIT_INCREASE_RPM)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self._adjust(
+            "decrease",
+            settings.LLM_RATE_LIMIT_DECREASE_FACTOR,
+            settings.LLM_RATE_LIMIT_MIN_RPM,
+            int((retry_after or 0) * 1000),
+            settings.LLM_RATE_LIMIT_DECREASE_COOLDOWN,
+        )
+
+    def observe_headers(self, headers: Mapping[str, str]) -> None:
+        names = RATE_LIMIT_HEADERS.get(self.provider, {})
+        values = [
+            _header_number(headers, names.get(field))
+            for field in (
+                "requests_limit",
+                "tokens_limit",
+                "requests_remaining",
+                "tokens_remaining",
+            )
+        ]
+        if any(values):
+            self._adjust("observe", *values)
+
+    def observe_response(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Feed a provider HTTP response into the limiter"""
+        try:
+            if status_code in (429, 529):
+                retry_after = headers.get("retry-after")
+                try:
+                    retry_after = float(retry_after) if retry_after else None
+                except ValueError:
+                    retry_after = None
+                self.on_rate_limited(retry_after)
+            elif 200 <= status_code < 300:
+                self.on_success()
+                self.observe_headers(headers)
+        except redis.RedisError as e:
+            print(f"⚠ Rate limiter update failed: {str(e)}")
+
+    async def observe_response_async(
+        self, status_code: int, headers: Mapping[str, str]
+    ) -> None:
+        await asyncio.to_thread(self.observe_response, status_code, headers)
+
+    def limits(self) -> Dict[str, float]:
+        rpm, tpm = self.client.hmget(self.limits_key, "rpm", "tpm")
+        return {
+            "rpm": float(rpm) if rpm else self.default_rpm,
+            "tpm": float(tpm) if tpm else self.default_tpm,
+        }
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(provider: str) -> Optional[RateLimiter]:
+    """Return the shared limiter for a provider, or None if rate limiting is disabled"""
+    if not settings.LLM_RATE_LIMIT_ENABLED:
+        return None
+
+    provider = provider.lower()
+    if provider not in _rate_limiters:
+        _rate_limiters[provider] = RateLimiter(
+            provider,
+            rpm=settings.LLM_RATE_LIMIT_RPM,
+            tpm=settings.LLM_RATE_LIMIT_TPM,
+        )
+    return _rate_limiters[provider]
@@ -0,0 +1,296 @@
+from typing import Any, Dict, List
+
+from database import VECTOR_DIMENSIONS, VECTOR_QUANTIZATION
+from services.embedding_service import embed_texts_cached
+from settings import settings
+from sqlalchemy import text
+
+# Transaction-scoped pgvector search settings. Iterative scans (pgvector 0.8+)
+# keep walking the index until enough rows pass the prior_authorization_id
+# filter, so filtering does not cut results short; older versions ignore them.
+SEARCH_SETTINGS = {
+    # ef_search bounds how many candidates an HNSW scan returns
+    "hnsw.ef_search": lambda: max(
+        settings.RETRIEVAL_HNSW_EF_SEARCH,
+        settings.RETRIEVAL_RERANK_CANDIDATES if VECTOR_QUANTIZATION != "none" else 0,
+    ),
+    "hnsw.iterative_scan": lambda: settings.RETRIEVAL_ITERATIVE_SCAN,
+    "hnsw.max_scan_tuples": lambda: settings.RETRIEVAL_MAX_SCAN_TUPLES,
+    "ivfflat.probes": lambda: settings.RETRIEVAL_IVFFLAT_PROBES,
+    "ivfflat.iterative_scan": lambda: settings.RETRIEVAL_ITERATIVE_SCAN,
+}
+
+
+# Query parameters are written inline (not in a CTE) so the planner sees
+# constants and can use the HNSW and GIN indexes. The lexical leg ORs the
+# query's lexemes so long criterion descriptions still match chunks containing
+# their rare exact terms (codes, drugs, labs), which ts_rank_cd then favours.
+_QUERY_EMBEDDING = "CAST(:embedding AS vector)"
+_QUERY_TERMS = (
+    "CAST(replace(plainto_tsquery('english', :query_text)::text, ' & ', ' | ') "
+    "AS tsquery)"
+)
+
+# Distance on the quantized embedding, matching the index expressions in
+# database.QUANTIZED_EMBEDDING_INDEX
+_COMPACT_DISTANCE = {
+    "halfvec": f"embedding::halfvec({VECTOR_DIMENSIONS}) "
+    f"<=> CAST(:embedding AS halfvec({VECTOR_DIMENSIONS}))",
+    "binary": f"binary_quantize(embedding)::bit({VECTOR_DIMENSIONS}) "
+    f"<~> binary_quantize({_QUERY_EMBEDDING})",
+}
+
+
+def _vector_hits_sql(quantization: str, limit: str) -> str:
+    """
+    CTE ranking a prior auth's chunks by cosine distance to the query.
+
+    With quantization, RETRIEVAL_RERANK_CANDIDATES candidates come from the
+    compact index and are re-ranked on their full-precision embeddings.
+    """
+    if quantization == "none":
+        return f"""vector_hits AS (
+    SELECT id, row_number() OVER (ORDER BY embedding <=> {_QUERY_EMBEDDING}) AS rank
+    FROM document_chunks
+    WHERE prior_authorization_id = :prior_auth_id
+    ORDER BY embedding <=> {_QUERY_EMBEDDING}
+    LIMIT {limit}
+)"""
+
+    return f"""compact_hits AS (
+    SELECT id, embedding
+    FROM document_chunks
+    WHERE prior_authorization_id = :prior_auth_id
+    ORDER BY {_COMPACT_DISTANCE[quantization]}
+    LIMIT :rerank_candidates
+),
+vector_hits AS (
+    SELECT id, row_number() OVER (ORDER BY embedding <=> {_QUERY_EMBEDDING}) AS rank
+    FROM compact_hits
+    ORDER BY embedding <=> {_QUERY_EMBEDDING}
+    LIMIT {limit}
+)"""
+
+
+def hybrid_search_sql(quantization: str) -> str:
+    """Hybrid search: dense and lexical candidates fused by reciprocal rank fusion"""
+    return f"""
+WITH {_vector_hits_sql(quantization, ":candidates")},
+lexical_hits AS (
+    SELECT id,
+        row_number() OVER (ORDER BY ts_rank_cd(content_tsv, {_QUERY_TERMS}) DESC)
+            AS rank
+    FROM document_chunks
+    WHERE prior_authorization_id = :prior_auth_id
+        AND content_tsv @@ {_QUERY_TERMS}
+    ORDER BY ts_rank_cd(content_tsv, {_QUERY_TERMS}) DESC
+    LIMIT :candidates
+)
+SELECT
+    c.content,
+    c.chunk_index,
+    c.chunk_metadata,
+    c.embedding <=> {_QUERY_EMBEDDING} AS distance,
+    COALESCE(1.0 / (:rrf_k + v.rank), 0) + COALESCE(1.0 / (:rrf_k + l.rank), 0)
+        AS score
+FROM vector_hits v
+FULL OUTER JOIN lexical_hits l ON l.id = v.id
+JOIN document_chunks c ON c.id = COALESCE(v.id, l.id)
+ORDER BY score DESC
+LIMIT :top_k
+"""
+
+
+def vector_search_sql(quantization: str) -> str:
+    """Dense-only search: the top_k chunks by full-precision cosine distance"""
+    return f"""
+WITH {_vector_hits_sql(quantization, ":top_k")}
+SELECT
+    c.id,
+    c.content,
+    c.chunk_index,
+    c.chunk_metadata,
+    c.embedding <=> {_QUERY_EMBEDDING} AS distance
+FROM vector_hits v
+JOIN document_chunks c ON c.id = v.id
+ORDER BY v.rank
+"""
+
+
+HYBRID_SEARCH_SQL = hybrid_search_sql(VECTOR_QUANTIZATION)
+VECTOR_SEARCH_SQL = vector_search_sql(VECTOR_QUANTIZATION)
+
+
+def _embedding_literal(embedding: List[float]) -> str:
+    return "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+
+def apply_search_settings(db) -> None:
+    """Set ANN search parameters for the current transaction, in one round trip"""
+    names = list(SEARCH_SETTINGS)
+    calls = ", ".join(
+        f"set_config(:name_{i}, :value_{i}, true)" for i in range(len(names))
+    )
+    params = {}
+    for i, name in enumerate(names):
+        params[f"name_{i}"] = name
+        params[f"value_{i}"] = str(SEARCH_SETTINGS[name]())
+    db.execute(text(f"SELECT {calls}"), params)
+
+
+def _passage(row: Any) -> Dict[str, Any]:
+    return {
+        "content": row.content,
+        "chunk_index": row.chunk_index,
+        "page_start": (row.chunk_metadata or {}).get("page_start"),
+        "page_end": (row.chunk_metadata or {}).get("page_end"),
+        "similarity": 1 - row.distance,
+    }
+
+
+def hybrid_search_chunks(
+    db,
+    prior_auth_id: str,
+    query_text: str,
+    query_embedding: List[float],
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """
+    Return the top_k chunks of a prior auth's documents by fused lexical and
+    vector rank (reciprocal rank fusion over RETRIEVAL_CANDIDATES of each).
+
+    Returns:
+        Passages ordered by fused score, as from search_chunks
+    """
+    apply_search_settings(db)
+
+    rows = db.execute(
+        text(HYBRID_SEARCH_SQL),
+        {
+            "embedding": _embedding_literal(query_embedding),
+            "query_text": query_text,
+            "prior_auth_id": prior_auth_id,
+            "candidates": settings.RETRIEVAL_CANDIDATES,
+            "rerank_candidates": settings.RETRIEVAL_RERANK_CANDIDATES,
+            "rrf_k": settings.RETRIEVAL_RRF_K,
+            "top_k": top_k,
+        },
+    ).all()
+
+    return [_passage(row) for row in rows]
+
+
+def search_chunks(
+    db,
+    prior_auth_id: str,
+    query_embedding: List[float],
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """
+    Return the top_k chunks of a prior auth's documents closest to an embedding.
+
+    Uses the ANN index on embedding (or its quantized form, re-ranked on
+    full precision) with the configured ef_search/probes, filtered to the
+    prior auth with an iterative index scan.
+
+    Returns:
+        Passages ordered by similarity, each with "content", "chunk_index",
+        "page_start", "page_end" and cosine "similarity"
+    """
+    apply_search_settings(db)
+
+    rows = db.execute(
+        text(VECTOR_SEARCH_SQL),
+        {
+            "embedding": _embedding_literal(query_embedding),
+            "prior_auth_id": prior_auth_id,
+            "rerank_candidates": settings.RETRIEVAL_RERANK_CANDIDATES,
+            "top_k": top_k,
+        },
+    ).all()
+
+    # relaxed_order iterative scans may return rows slightly out of order
+    rows = sorted(rows, key=lambda row: row.distance)
+
+    return [_passage(row) for row in rows]
+
+
+_content_tsv_ready = False
+
+
+def hybrid_search_ready(db) -> bool:
+    """
+    Whether document_chunks has the content_tsv column hybrid search reads.
+    It is added by scripts/migrate_document_chunks.py, not at startup; until
+    that has run, retrieval uses vector search only.
+    """
+    global _content_tsv_ready
+    if not _content_tsv_ready:
+        _content_tsv_ready = (
+            db.execute(
+                text(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'document_chunks' "
+                    "AND column_name = 'content_tsv'"
+                )
+            ).first()
+            is not None
+        )
+    return _content_tsv_ready
+
+
+async def retrieve_passages(
+    db,
+    prior_auth_id: str,
+    criteria: List[Dict[str, Any]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Find the most relevant clinical-notes passages for each criterion.
+
+    Criteria whose best passage is less similar than RETRIEVAL_MIN_SIMILARITY
+    are left out, so they are answered against the full document instead.
+
+    Returns:
+        Mapping of criterion id to its passages, in document order
+    """
+    if not criteria:
+        return {}
+
+    # Policies share criteria across auths, so descriptions are usually cached
+    embeddings = await embed_texts_cached(
+        db, [criterion["description"] for criterion in criteria]
+    )
+
+    passages_by_id = {}
+    hybrid = settings.RETRIEVAL_MODE.lower() == "hybrid"
+    if hybrid and not hybrid_search_ready(db):
+        print(
+            "⚠ document_chunks.content_tsv missing, using vector search; "
+            "run scripts/migrate_document_chunks.py"
+        )
+        hybrid = False
+    for criterion, embedding in zip(criteria, embeddings):
+        if hybrid:
+            passages = hybrid_search_chunks(
+                db,
+                prior_auth_id,
+                criterion["description"],
+                embedding,
+                settings.RETRIEVAL_TOP_K,
+            )
+        else:
+            passages = search_chunks(
+                db, prior_auth_id, embedding, settings.RETRIEVAL_TOP_K
+            )
+        best = max((passage["similarity"] for passage in passages), default=0.0)
+        if best < settings.RETRIEVAL_MIN_SIMILARITY:
+            continue
+        passages_by_id[criterion["id"]] = sorted(
+            passages, key=lambda passage: passage["chunk_index"]
+        )
+
+    print(
+        f"Retrieved passages for {len(passages_by_id)}/{len(criteria)} criteria; "
+        "the rest use the full document"
+    )
+    return passages_by_id
@@ -0,0 +1,211 @@
+import io
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import redis
+from pypdf import PdfReader, PdfWriter
+from services.cache_service import get_redis_client, hash_bytes
+from services.file_service import BufferReader, FileService
+from settings import settings
+
+
+def iter_page_text(pdf_content: bytes) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, text) one page at a time.
+
+    Pages are parsed lazily as they are reached, so only the current page's
+    text is held in memory alongside the raw file.
+    """
+    reader = PdfReader(BufferReader(pdf_content))
+    for page_number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"⚠ Could not extract text from page {page_number}: {str(e)}")
+            text = ""
+        yield page_number, text
+
+
+def has_usable_text(text: str) -> bool:
+    """
+    Whether a page's text layer is worth sending instead of the page image.
+
+    Scanned pages have no text layer (or a few stray characters); broken
+    font encodings produce mostly symbols. Both keep the PDF path.
+    """
+    stripped = "".join(text.split())
+    if len(stripped) < settings.TEXT_LAYER_MIN_CHARS_PER_PAGE:
+        return False
+    alphanumeric = sum(1 for char in stripped if char.isalnum())
+    return alphanumeric / len(stripped) >= settings.TEXT_LAYER_MIN_ALNUM_RATIO
+
+
+def format_page_text(pages: List[Tuple[int, str]]) -> str:
+    """Page-tagged text, so answers can still cite pages"""
+    return "\n".join(
+        f'<page number="{page_number}">\n{text.strip()}\n</page>'
+        for page_number, text in pages
+    )
+
+
+def analyze_text_layer(pdf_content: bytes) -> Dict[str, Any]:
+    """
+    Decide how a PDF should be sent to the LLM.
+
+    Returns:
+        Dict with "mode" ("text": every page has a usable text layer, so only
+        page-tagged text is sent; "mixed": text for digital pages plus a PDF
+        of just the scanned pages; "pdf": the original file), "page_count",
+        "scanned_pages", the page-tagged "text" and the estimated
+        "sent_tokens" and "pdf_tokens" per request
+    """
+    text_pages = []
+    scanned_pages = []
+    for page_number, text in iter_page_text(pdf_content):
+        if has_usable_text(text):
+            text_pages.append((page_number, text))
+        else:
+            scanned_pages.append(page_number)
+
+    page_count = len(text_pages) + len(scanned_pages)
+    text = format_page_text(text_pages)
+    pdf_tokens = page_count * settings.PDF_TOKENS_PER_PAGE
+    scanned_tokens = len(scanned_pages) * settings.PDF_TOKENS_PER_PAGE
+    sent_tokens = len(text) // 4 + 1 + scanned_tokens
+
+    if not scanned_pages and text_pages:
+        mode = "text"
+    elif (
+        text_pages
+        and len(scanned_pages) / page_count <= settings.TEXT_LAYER_MAX_SCANNED_RATIO
+    ):
+        mode = "mixed"
+    else:
+        mode = "pdf"
+
+    if mode != "pdf" and sent_tokens >= pdf_tokens:
+        mode = "pdf"
+
+    return {
+        "mode": mode,
+        "page_count": page_count,
+        "scanned_pages": scanned_pages,
+        "text": text if mode != "pdf" else "",
+        "sent_tokens": sent_tokens if mode != "pdf" else pdf_tokens,
+        "pdf_tokens": pdf_tokens,
+    }
+
+
+def extract_pages(pdf_content: bytes, page_numbers: List[int]) -> bytes:
+    """A new PDF containing only the given (1-based) pages"""
+    reader = PdfReader(BufferReader(pdf_content))
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def plan_page_windows(
+    page_count: int, window_pages: int, overlap_pages: int
+) -> List[Tuple[int, int]]:
+    """
+    Split pages 1..page_count into windows of at most window_pages pages,
+    each overlapping the previous one by overlap_pages.
+
+    Returns:
+        (first page, last page) of each window, 1-based and inclusive
+    """
+    window_pages = max(window_pages, 1)
+    step = max(window_pages - overlap_pages, 1)
+    windows = []
+    start = 1
+    while True:
+        end = min(start + window_pages - 1, page_count)
+        windows.append((start, end))
+        if end >= page_count:
+            return windows
+        start += step
+
+
+def split_pdf(
+    pdf_content: bytes, window_pages: int, overlap_pages: int
+) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Split a PDF into overlapping page windows (see plan_page_windows),
+    parsing the file once. Each window's PDF is only written when the
+    iteration reaches it.
+
+    Yields:
+        (first page, last page, window PDF) for each window
+    """
+    reader = PdfReader(BufferReader(pdf_content))
+    for start, end in plan_page_windows(len(reader.pages), window_pages, overlap_pages):
+        writer = PdfWriter()
+        for page_number in range(start, end + 1):
+            writer.add_page(reader.pages[page_number - 1])
+        output = io.BytesIO()
+        writer.write(output)
+        yield start, end, output.getvalue()
+
+
+def _cache_key(sha256: str) -> str:
+    # Thresholds are part of the key so retuning them re-analyzes documents
+    return (
+        f"text_layer_meta:{sha256}:{settings.TEXT_LAYER_MIN_CHARS_PER_PAGE}:"
+        f"{settings.TEXT_LAYER_MIN_ALNUM_RATIO}:{settings.TEXT_LAYER_MAX_SCANNED_RATIO}"
+    )
+
+
+def get_text_layer(pdf_content: bytes, sha256: str) -> Dict[str, Any]:
+    """
+    analyze_text_layer, cached per file hash: the extracted text in file
+    storage (TEXT_LAYER_CACHE_PREFIX) and the rest in Redis, which is also the
+    Celery broker and must not hold document contents.
+    """
+    key = _cache_key(sha256)
+    client: Optional[redis.Redis] = None
+    try:
+        client = get_redis_client()
+        cached = client.get(key)
+    except redis.RedisError as e:
+        print(f"⚠ Text layer cache read failed: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        analysis = json.loads(cached)
+        path = analysis.pop("path", None)
+        if path is None:
+            return {**analysis, "text": ""}
+        try:
+            return {**analysis, "text": FileService.read_file(path).decode("utf-8")}
+        except Exception as e:
+            print(f"⚠ Cached text layer unavailable, analyzing again: {str(e)}")
+
+    try:
+        analysis = analyze_text_layer(pdf_content)
+    except Exception as e:
+        print(f"⚠ Text layer analysis failed, sending the PDF: {str(e)}")
+        return {"mode": "pdf"}
+
+    print(
+        f"📄 Text layer: {analysis['mode']} ({analysis['page_count']} pages, "
+        f"{len(analysis['scanned_pages'])} scanned)"
+    )
+
+    if client is not None:
+        try:
+            meta = {k: v for k, v in analysis.items() if k != "text"}
+            if analysis["text"]:
+                meta["path"] = (
+                    f"{settings.TEXT_LAYER_CACHE_PREFIX}/"
+                    f"{hash_bytes(key.encode('utf-8'))}.txt"
+                )
+                FileService.write_file(meta["path"], analysis["text"].encode("utf-8"))
+            client.set(key, json.dumps(meta), ex=settings.LLM_CACHE_TTL_SECONDS or None)
+        except Exception as e:
+            print(f"⚠ Text layer cache write failed: {str(e)}")
+
+    return analysis
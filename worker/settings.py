@@ -17,15 +17,225 @@ class Settings:
     DATALAB_API_KEY = os.getenv("DATALAB_API_KEY")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+    # Override to point the Anthropic client at a local stand-in server
+    ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL")
+
+    # LLM client pool configuration
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(
+        os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10")
+    )
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+    # Tail-latency control: per-request timeout, batch deadline and hedging
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "180"))
+    # Long-output extraction calls (fact sheets, policy criteria) take longer
+    LLM_EXTRACTION_REQUEST_TIMEOUT = float(
+        os.getenv("LLM_EXTRACTION_REQUEST_TIMEOUT", "600")
+    )
+    # Optional cap on a batch's total sending time (0 = none); it is paused
+    # while no request holds a concurrency slot or all wait on the rate limiter
+    LLM_BATCH_DEADLINE = float(os.getenv("LLM_BATCH_DEADLINE", "0"))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "500"))
+
+    # Retries of failed requests within a batch (jittered exponential backoff)
+    LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "4"))
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+    LLM_ASYNC_SDK_MAX_RETRIES = int(os.getenv("LLM_ASYNC_SDK_MAX_RETRIES", "0"))
+
+    # Offline load testing: LLM_PROVIDER_OVERRIDE=fake routes every call to the
+    # fake provider; LLM_RECORD_MODE=record|replay captures/serves responses
+    LLM_PROVIDER_OVERRIDE = os.getenv("LLM_PROVIDER_OVERRIDE", "")
+    FAKE_LLM_LATENCY_MEDIAN = float(os.getenv("FAKE_LLM_LATENCY_MEDIAN", "2"))
+    FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+    FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+    FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED", "")
+    # Fake message batches live in file storage, shared by submitting and
+    # polling workers
+    FAKE_LLM_BATCH_PREFIX = os.getenv("FAKE_LLM_BATCH_PREFIX", "cache/fake_batches")
+    LLM_RECORD_MODE = os.getenv("LLM_RECORD_MODE", "off")
+    LLM_RECORDINGS_DIR = os.getenv("LLM_RECORDINGS_DIR", "./dev/llm_recordings")
+    LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "true").lower() == "true"
+
+    # Cluster-wide LLM rate limiting (shared through Redis, adjusted AIMD-style).
+    # RPM/TPM are starting limits, raised to what the provider's rate-limit
+    # headers allow once responses come in
+    LLM_RATE_LIMIT_ENABLED = (
+        os.getenv("LLM_RATE_LIMIT_ENABLED", "false").lower() == "true"
+    )
+    LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "50"))
+    LLM_RATE_LIMIT_TPM = float(os.getenv("LLM_RATE_LIMIT_TPM", "40000"))
+    LLM_RATE_LIMIT_MIN_RPM = float(os.getenv("LLM_RATE_LIMIT_MIN_RPM", "1"))
+    LLM_RATE_LIMIT_INCREASE_RPM = float(os.getenv("LLM_RATE_LIMIT_INCREASE_RPM", "1"))
+    LLM_RATE_LIMIT_DECREASE_FACTOR = float(
+        os.getenv("LLM_RATE_LIMIT_DECREASE_FACTOR", "0.5")
+    )
+    LLM_RATE_LIMIT_DECREASE_COOLDOWN = float(
+        os.getenv("LLM_RATE_LIMIT_DECREASE_COOLDOWN", "5")
+    )
+    # Upload documents once to the Anthropic Files API and reference them by id.
+    # Off by default: clinical notes (PHI) would be stored in a beta file store
+    LLM_USE_FILES_API = os.getenv("LLM_USE_FILES_API", "false").lower() == "true"
+
+    # Rough input-token cost of one PDF page (text plus page image)
+    PDF_TOKENS_PER_PAGE = int(os.getenv("PDF_TOKENS_PER_PAGE", "2000"))
+
+    # PDF slimming before LLM submission: drop blank and duplicate pages,
+    # downsample images, remove unused objects (cached per content hash)
+    PDF_SLIM_ENABLED = os.getenv("PDF_SLIM_ENABLED", "true").lower() == "true"
+    PDF_SLIM_TARGET_DPI = int(os.getenv("PDF_SLIM_TARGET_DPI", "150"))
+    PDF_SLIM_JPEG_QUALITY = int(os.getenv("PDF_SLIM_JPEG_QUALITY", "75"))
+    PDF_SLIM_DROP_BLANK_PAGES = (
+        os.getenv("PDF_SLIM_DROP_BLANK_PAGES", "true").lower() == "true"
+    )
+    PDF_SLIM_DROP_DUPLICATE_PAGES = (
+        os.getenv("PDF_SLIM_DROP_DUPLICATE_PAGES", "true").lower() == "true"
+    )
+    # Slimmed PDFs are cached in file storage (S3, or LOCAL_PDF_DIR in
+    # development) under this prefix; Redis only holds their metadata
+    PDF_SLIM_CACHE_PREFIX = os.getenv("PDF_SLIM_CACHE_PREFIX", "cache/slim_pdf")
+    PDF_SLIM_CACHE_MAX_BYTES = int(os.getenv("PDF_SLIM_CACHE_MAX_BYTES", "26214400"))
+
+    # Text layer fast path: send a digital PDF's extracted text instead of the
+    # PDF; pages without a usable text layer (scans) are still sent as PDF
+    TEXT_LAYER_ENABLED = os.getenv("TEXT_LAYER_ENABLED", "true").lower() == "true"
+    TEXT_LAYER_MIN_CHARS_PER_PAGE = int(
+        os.getenv("TEXT_LAYER_MIN_CHARS_PER_PAGE", "200")
+    )
+    TEXT_LAYER_MIN_ALNUM_RATIO = float(os.getenv("TEXT_LAYER_MIN_ALNUM_RATIO", "0.6"))
+    TEXT_LAYER_MAX_SCANNED_RATIO = float(
+        os.getenv("TEXT_LAYER_MAX_SCANNED_RATIO", "0.5")
+    )
+    # Extracted text is cached in file storage like slimmed PDFs; Redis only
+    # holds each document's mode and scanned pages
+    TEXT_LAYER_CACHE_PREFIX = os.getenv("TEXT_LAYER_CACHE_PREFIX", "cache/text_layer")
+
+    # Token budget planning: context window and max_tokens right-sizing from
+    # observed output sizes per response model
+    LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "200000"))
+    LLM_TOKEN_PLANNER_ENABLED = (
+        os.getenv("LLM_TOKEN_PLANNER_ENABLED", "true").lower() == "true"
+    )
+    LLM_MAX_TOKENS_QUANTILE = float(os.getenv("LLM_MAX_TOKENS_QUANTILE", "0.99"))
+    LLM_MAX_TOKENS_HEADROOM = float(os.getenv("LLM_MAX_TOKENS_HEADROOM", "1.5"))
+    LLM_MAX_TOKENS_MIN_SAMPLES = int(os.getenv("LLM_MAX_TOKENS_MIN_SAMPLES", "20"))
+    LLM_MIN_MAX_TOKENS = int(os.getenv("LLM_MIN_MAX_TOKENS", "256"))
+    LLM_OUTPUT_SIZE_WINDOW = int(os.getenv("LLM_OUTPUT_SIZE_WINDOW", "500"))
+
+    # Clinical notes indexing: chunking and embeddings for DocumentChunk
+    CHUNK_SIZE_CHARS = int(os.getenv("CHUNK_SIZE_CHARS", "2000"))
+    CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "200"))
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Must match the DocumentChunk.embedding column
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+    # Reuse embeddings of previously seen (normalized) text from Postgres
+    EMBEDDING_CACHE_ENABLED = (
+        os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    )
+
+    # Retrieval-grounded answering: send the top-k indexed passages instead of
+    # the full notes when the best passage is similar enough, and fall back
+    # to the full notes when the answer from passages is not confident
+    CRITERIA_RETRIEVAL_ENABLED = (
+        os.getenv("CRITERIA_RETRIEVAL_ENABLED", "true").lower() == "true"
+    )
+    # hybrid (full-text + vector, rank-fused) or vector
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+    # Candidates taken from each leg of hybrid search before fusion
+    RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "40"))
+    # Candidates fetched from a quantized index (VECTOR_QUANTIZATION) before
+    # re-ranking on full-precision embeddings
+    RETRIEVAL_RERANK_CANDIDATES = int(os.getenv("RETRIEVAL_RERANK_CANDIDATES", "160"))
+    RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+    RETRIEVAL_MIN_SIMILARITY = float(os.getenv("RETRIEVAL_MIN_SIMILARITY", "0.3"))
+    # pgvector search-time tuning (index build options live in database.py)
+    RETRIEVAL_HNSW_EF_SEARCH = int(os.getenv("RETRIEVAL_HNSW_EF_SEARCH", "100"))
+    RETRIEVAL_IVFFLAT_PROBES = int(os.getenv("RETRIEVAL_IVFFLAT_PROBES", "10"))
+    # off, relaxed_order or strict_order (pgvector 0.8+)
+    RETRIEVAL_ITERATIVE_SCAN = os.getenv("RETRIEVAL_ITERATIVE_SCAN", "relaxed_order")
+    RETRIEVAL_MAX_SCAN_TUPLES = int(os.getenv("RETRIEVAL_MAX_SCAN_TUPLES", "20000"))
+    RETRIEVAL_MIN_ANSWER_CONFIDENCE = float(
+        os.getenv("RETRIEVAL_MIN_ANSWER_CONFIDENCE", "0.7")
+    )
+
+    # Criteria answering configuration (mode: single or grouped)
+    CRITERIA_ANSWER_MODE = os.getenv("CRITERIA_ANSWER_MODE", "single")
+    CRITERIA_GROUP_TOKEN_BUDGET = int(os.getenv("CRITERIA_GROUP_TOKEN_BUDGET", "4000"))
+    CRITERIA_GROUP_MAX_SIZE = int(os.getenv("CRITERIA_GROUP_MAX_SIZE", "20"))
+    CRITERIA_GROUP_TOKENS_PER_ANSWER = int(
+        os.getenv("CRITERIA_GROUP_TOKENS_PER_ANSWER", "150")
+    )
+
+    # Long clinical notes are answered in overlapping page windows when they
+    # exceed any of these per-request limits (Anthropic: 100 PDF pages, 32 MB)
+    NOTES_WINDOW_MAX_PAGES = int(os.getenv("NOTES_WINDOW_MAX_PAGES", "90"))
+    NOTES_WINDOW_MAX_BYTES = int(os.getenv("NOTES_WINDOW_MAX_BYTES", "20000000"))
+    NOTES_WINDOW_MAX_TOKENS = int(os.getenv("NOTES_WINDOW_MAX_TOKENS", "120000"))
+    NOTES_WINDOW_OVERLAP_PAGES = int(os.getenv("NOTES_WINDOW_OVERLAP_PAGES", "3"))
+
+    # Auth (payer policy) documents longer than POLICY_WINDOW_PAGES pages have
+    # their criteria extracted per overlapping page window, in parallel
+    POLICY_WINDOW_PAGES = int(os.getenv("POLICY_WINDOW_PAGES", "15"))
+    POLICY_WINDOW_OVERLAP_PAGES = int(os.getenv("POLICY_WINDOW_OVERLAP_PAGES", "1"))
+    POLICY_EXTRACTION_MAX_CONCURRENCY = int(
+        os.getenv("POLICY_EXTRACTION_MAX_CONCURRENCY", "8")
+    )
+
+    # Clinical fact sheet: structured facts extracted once per notes file and
+    # used to answer criteria before falling back to the full notes
+    FACT_SHEET_ENABLED = os.getenv("FACT_SHEET_ENABLED", "true").lower() == "true"
+    FACT_SHEET_MODEL = os.getenv("FACT_SHEET_MODEL", "claude-sonnet-4-20250514")
+    FACT_SHEET_VERSION = os.getenv("FACT_SHEET_VERSION", "1")
+    FACT_SHEET_MAX_TOKENS = int(os.getenv("FACT_SHEET_MAX_TOKENS", "8192"))
+    FACT_SHEET_MAX_CONCURRENCY = int(os.getenv("FACT_SHEET_MAX_CONCURRENCY", "4"))
+
+    # Incremental persistence of answers (flush every N answers or N seconds)
+    ANSWER_FLUSH_EVERY = int(os.getenv("ANSWER_FLUSH_EVERY", "5"))
+    ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "3"))
+
+    # Offline Message Batches configuration; submissions are split into
+    # batches within the API's size (256 MB) and request count limits
+    MESSAGE_BATCH_POLL_INTERVAL = int(os.getenv("MESSAGE_BATCH_POLL_INTERVAL", "60"))
+    MESSAGE_BATCH_MAX_BYTES = int(os.getenv("MESSAGE_BATCH_MAX_BYTES", "200000000"))
+    MESSAGE_BATCH_MAX_REQUESTS = int(os.getenv("MESSAGE_BATCH_MAX_REQUESTS", "100000"))
+
+    # Model cascade for criteria, cheapest first (empty = single default model)
+    CRITERIA_CASCADE_MODELS = os.getenv("CRITERIA_CASCADE_MODELS", "")
+    CRITERIA_CASCADE_MIN_CONFIDENCE = float(
+        os.getenv("CRITERIA_CASCADE_MIN_CONFIDENCE", "0.8")
+    )
 
     # File storage configuration
     S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+    # Fetched files up to this size stay in memory; larger ones are spooled to
+    # a temporary file and memory-mapped
+    FILE_SPOOL_MAX_MEMORY = int(os.getenv("FILE_SPOOL_MAX_MEMORY", "8388608"))
+    FILE_STREAM_CHUNK_SIZE = int(os.getenv("FILE_STREAM_CHUNK_SIZE", "1048576"))
 
     # Development settings
     LOCAL_PDF_DIR = os.getenv("LOCAL_PDF_DIR", "./dev/sample_pdfs")
     CACHE_DIR = os.getenv("CACHE_DIR", "./dev/cached_responses")
 
+    # LLM response cache configuration (backend: disk, redis or none). The
+    # disk cache under CACHE_DIR is for development; production opts in
+    LLM_CACHE_BACKEND = os.getenv(
+        "LLM_CACHE_BACKEND", "disk" if DEVELOPMENT_MODE else "none"
+    )
+    LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL", REDIS_URL)
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", "536870912"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+
 
 settings = Settings()
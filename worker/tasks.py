@@ -1,17 +1,50 @@
-import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from celery import Celery, chain
-from celery.signals import worker_process_init
+from celery import Celery, chain, chord
+from celery.signals import worker_process_init, worker_process_shutdown
 from database import PriorAuthorization, SessionLocal, UploadedFile, engine
-from llm import run_batch_completions
-from pydantic import BaseModel, Field
+from llm import (
+    DocumentHandle,
+    build_message_batch_request,
+    close_clients,
+    delete_uploaded_files,
+    message_batch_ended,
+    reset_clients,
+    retrieve_message_batch,
+    run_async,
+    split_message_batch,
+    submit_message_batch,
+)
+from services.answer_service import (
+    CriterionAnswer,
+    answer_to_value_data,
+    build_criterion_request,
+    error_value_data,
+    group_batch_answers,
+    iter_criterion_answers,
+    needs_windowing,
+    record_cascade_stats,
+    split_document,
+    window_page_size,
+)
 from services.auth_service import (
     extract_and_format_statements,
     get_all_criteria,
     parse_to_boolean_structure,
     set_criterion_value,
 )
-from services.file_service import FileService
+from services.cache_service import get_response_cache
+from services.embedding_service import embedding_cache_hit_rate
+from services.fact_sheet_service import (
+    build_fact_sheet,
+    format_fact_sheet,
+    get_fact_sheet,
+)
+from services.file_service import FileBuffer, FileService
+from services.ingestion_service import ingest_document
+from services.pdf_slimming_service import get_slim_pdf
+from services.retrieval_service import retrieve_passages
 from settings import settings
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -20,16 +53,19 @@ app.conf.broker_url = settings.REDIS_URL
 app.conf.result_backend = settings.REDIS_URL
 
 
-class CriterionAnswer(BaseModel):
-    answer: str = Field(..., description="YES, NO, or UNCLEAR")
-    explanation: str = Field(..., description="Brief explanation for the decision")
-
-
 @worker_process_init.connect
 def init_worker(**kwargs):
     """Initialize worker process - dispose database connections from parent"""
     print("🔄 Initializing worker process - disposing parent database connections")
     engine.dispose()
+    reset_clients()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker(**kwargs):
+    """Close pooled LLM clients before the worker process exits"""
+    print("🛑 Shutting down worker process - closing pooled LLM clients")
+    close_clients()
 
 
 @app.task
@@ -71,8 +107,8 @@ def process_prior_auth_document(prior_auth_id: str):
             raise Exception("Auth document file not found")
 
         # Read and process the file
-        file_content = FileService.read_file(auth_file.file_path)
-        criteria = extract_and_format_statements(file_content)
+        with FileService.open_file(auth_file.file_path) as auth_pdf:
+            criteria = extract_and_format_statements(auth_pdf.view)
         boolean_structure = parse_to_boolean_structure(criteria)
 
         # Update the prior authorization with extracted questions
@@ -96,14 +132,230 @@ def process_prior_auth_document(prior_auth_id: str):
         db.close()
 
 
+@app.task
+def index_clinical_notes(previous_result):
+    """Chunk, embed and store the clinical notes as DocumentChunks for retrieval"""
+
+    prior_auth_id = previous_result["prior_auth_id"]
+    # The index is only read by retrieval; don't embed notes nobody searches
+    if not settings.CRITERIA_RETRIEVAL_ENABLED:
+        return {**previous_result, "chunks_indexed": 0}
+
+    db = SessionLocal()
+    try:
+        prior_auth = (
+            db.query(PriorAuthorization)
+            .filter(PriorAuthorization.id == prior_auth_id)
+            .first()
+        )
+
+        if not prior_auth or not prior_auth.clinical_notes_id:
+            print(f"No clinical notes to index for prior auth {prior_auth_id}")
+            return {**previous_result, "chunks_indexed": 0}
+
+        clinical_notes_file = (
+            db.query(UploadedFile)
+            .filter(UploadedFile.id == prior_auth.clinical_notes_id)
+            .first()
+        )
+
+        if not clinical_notes_file:
+            raise Exception("Clinical notes file not found")
+
+        started_at = time.monotonic()
+        embedding_stats = {}
+        with FileService.open_file(clinical_notes_file.file_path) as notes_pdf:
+            chunks_indexed = run_async(
+                ingest_document(
+                    db,
+                    prior_auth_id,
+                    clinical_notes_file.id,
+                    notes_pdf.view,
+                    stats=embedding_stats,
+                )
+            )
+
+        print(
+            f"✓ Indexed {chunks_indexed} chunks of clinical notes for prior auth "
+            f"{prior_auth_id} in {time.monotonic() - started_at:.1f}s"
+        )
+        print(
+            f"Embedding cache stats: {embedding_stats} "
+            f"(hit rate {embedding_cache_hit_rate(embedding_stats)})"
+        )
+        return {
+            **previous_result,
+            "chunks_indexed": chunks_indexed,
+            "embedding_cache": embedding_stats,
+        }
+
+    except Exception as e:
+        # Answering works from the full notes, so a failed index is not fatal
+        db.rollback()
+        print(
+            f"✗ Error indexing clinical notes for prior auth {prior_auth_id}: {str(e)}"
+        )
+        return {**previous_result, "chunks_indexed": 0}
+    finally:
+        db.close()
+
+
+def _notes_document(
+    notes_pdf: FileBuffer, file_path: str
+) -> Tuple[DocumentHandle, FileBuffer]:
+    """
+    The clinical notes as sent to the LLM: slimmed (see get_slim_pdf), with
+    a page map back to the original file. Returns the document and the
+    buffer holding it, which the caller closes once done with the document.
+    """
+    slimmed = get_slim_pdf(notes_pdf.view)
+    document = DocumentHandle(
+        slimmed["content"].view,
+        filename=FileService.get_file_name(file_path),
+        page_map=slimmed["page_map"],
+    )
+    return document, slimmed["content"]
+
+
+@app.task
+def build_clinical_fact_sheet(previous_result):
+    """Extract the clinical notes fact sheet, once per notes file hash"""
+
+    prior_auth_id = previous_result["prior_auth_id"]
+    if not settings.FACT_SHEET_ENABLED:
+        return {**previous_result, "fact_sheet": False}
+
+    db = SessionLocal()
+    notes_document = None
+    notes_slim = None
+    notes_pdf = None
+    try:
+        prior_auth = (
+            db.query(PriorAuthorization)
+            .filter(PriorAuthorization.id == prior_auth_id)
+            .first()
+        )
+
+        if not prior_auth or not prior_auth.clinical_notes_id:
+            print(f"No clinical notes for a fact sheet for prior auth {prior_auth_id}")
+            return {**previous_result, "fact_sheet": False}
+
+        clinical_notes_file = (
+            db.query(UploadedFile)
+            .filter(UploadedFile.id == prior_auth.clinical_notes_id)
+            .first()
+        )
+
+        if not clinical_notes_file:
+            raise Exception("Clinical notes file not found")
+
+        notes_pdf = FileService.open_file(clinical_notes_file.file_path)
+        notes_document, notes_slim = _notes_document(
+            notes_pdf, clinical_notes_file.file_path
+        )
+        run_async(build_fact_sheet(db, notes_document))
+        return {**previous_result, "fact_sheet": True}
+
+    except Exception as e:
+        # Criteria can still be answered from the full notes
+        db.rollback()
+        print(f"✗ Error building fact sheet for prior auth {prior_auth_id}: {str(e)}")
+        return {**previous_result, "fact_sheet": False}
+    finally:
+        if notes_document is not None:
+            notes_document.close()
+        if notes_slim is not None:
+            notes_slim.close()
+        if notes_pdf is not None:
+            notes_pdf.close()
+        db.close()
+
+
+def _persist_answers(db, prior_auth, boolean_structure) -> None:
+    """Write the (possibly partial) boolean structure back to the prior auth"""
+    prior_auth.auth_questions = boolean_structure
+    flag_modified(prior_auth, "auth_questions")
+    db.commit()
+
+
+async def _answer_and_persist(
+    db,
+    prior_auth,
+    boolean_structure: Dict[str, Any],
+    criteria: List[Dict[str, Any]],
+    notes_document: DocumentHandle,
+    progress: Dict[str, Any],
+    use_retrieval: bool = False,
+    fact_sheet: Optional[str] = None,
+) -> None:
+    """
+    Answer criteria and store each answer as it completes, committing in
+    micro-batches of ANSWER_FLUSH_EVERY answers or ANSWER_FLUSH_INTERVAL seconds.
+
+    With use_retrieval, criteria are answered from the most relevant indexed
+    passages of the notes where retrieval finds good matches. With a fact
+    sheet, criteria are answered from it first.
+    """
+    pending = 0
+    last_flush = time.monotonic()
+
+    passages = {}
+    if use_retrieval:
+        try:
+            passages = await retrieve_passages(db, prior_auth.id, criteria)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠ Retrieval failed, answering from the full document: {str(e)}")
+
+    async for criterion_id, response in iter_criterion_answers(
+        criteria,
+        notes_document,
+        max_concurrent=5,
+        stats=progress["cascade"],
+        passages=passages,
+        fact_sheet=fact_sheet,
+    ):
+        if isinstance(response, Exception):
+            print(
+                f"✗ Error processing response for criterion {criterion_id}: {str(response)}"
+            )
+            # Set to False if we can't process the response
+            value_data = error_value_data(f"Error processing response: {str(response)}")
+        else:
+            # Update the boolean structure with the answer and justification
+            value_data = answer_to_value_data(response)
+            progress["answers_generated"] += 1
+            print(
+                f"✓ Answered criterion {criterion_id}: {response.answer} - {response.explanation}"
+            )
+
+        set_criterion_value(boolean_structure, criterion_id, value_data)
+        progress["answered_ids"].add(criterion_id)
+        pending += 1
+
+        if (
+            pending >= settings.ANSWER_FLUSH_EVERY
+            or time.monotonic() - last_flush >= settings.ANSWER_FLUSH_INTERVAL
+        ):
+            _persist_answers(db, prior_auth, boolean_structure)
+            pending = 0
+            last_flush = time.monotonic()
+
+
 @app.task
 def answer_questions_with_notes(previous_result):
-    """Answer extracted questions using RAG on vectorized clinical notes"""
+    """
+    Answer extracted questions using RAG on vectorized clinical notes, falling
+    back to the full notes document where retrieval is not confident
+    """
 
     # Extract prior_auth_id from previous task result
     prior_auth_id = previous_result["prior_auth_id"]
 
     db = SessionLocal()
+    notes_document = None
+    notes_slim = None
+    notes_pdf = None
     try:
         # Get the prior authorization with its associated files
         prior_auth = (
@@ -130,8 +382,24 @@ def answer_questions_with_notes(previous_result):
         if not clinical_notes_file:
             raise Exception("Clinical notes file not found")
 
-        # Read the clinical notes file
-        clinical_notes_content = FileService.read_file(clinical_notes_file.file_path)
+        # Read the clinical notes file and upload it once for all criteria;
+        # notes too long for one request are uploaded per page window instead
+        notes_pdf = FileService.open_file(clinical_notes_file.file_path)
+        notes_document, notes_slim = _notes_document(
+            notes_pdf, clinical_notes_file.file_path
+        )
+        if not needs_windowing(notes_document):
+            notes_document.upload()
+
+        fact_sheet = None
+        if settings.FACT_SHEET_ENABLED and previous_result.get("fact_sheet"):
+            try:
+                facts = get_fact_sheet(db, notes_document.sha256)
+                if facts is not None:
+                    fact_sheet = format_fact_sheet(facts)
+            except Exception as e:
+                db.rollback()
+                print(f"⚠ Fact sheet lookup failed, using the full notes: {str(e)}")
 
         # Get the boolean structure with questions
         boolean_structure = prior_auth.auth_questions
@@ -148,114 +416,272 @@ def answer_questions_with_notes(previous_result):
                 "answers_generated": 0,
             }
 
-        # Prepare prompts for all criteria
-        prompts = []
-        for criterion in criteria_to_answer:
-            prompt = f"""Based on the provided clinical notes, determine if the following medical criterion is met:
-
-CRITERION: {criterion["description"]}
-
-Please analyze the clinical notes thoroughly and respond with either:
-- "YES" if the criterion is clearly met based on the clinical documentation
-- "NO" if the criterion is clearly not met based on the clinical documentation  
-- "UNCLEAR" if there is insufficient information in the clinical notes to make a determination
-
-Provide a brief explanation for your decision based on specific information found (or not found) in the clinical notes."""
-            prompts.append(prompt)
-
         print(
             f"Processing {len(criteria_to_answer)} criteria in batch for prior auth {prior_auth_id}"
         )
 
-        # Process all criteria in batch
+        # Answers are stored as they arrive, so partial results show up early
+        progress = {"answers_generated": 0, "answered_ids": set(), "cascade": {}}
         try:
-            # Create request dictionaries for batch processing
-            requests = []
-            for prompt in prompts:
-                requests.append(
-                    {
-                        "response_model": CriterionAnswer,
-                        "user_message": prompt,
-                        "model": "claude-sonnet-4-20250514",
-                        "provider": "anthropic",
-                        "pdf_content": clinical_notes_content,
-                        "max_tokens": 16384,
-                    }
+            # Run on the worker's persistent loop so pooled connections stay warm
+            run_async(
+                _answer_and_persist(
+                    db,
+                    prior_auth,
+                    boolean_structure,
+                    criteria_to_answer,
+                    notes_document,
+                    progress,
+                    use_retrieval=settings.CRITERIA_RETRIEVAL_ENABLED
+                    and previous_result.get("chunks_indexed", 0) > 0,
+                    fact_sheet=fact_sheet,
                 )
-
-            # Use the async batch function with asyncio.run
-            batch_responses = asyncio.run(
-                run_batch_completions(requests, max_concurrent=5)
             )
 
-            # Update the boolean structure with all answers
-            answers_generated = 0
-            for i, (criterion, response) in enumerate(
-                zip(criteria_to_answer, batch_responses)
-            ):
-                try:
-                    # Convert to boolean (YES = True, NO/UNCLEAR = False)
-                    is_met = response.answer.upper() == "YES"
-
-                    # Update the boolean structure with the answer and justification
-                    value_data = {
-                        "is_met": is_met,
-                        "justification": response.explanation,
-                        "answer": response.answer.upper(),
-                    }
-                    set_criterion_value(boolean_structure, criterion["id"], value_data)
-                    answers_generated += 1
-
-                    print(
-                        f"✓ Answered criterion {criterion['id']}: {response.answer} - {response.explanation}"
-                    )
-
-                except Exception as e:
-                    print(
-                        f"✗ Error processing response for criterion {criterion['id']}: {str(e)}"
-                    )
-                    # Set to False if we can't process the response
-                    fallback_data = {
-                        "is_met": False,
-                        "justification": f"Error processing response: {str(e)}",
-                        "answer": "UNCLEAR",
-                    }
-                    set_criterion_value(
-                        boolean_structure, criterion["id"], fallback_data
-                    )
-
         except Exception as e:
             print(f"✗ Error in batch processing: {str(e)}")
-            # Fallback: set all criteria to False if batch processing fails
+            # Fallback: set remaining criteria to False if batch processing fails
             for criterion in criteria_to_answer:
-                fallback_data = {
-                    "is_met": False,
-                    "justification": f"Batch processing failed: {str(e)}",
-                    "answer": "UNCLEAR",
-                }
+                if criterion["id"] in progress["answered_ids"]:
+                    continue
+                fallback_data = error_value_data(f"Batch processing failed: {str(e)}")
                 set_criterion_value(boolean_structure, criterion["id"], fallback_data)
 
         # Update the prior authorization with answered questions
-        prior_auth.auth_questions = boolean_structure
-        flag_modified(prior_auth, "auth_questions")
-        db.commit()
+        _persist_answers(db, prior_auth, boolean_structure)
+        answers_generated = progress["answers_generated"]
 
         print(
             f"Completed answering {answers_generated} questions for prior auth {prior_auth_id}"
         )
 
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            print(f"LLM response cache stats: {response_cache.stats()}")
+
+        print(f"Model cascade stats: {progress['cascade']}")
+        record_cascade_stats(prior_auth.auth_document_id, progress["cascade"])
+
+        text_layer = notes_document.token_savings()
+        print(f"Text layer token savings: {text_layer}")
+
         # Return final result
         return {
             "prior_auth_id": prior_auth_id,
             "status": "completed",
             "questions_count": previous_result.get("questions_count", 0),
             "answers_generated": answers_generated,
+            "cascade": progress["cascade"],
+            "text_layer": text_layer,
         }
 
     except Exception as e:
         db.rollback()
         print(f"Error answering questions for prior auth {prior_auth_id}: {str(e)}")
         raise
+    finally:
+        if notes_document is not None:
+            notes_document.close()
+        if notes_slim is not None:
+            notes_slim.close()
+        if notes_pdf is not None:
+            notes_pdf.close()
+        db.close()
+
+
+@app.task
+def submit_offline_answers(
+    previous_results: Union[Dict[str, Any], List[Dict[str, Any]]],
+):
+    """
+    Submit criterion questions for one or many prior auths as a single
+    Message Batches job, for volume that does not need interactive latency.
+
+    Accepts the result of process_prior_auth_document, or a list of them when
+    used as a chord callback. Notes too long for one request are asked per
+    page window, as in real-time answering (see split_document). Results are
+    written back by poll_message_batch.
+    """
+    if isinstance(previous_results, dict):
+        previous_results = [previous_results]
+
+    db = SessionLocal()
+    # Uploaded notes must outlive this task; poll_message_batch deletes them
+    file_ids = []
+    batch_ids = []
+    try:
+        batch_requests = []
+        # custom_id -> [prior_auth_id, criterion_id, window pages or None];
+        # custom ids are limited to 64 characters so they are kept short and
+        # mapped back here
+        request_map: Dict[str, List[Any]] = {}
+        # custom_id -> original page of each page of the PDF it attached,
+        # where that differs (see DocumentHandle.pdf_page_map)
+        page_maps: Dict[str, List[int]] = {}
+
+        for previous_result in previous_results:
+            prior_auth_id = previous_result["prior_auth_id"]
+            prior_auth = (
+                db.query(PriorAuthorization)
+                .filter(PriorAuthorization.id == prior_auth_id)
+                .first()
+            )
+
+            if not prior_auth or not prior_auth.clinical_notes_id:
+                print(f"✗ Skipping prior auth {prior_auth_id}: no clinical notes")
+                continue
+
+            clinical_notes_file = (
+                db.query(UploadedFile)
+                .filter(UploadedFile.id == prior_auth.clinical_notes_id)
+                .first()
+            )
+
+            if not clinical_notes_file:
+                print(f"✗ Skipping prior auth {prior_auth_id}: notes file not found")
+                continue
+
+            # Entries hold the file id or their own base64 copy, so the
+            # buffer can be released once they are built
+            file_path = clinical_notes_file.file_path
+            with FileService.open_file(file_path) as notes_pdf:
+                notes_document, notes_slim = _notes_document(notes_pdf, file_path)
+                with notes_slim:
+                    # Windows are split one at a time; each is only needed
+                    # until its entries are built
+                    documents = [(None, notes_document)]
+                    if needs_windowing(notes_document):
+                        documents = (
+                            (list(pages), window)
+                            for pages, window in split_document(
+                                notes_document, window_page_size(notes_document)
+                            )
+                        )
+
+                    criteria = get_all_criteria(prior_auth.auth_questions)
+                    for pages, document in documents:
+                        document.upload()
+                        if document.file_id is not None:
+                            file_ids.append(document.file_id)
+
+                        for criterion in criteria:
+                            custom_id = f"req-{len(batch_requests)}"
+                            request = build_criterion_request(criterion, document)
+                            request["cache_document"] = True
+                            batch_requests.append(
+                                build_message_batch_request(custom_id, **request)
+                            )
+                            request_map[custom_id] = [
+                                prior_auth_id,
+                                criterion["id"],
+                                pages,
+                            ]
+                            if document.pdf_page_map is not None:
+                                page_maps[custom_id] = document.pdf_page_map
+
+        if not batch_requests:
+            return {"status": "completed", "batch_ids": [], "requests": 0}
+
+        # Entries with inline documents are large; split to fit batch limits
+        try:
+            for entries in split_message_batch(batch_requests):
+                batch_ids.append(
+                    submit_message_batch(entries, uses_files=bool(file_ids))
+                )
+        finally:
+            # Batches already submitted are still collected; the poll deletes
+            # the uploads once they have all ended
+            if batch_ids:
+                poll_message_batch.apply_async(
+                    args=[batch_ids, request_map, file_ids, page_maps],
+                    countdown=settings.MESSAGE_BATCH_POLL_INTERVAL,
+                )
+
+        return {
+            "status": "batch_submitted",
+            "batch_ids": batch_ids,
+            "requests": len(batch_requests),
+        }
+    except Exception:
+        if not batch_ids:
+            delete_uploaded_files(file_ids)
+        raise
+    finally:
+        db.close()
+
+
+@app.task(bind=True, max_retries=None)
+def poll_message_batch(
+    self,
+    batch_ids: Union[str, List[str]],
+    request_map: Dict[str, List[Any]],
+    file_ids: Optional[List[str]] = None,
+    page_maps: Optional[Dict[str, List[int]]] = None,
+):
+    """
+    Wait for the message batches of one submission to finish, store their
+    answers, then delete their uploads. A criterion's page windows can be
+    split across batches, so answers are only stored once all have ended.
+    """
+    if isinstance(batch_ids, str):
+        batch_ids = [batch_ids]
+
+    for batch_id in batch_ids:
+        if not message_batch_ended(batch_id):
+            print(f"⏳ Message batch {batch_id} still processing")
+            raise self.retry(countdown=settings.MESSAGE_BATCH_POLL_INTERVAL)
+
+    results = {}
+    for batch_id in batch_ids:
+        results.update(retrieve_message_batch(batch_id, CriterionAnswer))
+
+    # Group answers by prior auth so each auth is loaded and committed once
+    answers_by_auth = group_batch_answers(results, request_map, page_maps)
+
+    db = SessionLocal()
+    try:
+        answers_generated = 0
+        for prior_auth_id, answers in answers_by_auth.items():
+            prior_auth = (
+                db.query(PriorAuthorization)
+                .filter(PriorAuthorization.id == prior_auth_id)
+                .first()
+            )
+            if not prior_auth:
+                print(f"✗ Prior authorization {prior_auth_id} not found")
+                continue
+
+            boolean_structure = prior_auth.auth_questions
+            for criterion_id, response in answers.items():
+                if isinstance(response, Exception):
+                    value_data = error_value_data(
+                        f"Error processing response: {str(response)}"
+                    )
+                else:
+                    value_data = answer_to_value_data(response)
+                    answers_generated += 1
+                set_criterion_value(boolean_structure, criterion_id, value_data)
+
+            prior_auth.auth_questions = boolean_structure
+            flag_modified(prior_auth, "auth_questions")
+            db.commit()
+
+        print(
+            f"✓ Stored {answers_generated} answers from {len(batch_ids)} message "
+            f"batches for {len(answers_by_auth)} prior auths"
+        )
+        delete_uploaded_files(file_ids or [])
+        return {
+            "status": "completed",
+            "batch_ids": batch_ids,
+            "prior_auth_ids": list(answers_by_auth.keys()),
+            "answers_generated": answers_generated,
+        }
+
+    except Exception as e:
+        db.rollback()
+        print(f"Error storing message batches {', '.join(batch_ids)}: {str(e)}")
+        raise
     finally:
         db.close()
 
@@ -263,10 +689,38 @@ Provide a brief explanation for your decision based on specific information foun
 # Helper function to create the processing workflow chain
 def create_processing_workflow(prior_auth_id: str):
     """Create a Celery chain for processing a prior authorization"""
-    return chain(
-        process_prior_auth_document.s(prior_auth_id),
-        answer_questions_with_notes.s(),
+    steps = [process_prior_auth_document.s(prior_auth_id)]
+    if settings.CRITERIA_RETRIEVAL_ENABLED:
+        steps.append(index_clinical_notes.s())
+    steps += [build_clinical_fact_sheet.s(), answer_questions_with_notes.s()]
+    return chain(*steps)
+
+
+def create_offline_processing_workflow(prior_auth_ids: List[str]):
+    """
+    Create a workflow that extracts questions for several prior auths and then
+    answers all of their criteria in one offline message batch
+    """
+    return chord(
+        [process_prior_auth_document.s(prior_auth_id) for prior_auth_id in prior_auth_ids],
+        submit_offline_answers.s(),
+    )
+
+
+@app.task
+def start_offline_processing_workflow(prior_auth_ids: List[str]):
+    """Start offline (message batch) processing for a set of prior authorizations"""
+    workflow = create_offline_processing_workflow(prior_auth_ids)
+    result = workflow.apply_async()
+
+    print(
+        f"✓ Started offline processing for {len(prior_auth_ids)} prior auths (chord ID: {result.id})"
     )
+    return {
+        "status": "workflow_started",
+        "prior_auth_ids": prior_auth_ids,
+        "chord_id": result.id,
+    }
 
 
 @app.task
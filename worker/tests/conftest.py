@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+
+os.environ.setdefault("DEVELOPMENT_MODE", "true")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from llm import reset_clients  # noqa: E402
+from pypdf import PdfWriter  # noqa: E402
+from pypdf.generic import DecodedStreamObject  # noqa: E402
+from pypdf.generic import DictionaryObject, NameObject  # noqa: E402
+from scripts.fake_anthropic_server import FakeAnthropicHandler  # noqa: E402
+from scripts.fake_anthropic_server import start_server  # noqa: E402
+from settings import settings  # noqa: E402
+
+
+@pytest.fixture
+def make_pdf():
+    """Build a PDF of blank pages: make_pdf(pages) -> bytes"""
+
+    def make(pages):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(612, 792)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    return make
+
+
+@pytest.fixture
+def make_text_pdf():
+    """Build a PDF with one line of text per page: make_text_pdf(texts) -> bytes"""
+
+    def make(texts):
+        writer = PdfWriter()
+        font = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+        for text in texts:
+            page = writer.add_blank_page(612, 792)
+            page[NameObject("/Resources")] = DictionaryObject(
+                {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+            )
+            stream = DecodedStreamObject()
+            stream.set_data(f"BT /F1 8 Tf 20 720 Td ({text}) Tj ET".encode("latin-1"))
+            page[NameObject("/Contents")] = writer._add_object(stream)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    return make
+
+
+class FakeRedis:
+    """The get/set subset of redis.Redis the caches use, backed by a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8") if isinstance(value, str) else value
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def fake_anthropic(monkeypatch):
+    """
+    Point the Anthropic client at scripts/fake_anthropic_server.py; yields
+    its state (batches, files). Batches end as soon as they are submitted
+    unless state.delay is raised.
+    """
+    server = start_server(delay=0.0)
+    monkeypatch.setattr(
+        settings, "ANTHROPIC_BASE_URL", f"http://127.0.0.1:{server.server_port}"
+    )
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(settings, "LLM_PROVIDER_OVERRIDE", "")
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_ENABLED", False)
+    reset_clients()
+    try:
+        yield FakeAnthropicHandler.state
+    finally:
+        reset_clients()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,81 @@
+import pytest
+from services import auth_service
+from services.auth_service import (
+    Criteria,
+    extract_and_format_statements,
+    merge_criteria,
+)
+from settings import settings
+
+
+def test_merge_criteria_joins_groups_continued_across_windows():
+    first = "- [AND] Adult patients\n  - Age 18 or older\n  - BMI >= 40"
+    second = (
+        "- [AND] Adult patients\n"
+        "  - bmi >= 40.\n"
+        "  - Failed supervised diet\n"
+        "- [OR] Contraindications absent"
+    )
+
+    assert merge_criteria([first, second]) == (
+        "- [AND] Adult patients\n"
+        "  - Age 18 or older\n"
+        "  - BMI >= 40\n"
+        "  - Failed supervised diet\n"
+        "- [OR] Contraindications absent"
+    )
+
+
+@pytest.fixture
+def policy_windows(make_pdf, monkeypatch):
+    """A 9-page policy split into 3 windows, with each extraction scripted"""
+    monkeypatch.setattr(settings, "POLICY_WINDOW_PAGES", 4)
+    monkeypatch.setattr(settings, "POLICY_WINDOW_OVERLAP_PAGES", 1)
+    attempts = []
+
+    def script(outcome):
+        def extract_windows(windows, page_count):
+            results = []
+            for start, _, _ in windows:
+                attempts.append(start)
+                results.append(outcome(start, attempts.count(start)))
+            return results
+
+        monkeypatch.setattr(auth_service, "_extract_windows", extract_windows)
+
+    return make_pdf(9), script, attempts
+
+
+def test_failed_window_is_rerun_before_merging(policy_windows):
+    pdf, script, attempts = policy_windows
+    script(
+        lambda start, attempt: (
+            TimeoutError("window timed out")
+            if start == 4 and attempt == 1
+            else Criteria(criteria=f"- Statement from page {start}")
+        )
+    )
+
+    criteria = extract_and_format_statements(pdf)
+
+    assert criteria.splitlines() == [
+        "- Statement from page 1",
+        "- Statement from page 4",
+        "- Statement from page 7",
+    ]
+    assert attempts == [1, 4, 7, 4]
+
+
+def test_window_failing_again_fails_the_extraction(policy_windows):
+    pdf, script, attempts = policy_windows
+    script(
+        lambda start, attempt: (
+            TimeoutError("window timed out")
+            if start == 7
+            else Criteria(criteria=f"- Statement from page {start}")
+        )
+    )
+
+    with pytest.raises(TimeoutError):
+        extract_and_format_statements(pdf)
+    assert attempts == [1, 4, 7, 7]
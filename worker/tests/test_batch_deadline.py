@@ -0,0 +1,91 @@
+import asyncio
+
+import llm
+from llm import BatchClock, latency_tracker, run_batch_completions
+from pydantic import BaseModel
+from settings import settings
+
+
+class Reply(BaseModel):
+    text: str
+
+
+class FakeCalls:
+    """Stand-in for run_instructor_async that takes `seconds` per call"""
+
+    def __init__(self, seconds, slow=()):
+        self.seconds = seconds
+        self.slow = set(slow)
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.sent = set()
+
+    async def __call__(self, user_message, batch_clock=None, **kwargs):
+        if batch_clock is not None and batch_clock.remaining() <= 0:
+            raise TimeoutError("Batch deadline passed before request was sent")
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        self.calls += 1
+        try:
+            # Only the first attempt of a slow request is slow
+            slow = user_message in self.slow and user_message not in self.sent
+            self.sent.add(user_message)
+            await asyncio.sleep(self.seconds * (10 if slow else 1))
+        finally:
+            self.in_flight -= 1
+        return Reply(text=user_message)
+
+
+def _requests(count):
+    return [
+        {"response_model": Reply, "user_message": str(i), "model": "deadline-test"}
+        for i in range(count)
+    ]
+
+
+def test_batch_clock_only_runs_while_a_request_is_sending():
+    async def run():
+        clock = BatchClock(1.0)
+        await asyncio.sleep(0.2)  # no request holds a slot yet
+        with clock.running():
+            await asyncio.sleep(0.1)
+            with clock.throttled():
+                await asyncio.sleep(0.2)  # held by the rate limiter
+        await asyncio.sleep(0.2)  # backing off between retries
+        return clock.remaining()
+
+    assert 0.85 < asyncio.run(run()) <= 0.9
+
+
+def test_batch_deadline_is_off_by_default(monkeypatch):
+    calls = FakeCalls(0.01)
+    monkeypatch.setattr(llm, "run_instructor_async", calls)
+    clocks = []
+    monkeypatch.setattr(llm, "BatchClock", lambda seconds: clocks.append(seconds))
+
+    results = asyncio.run(run_batch_completions(_requests(20), max_concurrent=2))
+
+    assert settings.LLM_BATCH_DEADLINE == 0
+    assert clocks == []
+    assert [result.text for result in results] == [str(i) for i in range(20)]
+
+
+def test_hedged_duplicates_stay_within_max_concurrent(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_QUANTILE", 0.5)
+    for _ in range(5):
+        latency_tracker.record("deadline-test", 0.02)
+
+    calls = FakeCalls(0.02, slow={"0", "1"})
+    monkeypatch.setattr(llm, "run_instructor_async", calls)
+
+    results = asyncio.run(
+        run_batch_completions(
+            _requests(6), max_concurrent=3, hedge=True, return_exceptions=True
+        )
+    )
+
+    assert [result.text for result in results] == [str(i) for i in range(6)]
+    assert calls.calls > 6  # the slow requests were hedged
+    assert calls.peak <= 3
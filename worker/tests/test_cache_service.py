@@ -0,0 +1,35 @@
+import os
+import time
+
+from services.cache_service import DiskCacheBackend
+
+
+def test_overwrite_does_not_double_count_size(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path), max_bytes=10_000_000)
+    backend.set("aa01", "x" * 1000, ttl=0)
+    size = backend._size
+
+    for _ in range(5):
+        backend.set("aa01", "x" * 1000, ttl=0)
+
+    assert backend._size == size
+    assert backend.get("aa01") == "x" * 1000
+
+
+def test_evict_drops_expired_entries_before_recent_ones(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path), max_bytes=10_000_000)
+    backend.set("aa01", "x" * 1000, ttl=0)
+    backend.set("bb02", "y" * 1000, ttl=3600)
+    backend.set("cc03", "z" * 1000, ttl=3600)
+    # Make cc03 the least recently used entry, then expire bb02
+    old = time.time() - 600
+    os.utime(backend._path("cc03"), (old, old))
+    with open(backend._path("bb02"), "w") as f:
+        f.write('{"expires_at": 1, "value": "y"}')
+
+    backend.max_bytes = backend._size - 1
+    backend._evict()
+
+    assert not os.path.exists(backend._path("bb02"))
+    assert backend.get("cc03") == "z" * 1000
+    assert backend.get("aa01") == "x" * 1000
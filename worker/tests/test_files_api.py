@@ -0,0 +1,69 @@
+import pytest
+from llm import DocumentHandle, run_instructor
+from services.answer_service import CriterionAnswer
+from settings import settings
+
+
+def _ask(document):
+    return run_instructor(
+        response_model=CriterionAnswer,
+        user_message="Is the criterion met?",
+        model="claude-sonnet-4-20250514",
+        provider="anthropic",
+        document=document,
+        max_tokens=1024,
+        use_cache=False,
+    )
+
+
+def _document_source(params):
+    return params["messages"][0]["content"][0]["source"]
+
+
+@pytest.fixture
+def files_api(fake_anthropic, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_USE_FILES_API", True)
+    return fake_anthropic
+
+
+def test_files_api_off_by_default(fake_anthropic, make_pdf):
+    document = DocumentHandle(make_pdf(1), use_text_layer=False).upload()
+
+    _ask(document)
+
+    assert document.file_id is None
+    assert fake_anthropic.files == {}
+    assert _document_source(fake_anthropic.messages[0])["type"] == "base64"
+
+
+def test_upload_once_and_reuse(files_api, make_pdf):
+    document = DocumentHandle(make_pdf(2), filename="notes.pdf", use_text_layer=False)
+    with document:
+        document.upload().upload()
+        _ask(document)
+        _ask(document)
+
+        assert list(files_api.files) == [document.file_id]
+        assert files_api.files[document.file_id]["filename"] == "notes.pdf"
+        for params in files_api.messages:
+            assert _document_source(params) == {
+                "type": "file",
+                "file_id": document.file_id,
+            }
+
+    # Closing the handle deletes the upload
+    assert files_api.files == {}
+
+
+def test_expired_upload_falls_back_to_inline(files_api, make_pdf):
+    document = DocumentHandle(make_pdf(1), use_text_layer=False).upload()
+    files_api.files.pop(document.file_id)
+
+    answer = _ask(document)
+
+    assert isinstance(answer, CriterionAnswer)
+    assert document.file_id is None
+    assert [_document_source(params)["type"] for params in files_api.messages] == [
+        "file",
+        "base64",
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+
+from llm import DocumentHandle
+from services import answer_service
+from services.answer_service import (
+    CriterionAnswer,
+    CriterionAnswerList,
+    IdentifiedCriterionAnswer,
+    iter_criterion_answers,
+)
+from settings import settings
+
+
+def test_fact_sheet_fallbacks_are_grouped(make_pdf, monkeypatch):
+    monkeypatch.setattr(settings, "CRITERIA_ANSWER_MODE", "grouped")
+    monkeypatch.setattr(settings, "CRITERIA_CASCADE_MODELS", "final-model")
+    document = DocumentHandle(make_pdf(2), use_text_layer=False)
+    criteria = [
+        {"id": f"c{index}", "description": f"Criterion {index}"} for index in range(4)
+    ]
+    batches = []
+
+    async def iter_batch_completions(requests, max_concurrent):
+        batches.append([request["response_model"] for request in requests])
+        for index, request in enumerate(requests):
+            if request["response_model"] is CriterionAnswerList:
+                yield index, CriterionAnswerList(
+                    answers=[
+                        IdentifiedCriterionAnswer(
+                            criterion_id=criterion["id"],
+                            answer="YES",
+                            explanation="from the notes",
+                        )
+                        for criterion in criteria
+                        if f'id="{criterion["id"]}"' in request["user_message"]
+                    ]
+                )
+            elif "Criterion 0" in request["user_message"]:
+                yield index, CriterionAnswer(answer="NO", explanation="fact sheet")
+            else:
+                yield index, CriterionAnswer(answer="UNCLEAR", explanation="?")
+
+    monkeypatch.setattr(
+        answer_service, "iter_batch_completions", iter_batch_completions
+    )
+
+    async def collect():
+        return {
+            criterion_id: response
+            async for criterion_id, response in iter_criterion_answers(
+                criteria, document, stats={}, fact_sheet="<facts/>"
+            )
+        }
+
+    answers = asyncio.run(collect())
+
+    assert answers["c0"].explanation == "fact sheet"
+    assert {answers[f"c{index}"].answer for index in range(1, 4)} == {"YES"}
+    # One request per criterion against the fact sheet, then the three
+    # unsettled criteria share one request against the notes
+    assert batches == [[CriterionAnswer] * 4, [CriterionAnswerList]]
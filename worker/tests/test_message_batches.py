@@ -0,0 +1,157 @@
+import json
+
+from llm import (
+    DocumentHandle,
+    build_message_batch_request,
+    message_batch_ended,
+    retrieve_message_batch,
+    split_message_batch,
+    submit_message_batch,
+)
+from services.answer_service import (
+    CriterionAnswer,
+    build_criterion_request,
+    group_batch_answers,
+)
+from settings import settings
+
+
+def _criteria(count):
+    return [
+        {"id": f"c{index}", "description": f"Criterion {index}"}
+        for index in range(count)
+    ]
+
+
+def test_build_message_batch_request_embeds_document_and_tool(make_pdf):
+    document = DocumentHandle(make_pdf(2), use_text_layer=False)
+    request = build_criterion_request(_criteria(1)[0], document)
+    request["cache_document"] = True
+
+    entry = build_message_batch_request("req-0", **request)
+
+    params = entry["params"]
+    assert entry["custom_id"] == "req-0"
+    assert params["tool_choice"] == {"type": "tool", "name": "CriterionAnswer"}
+    content = params["messages"][0]["content"]
+    assert content[0]["type"] == "document"
+    assert content[0]["cache_control"] == {"type": "ephemeral"}
+    assert "Criterion 0" in content[-1]["text"]
+    assert document.requests_sent == 1
+
+
+def test_submit_and_retrieve_message_batch(fake_anthropic, make_pdf):
+    document = DocumentHandle(make_pdf(1), use_text_layer=False)
+    entries = [
+        build_message_batch_request(
+            f"req-{index}", **build_criterion_request(criterion, document)
+        )
+        for index, criterion in enumerate(_criteria(3))
+    ]
+
+    batch_id = submit_message_batch(entries)
+    results = retrieve_message_batch(batch_id, CriterionAnswer)
+
+    assert len(fake_anthropic.batches[batch_id]["requests"]) == 3
+    assert set(results) == {"req-0", "req-1", "req-2"}
+    for custom_id, answer in results.items():
+        assert isinstance(answer, CriterionAnswer)
+        assert answer.explanation.endswith(f"for {custom_id}")
+
+
+def test_split_message_batch_keeps_batches_under_the_size_limit(make_pdf, monkeypatch):
+    document = DocumentHandle(make_pdf(3), use_text_layer=False)
+    entries = [
+        build_message_batch_request(
+            f"req-{index}", **build_criterion_request(criterion, document)
+        )
+        for index, criterion in enumerate(_criteria(5))
+    ]
+    entry_bytes = len(json.dumps(entries[0]))
+    monkeypatch.setattr(settings, "MESSAGE_BATCH_MAX_BYTES", entry_bytes * 2 + 10)
+
+    batches = split_message_batch(entries)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [entry for batch in batches for entry in batch] == entries
+
+
+def test_split_message_batch_limits_request_count(monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_BATCH_MAX_REQUESTS", 2)
+    entries = [{"custom_id": f"req-{index}", "params": {}} for index in range(3)]
+
+    assert split_message_batch(entries) == [entries[:2], entries[2:]]
+
+
+def test_message_batches_follow_provider_override(make_pdf, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "LLM_PROVIDER_OVERRIDE", "fake")
+    monkeypatch.setattr(settings, "LOCAL_PDF_DIR", str(tmp_path))
+    document = DocumentHandle(make_pdf(1), use_text_layer=False)
+    entries = [
+        build_message_batch_request(
+            f"req-{index}", **build_criterion_request(criterion, document)
+        )
+        for index, criterion in enumerate(_criteria(2))
+    ]
+
+    batch_id = submit_message_batch(entries)
+
+    assert message_batch_ended(batch_id)
+    results = retrieve_message_batch(batch_id, CriterionAnswer)
+    assert set(results) == {"req-0", "req-1"}
+    assert all(isinstance(answer, CriterionAnswer) for answer in results.values())
+
+
+def test_retrieve_message_batch_still_processing(fake_anthropic):
+    fake_anthropic.delay = 3600
+    entry = build_message_batch_request(
+        "req-0", **build_criterion_request(_criteria(1)[0], None)
+    )
+
+    batch_id = submit_message_batch([entry])
+
+    assert retrieve_message_batch(batch_id, CriterionAnswer) is None
+
+
+def test_group_batch_answers_maps_results_to_prior_auths():
+    results = {
+        "req-0": CriterionAnswer(answer="YES", explanation="a", confidence=0.9),
+        "req-1": ValueError("Batch response contained no tool call"),
+    }
+    request_map = {
+        "req-0": ["auth-1", "c0", None],
+        "req-1": ["auth-1", "c1", None],
+        "req-2": ["auth-2", "c0", None],
+    }
+
+    answers = group_batch_answers(results, request_map)
+
+    assert answers["auth-1"]["c0"].explanation == "a"
+    assert isinstance(answers["auth-1"]["c1"], ValueError)
+    assert str(answers["auth-2"]["c0"]) == "Missing from batch results"
+
+
+def test_group_batch_answers_reduces_page_windows():
+    results = {
+        "req-0": CriterionAnswer(answer="NO", explanation="none", confidence=0.8),
+        "req-1": CriterionAnswer(
+            answer="YES", explanation="see PDF page 2", confidence=0.7
+        ),
+        "req-2": CriterionAnswer(answer="NO", explanation="none", confidence=0.9),
+        "req-3": CriterionAnswer(answer="NO", explanation="none", confidence=0.6),
+    }
+    # Legacy two-element entries (queued before windowing) still map
+    request_map = {
+        "req-0": ["auth-1", "c0", [1, 30]],
+        "req-1": ["auth-1", "c0", [30, 60]],
+        "req-2": ["auth-1", "c1", [1, 30]],
+        "req-3": ["auth-2", "c0"],
+    }
+    page_maps = {"req-1": list(range(30, 61))}
+
+    answers = group_batch_answers(results, request_map, page_maps)
+
+    assert answers["auth-1"]["c0"].answer == "YES"
+    assert answers["auth-1"]["c0"].explanation == "(pp. 30-60) see p. 31"
+    assert answers["auth-1"]["c1"].explanation == "(pp. 1-30) none"
+    assert answers["auth-2"]["c0"].confidence == 0.6
@@ -0,0 +1,54 @@
+import io
+import mmap
+
+from pypdf import PdfReader
+from services import pdf_slimming_service
+from services.file_service import FileBuffer
+from services.pdf_slimming_service import get_slim_pdf, slim_pdf
+from settings import settings
+
+
+def test_slim_pdf_returns_a_mapped_file(monkeypatch, make_text_pdf):
+    monkeypatch.setattr(settings, "PDF_SLIM_DROP_BLANK_PAGES", True)
+    monkeypatch.setattr(settings, "PDF_SLIM_DROP_DUPLICATE_PAGES", True)
+    pdf = make_text_pdf(["first", "second", "first"])
+
+    slimmed = slim_pdf(pdf)
+
+    with slimmed["content"] as content:
+        assert isinstance(content, FileBuffer)
+        assert isinstance(content.view.obj, mmap.mmap)
+        assert content.size == slimmed["slim_bytes"]
+        assert len(PdfReader(io.BytesIO(content.view.tobytes())).pages) == 2
+    assert slimmed["page_map"] == [1, 2]
+    assert slimmed["duplicate_pages"] == [[3, 1]]
+
+
+def test_unchanged_pdf_is_a_view_of_the_original(monkeypatch, make_pdf):
+    monkeypatch.setattr(settings, "PDF_SLIM_ENABLED", False)
+    pdf = make_pdf(2)
+
+    slimmed = get_slim_pdf(pdf)
+
+    with slimmed["content"] as content:
+        assert content.view.obj is pdf
+    assert slimmed["page_map"] is None
+
+
+def test_cache_hit_maps_the_cached_file(
+    monkeypatch, tmp_path, make_text_pdf, fake_redis
+):
+    monkeypatch.setattr(settings, "PDF_SLIM_ENABLED", True)
+    monkeypatch.setattr(settings, "LOCAL_PDF_DIR", str(tmp_path))
+    pdf = make_text_pdf(["first", "first", "first"])
+    monkeypatch.setattr(pdf_slimming_service, "get_redis_client", lambda: fake_redis)
+
+    first = get_slim_pdf(pdf)
+    first["content"].close()
+    monkeypatch.setattr(pdf_slimming_service, "slim_pdf", None)  # must not re-slim
+    second = get_slim_pdf(pdf)
+
+    with second["content"] as content:
+        assert isinstance(content.view.obj, mmap.mmap)
+        assert len(PdfReader(io.BytesIO(content.view.tobytes())).pages) == 1
+    assert second["page_map"] == [1]
@@ -0,0 +1,37 @@
+from services import text_layer_service
+from services.text_layer_service import get_text_layer
+from settings import settings
+
+LINE = "Patient reports lower back pain radiating to the left leg for six weeks. " * 4
+
+
+def test_text_layer_text_is_cached_in_file_storage(
+    monkeypatch, tmp_path, make_text_pdf, fake_redis
+):
+    monkeypatch.setattr(settings, "LOCAL_PDF_DIR", str(tmp_path))
+    monkeypatch.setattr(text_layer_service, "get_redis_client", lambda: fake_redis)
+    pdf = make_text_pdf([LINE, LINE.upper()])
+
+    analysis = get_text_layer(pdf, "sha")
+
+    assert analysis["mode"] == "text"
+    assert "lower back pain" in analysis["text"]
+    # The broker only holds the mode and page numbers, never document text
+    (cached,) = fake_redis.data.values()
+    assert b"back pain" not in cached.lower()
+
+    monkeypatch.setattr(text_layer_service, "analyze_text_layer", None)
+    assert get_text_layer(pdf, "sha") == analysis
+
+
+def test_pdf_mode_caches_no_text(monkeypatch, tmp_path, make_pdf, fake_redis):
+    monkeypatch.setattr(settings, "LOCAL_PDF_DIR", str(tmp_path))
+    monkeypatch.setattr(text_layer_service, "get_redis_client", lambda: fake_redis)
+    pdf = make_pdf(2)
+
+    analysis = get_text_layer(pdf, "sha")
+
+    assert analysis["mode"] == "pdf"
+    assert not list(tmp_path.rglob("*.txt"))
+    monkeypatch.setattr(text_layer_service, "analyze_text_layer", None)
+    assert get_text_layer(pdf, "sha") == analysis
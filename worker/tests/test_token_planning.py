@@ -0,0 +1,84 @@
+from collections import deque
+from types import SimpleNamespace
+
+from instructor.exceptions import IncompleteOutputException, InstructorRetryException
+from llm import (
+    DocumentHandle,
+    TokenBudgetPlanner,
+    TokenUsage,
+    _is_truncated,
+    run_instructor,
+)
+from services.answer_service import CriterionAnswer
+from settings import settings
+
+
+def _retry_error(completion):
+    return InstructorRetryException(
+        "Validation failed",
+        last_completion=completion,
+        n_attempts=1,
+        total_usage=0,
+    )
+
+
+def test_incomplete_output_is_truncated():
+    assert _is_truncated(IncompleteOutputException())
+
+
+def test_stop_reasons_mark_truncation():
+    anthropic = SimpleNamespace(stop_reason="max_tokens")
+    openai = SimpleNamespace(choices=[SimpleNamespace(finish_reason="length")])
+
+    assert _is_truncated(_retry_error(anthropic))
+    assert _is_truncated(_retry_error(openai))
+
+
+def test_wrapped_truncation_is_found():
+    try:
+        try:
+            raise IncompleteOutputException()
+        except IncompleteOutputException as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as error:
+        assert _is_truncated(error)
+
+
+def test_errors_mentioning_max_tokens_are_not_truncation():
+    invalid_request = ValueError("max_tokens: 100000 > 64000, the maximum allowed")
+    completed = SimpleNamespace(stop_reason="tool_use")
+
+    assert not _is_truncated(invalid_request)
+    assert not _is_truncated(_retry_error(completed))
+
+
+def test_planned_max_tokens_uses_the_output_quantile(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TOKEN_PLANNER_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS_MIN_SAMPLES", 4)
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS_QUANTILE", 0.5)
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS_HEADROOM", 2.0)
+    monkeypatch.setattr(settings, "LLM_MIN_MAX_TOKENS", 1)
+    planner = TokenBudgetPlanner(window=10)
+    planner._output_tokens["CriterionAnswer"] = deque([100, 400, 200, 300])
+
+    assert planner.planned_max_tokens(CriterionAnswer, 4096) == 600
+    assert planner.planned_max_tokens(CriterionAnswer, 500) == 500
+
+
+def test_fake_provider_is_sent_the_document(make_pdf, monkeypatch):
+    monkeypatch.setattr(settings, "FAKE_LLM_LATENCY_MEDIAN", 0.001)
+    monkeypatch.setattr(settings, "FAKE_LLM_RATE_LIMIT_RATE", 0)
+    document = DocumentHandle(make_pdf(3), provider="fake", use_text_layer=False)
+    usage = TokenUsage()
+
+    run_instructor(
+        CriterionAnswer,
+        "Is the criterion met?",
+        model="fake-model",
+        provider="fake",
+        document=document,
+        usage=usage,
+        use_cache=False,
+    )
+
+    assert usage.input_tokens >= 3 * settings.PDF_TOKENS_PER_PAGE
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from llm import DocumentHandle, RequestSkipped
+from services import answer_service
+from services.answer_service import (
+    CriterionAnswer,
+    iter_criterion_answers,
+    reduce_window_answers,
+    split_document,
+)
+from services.text_layer_service import plan_page_windows
+from settings import settings
+
+
+def _answer(answer, confidence=0.9, explanation="because"):
+    return CriterionAnswer(
+        answer=answer, explanation=explanation, confidence=confidence
+    )
+
+
+def test_plan_page_windows_overlap_and_cover_every_page():
+    assert plan_page_windows(10, 4, 1) == [(1, 4), (4, 7), (7, 10)]
+    assert plan_page_windows(3, 4, 1) == [(1, 3)]
+
+
+def test_split_document_keeps_original_page_numbers(make_pdf, monkeypatch):
+    monkeypatch.setattr(settings, "NOTES_WINDOW_OVERLAP_PAGES", 1)
+    # A slimmed document: pages 1-6 are pages 11-16 of the original notes
+    document = DocumentHandle(
+        make_pdf(6), use_text_layer=False, page_map=list(range(11, 17))
+    )
+
+    windows = list(split_document(document, 4))
+
+    assert [pages for pages, _ in windows] == [(11, 14), (14, 16)]
+    assert windows[1][1].page_map == [14, 15, 16]
+    assert windows[1][1].page_count == 3
+
+
+def test_reduce_window_answers_prefers_yes_then_errors_then_no():
+    yes = reduce_window_answers(
+        [((1, 10), _answer("NO")), ((10, 20), _answer("YES", 0.7))]
+    )
+    assert yes.answer == "YES"
+    assert yes.explanation == "(pp. 10-20) because"
+
+    error = TimeoutError("window timed out")
+    assert reduce_window_answers([((1, 10), _answer("NO")), ((10, 20), error)]) is (
+        error
+    )
+
+    no = reduce_window_answers(
+        [((1, 10), _answer("UNCLEAR", 0.9)), ((10, 20), _answer("NO", 0.6))]
+    )
+    assert (no.answer, no.explanation) == ("NO", "(pp. 10-20) because")
+
+
+@pytest.fixture
+def windowed(make_pdf, monkeypatch):
+    """Windowed answering over 3 windows, with the model answers scripted"""
+    monkeypatch.setattr(settings, "CRITERIA_CASCADE_MODELS", "final-model")
+    monkeypatch.setattr(settings, "NOTES_WINDOW_MAX_PAGES", 4)
+    monkeypatch.setattr(settings, "NOTES_WINDOW_OVERLAP_PAGES", 1)
+    monkeypatch.setattr(DocumentHandle, "upload", lambda self: self)
+    document = DocumentHandle(make_pdf(10), use_text_layer=False)
+    calls = []
+
+    def script(answers):
+        async def iter_batch_completions(requests, max_concurrent, skip=None):
+            for index, request in enumerate(requests):
+                key = (request["user_message"], request["document"].page_map[0])
+                if skip is not None and skip(index):
+                    yield index, RequestSkipped("resolved")
+                    continue
+                calls.append(key)
+                yield index, answers(*key)
+
+        monkeypatch.setattr(
+            answer_service, "iter_batch_completions", iter_batch_completions
+        )
+
+    return document, script, calls
+
+
+def _collect(criteria, document):
+    async def collect():
+        return {
+            criterion_id: response
+            async for criterion_id, response in iter_criterion_answers(
+                criteria, document, stats={}
+            )
+        }
+
+    return asyncio.run(collect())
+
+
+def test_yes_in_one_window_resolves_the_criterion(windowed):
+    document, script, calls = windowed
+    criteria = [
+        {"id": "a", "description": "Criterion A"},
+        {"id": "b", "description": "Criterion B"},
+    ]
+    script(
+        lambda message, first_page: _answer(
+            "YES" if "Criterion A" in message and first_page == 1 else "NO"
+        )
+    )
+
+    answers = _collect(criteria, document)
+
+    assert answers["a"].answer == "YES"
+    assert answers["a"].explanation.startswith("(pp. 1-4)")
+    assert answers["b"].answer == "NO"
+    # A is not asked of later windows once the first one answered YES
+    assert sum("Criterion A" in message for message, _ in calls) == 1
+    assert sum("Criterion B" in message for message, _ in calls) == 3